@@ -5,19 +5,159 @@
 #
 # =================================================================
 
-import zipfile
+import datetime
+import json
+import os
+import tarfile
+
+from pyserializer.reader import open_zip
+
+archive_formats = [
+    "tar",
+    "zip"
+]
+
+tar_modes = {
+    "bzip2": "r|bz2",
+    "gzip": "r|gz",
+    "xz": "r|xz"
+}
+
+# headers are read with small range requests, since a large block would fetch the data of the members as well
+header_block_size = 65536
+
+
+def zip_names(src=None, fs=None):
+    """
+    zip_names returns the members of the zip archive at src.  Only the central directory at the end of the archive is
+    read, so listing an archive on object storage takes a few range requests regardless of its size.
+    """
+    zf, parents = open_zip(src, fs=fs)
+    try:
+        return [
+            {
+                "name": info.filename,
+                "size": info.file_size,
+                "compressed_size": info.compress_size,
+                "crc": info.CRC,
+                "mtime": datetime.datetime(*info.date_time).isoformat(),
+                "offset": info.header_offset
+            }
+            for info in zf.infolist() if not info.is_dir()
+        ]
+    finally:
+        zf.close()
+        for parent in parents:
+            parent.close()
+
+
+def tar_names(src=None, compression=None, fs=None):
+    """
+    tar_names returns the members of the tar archive at src.  If the archive is not compressed, then only the header of
+    each member is read, and the data of each member is skipped.  If the archive is compressed, then the whole archive
+    is decompressed once, since a compressed stream cannot be skipped.  The offset of each member is the position of
+    its data in the uncompressed archive.  Tar archives have no checksum of the data, so crc is None.
+    """
+    if compression is not None and len(compression) > 0 and compression not in tar_modes:
+        raise Exception("invalid compression for tar archive {}".format(compression))
+    compressed = compression is not None and len(compression) > 0
+    if fs is not None:
+        f = fs.open(src, 'rb') if compressed else fs.open(src, 'rb', block_size=header_block_size)
+    else:
+        f = open(src, 'rb')
+    try:
+        with tarfile.open(fileobj=f, mode=(tar_modes[compression] if compressed else "r:")) as tf:
+            return [
+                {
+                    "name": member.name,
+                    "size": member.size,
+                    "compressed_size": (None if compressed else member.size),
+                    "crc": None,
+                    "mtime": datetime.datetime.fromtimestamp(member.mtime, tz=datetime.timezone.utc).isoformat(),
+                    "offset": member.offset_data
+                }
+                for member in tf if member.isfile()
+            ]
+    finally:
+        f.close()
+
+
+def archive_stat(src=None, fs=None):
+    """
+    archive_stat returns the size and modification time of the archive, which identify the version of the archive
+    that an index was built from.
+    """
+    if fs is not None:
+        try:
+            modified = fs.modified(src).isoformat()
+        except NotImplementedError:
+            modified = None
+        return {"size": fs.size(src), "modified": modified}
+    return {"size": os.path.getsize(src), "modified": os.path.getmtime(src)}
+
+
+def read_index(index=None, fs=None, stat=None):
+    """
+    read_index returns the members from the index, or None if the index does not exist or was built from a different
+    version of the archive.
+    """
+    if fs is not None:
+        if not fs.exists(index):
+            return None
+        with fs.open(index, 'rb') as f:
+            data = json.load(f)
+    else:
+        if not os.path.exists(index):
+            return None
+        with open(index, 'rb') as f:
+            data = json.load(f)
+    if data.get("archive") != stat:
+        return None
+    return data["members"]
+
+
+def write_index(index=None, fs=None, stat=None, members=None):
+    data = json.dumps({"archive": stat, "members": members}).encode("utf-8")
+    if fs is not None:
+        with fs.open(index, 'wb') as f:
+            f.write(data)
+    else:
+        with open(index, 'wb') as f:
+            f.write(data)
 
 
 def names(
     src=None,
     compression=None,
-    fs=None
+    fs=None,
+    format=None,
+    index=None
 ):
-    if compression == "zip":
-        data = None
-        with zipfile.ZipFile(src, 'r') as zf:
-            data = [{"name": name} for name in zf.namelist()]
-        return data
+    """
+    names returns the name, uncompressed size, compressed size, crc, modification time, and offset of each file in the
+    archive at src, which is a zip archive if format or compression is "zip", or a tar archive if format is "tar",
+    optionally compressed with gzip, bzip2, or xz.  If index is set, then the members are cached in an index file at
+    that path on the same filesystem, which is used instead of reading the archive until the archive changes, so that
+    listing a large compressed tar archive only decompresses it once.
+    """
+    if format is None or len(format) == 0:
+        format = "zip" if compression == "zip" else None
+    if format not in archive_formats:
+        raise Exception("invalid archive format {}".format(format))
+
+    stat = None
+    if index is not None and len(index) > 0:
+        stat = archive_stat(src=src, fs=fs)
+        members = read_index(index=index, fs=fs, stat=stat)
+        if members is not None:
+            return members
+
+    if format == "zip":
+        members = zip_names(src=src, fs=fs)
     else:
-        raise Exception("invalid archive format "+format)
-    return None
+        members = tar_names(src=src, compression=compression, fs=fs)
+
+    if stat is not None:
+        write_index(index=index, fs=fs, stat=stat, members=members)
+
+    return members
@@ -0,0 +1,83 @@
+# =================================================================
+#
+# Work of the U.S. Department of Defense, Defense Digital Service.
+# Released as open source under the MIT License.  See LICENSE file.
+#
+# =================================================================
+
+import json
+
+import pyarrow as pa
+
+# arrow types for the athena types returned in the description of a cursor, which are converted to python values by
+# the default converter.  Columns of other types, such as arrays, maps, rows, and json, are written as strings, as
+# they are by the arrow and pandas cursors of pyathena.
+athena_types = {
+    "bigint": pa.int64(),
+    "boolean": pa.bool_(),
+    "char": pa.string(),
+    "date": pa.date32(),
+    "double": pa.float64(),
+    "float": pa.float32(),
+    "int": pa.int32(),
+    "integer": pa.int32(),
+    "real": pa.float32(),
+    "smallint": pa.int16(),
+    "string": pa.string(),
+    "timestamp": pa.timestamp("ms"),
+    "tinyint": pa.int8(),
+    "varbinary": pa.binary(),
+    "varchar": pa.string()
+}
+
+
+def athena_schema(description=None):
+    """
+    athena_schema returns the arrow type of each column in the description of a cursor.  Columns with a type that is not
+    in athena_types are strings.
+    """
+    types = []
+    for column in description:
+        type_name = column[1].lower() if column[1] is not None else ""
+        if type_name == "decimal":
+            types += [pa.decimal128(column[4], column[5])]
+        else:
+            types += [athena_types.get(type_name, pa.string())]
+    return types
+
+
+def athena_string(value=None):
+    """
+    athena_string returns the value as a string, with the lists and dicts parsed by the default converter encoded as
+    json.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str, separators=(",", ":"))
+    return str(value)
+
+
+def iter_query(cursor=None, query=None, batch_size=None):
+    """
+    iter_query executes the query with the DB-API cursor and yields the results as pyarrow RecordBatches of at most
+    batch_size rows.  Each batch is fetched with fetchmany as it is consumed, so the first batch can be written while
+    the rest of the results are paged, and only one batch is held in memory at a time.  The type of each column is
+    taken from the description of the cursor, so every batch has the same schema, even if a column is all nulls in the
+    first batch.
+    """
+    batch_size = batch_size if (batch_size is not None) and (batch_size > 0) else 10000
+    cursor.execute(query)
+    names = [column[0] for column in cursor.description]
+    types = athena_schema(description=cursor.description)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if rows is None or len(rows) == 0:
+            return
+        columns = []
+        for i in range(len(names)):
+            values = [row[i] for row in rows]
+            if pa.types.is_string(types[i]):
+                values = [athena_string(value=value) for value in values]
+            columns += [pa.array(values, type=types[i])]
+        yield pa.RecordBatch.from_arrays(columns, names=names)
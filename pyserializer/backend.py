@@ -0,0 +1,126 @@
+# =================================================================
+#
+# Work of the U.S. Department of Defense, Defense Digital Service.
+# Released as open source under the MIT License.  See LICENSE file.
+#
+# =================================================================
+
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+backends = ["json", "orjson"]
+
+# orjson writes exponents without a plus sign or zero padding, such as 1e16 rather than 1e+16, and writes floats
+# below 1e-4 without an exponent, such as 0.00001 rather than 1e-05.
+float_pattern = re.compile(rb'[0-9]e[-0-9]|0\.0000')
+
+# json.dumps escapes delete and every non-ascii character, which orjson writes as utf-8
+escape_pattern = re.compile('[\x7f-\U0010ffff]')
+
+# orjson decodes integers beyond 64 bits as floats
+integer_pattern = re.compile(rb'[0-9]{19}')
+integer_pattern_text = re.compile(r'[0-9]{19}')
+
+
+class Backend(object):
+    """
+    Backend encodes and decodes JSON.  The backend is created once with the keyword arguments that would be passed
+    to json.dumps, so that the encoder is not created again for every value.
+    """
+
+    def __init__(self, **kwargs):
+        raise NotImplementedError
+
+    def dumps(self, obj):
+        raise NotImplementedError
+
+    def loads(self, s):
+        raise NotImplementedError
+
+    def load(self, f):
+        return self.loads(f.read())
+
+
+class StdlibBackend(Backend):
+
+    def __init__(self, allow_nan=False, cls=None, separators=None, **kwargs):
+        self.encoder = (cls or json.JSONEncoder)(allow_nan=allow_nan, separators=separators, **kwargs)
+
+    def dumps(self, obj):
+        return self.encoder.encode(obj)
+
+    def loads(self, s):
+        return json.loads(s)
+
+    def load(self, f):
+        return json.load(f)
+
+
+def escape_character(match):
+    c = ord(match.group(0))
+    if c < 0x10000:
+        return '\\u{:04x}'.format(c)
+    c -= 0x10000
+    return '\\u{:04x}\\u{:04x}'.format(0xd800 | (c >> 10), 0xdc00 | (c & 0x3ff))
+
+
+class ORJSONBackend(Backend):
+    """
+    ORJSONBackend encodes and decodes JSON with orjson, and falls back to the standard library whenever orjson would
+    produce a different result, so that the output is the same as json.dumps.  Non-ascii characters are escaped in the
+    output of orjson, rather than encoding the value again.  Values without a native JSON type, including dates and
+    datetimes, are converted by the default method of the encoder class, except for UUIDs and enums, which orjson
+    encodes itself.
+    """
+
+    def __init__(self, allow_nan=False, cls=None, separators=None, **kwargs):
+        self.fallback = StdlibBackend(allow_nan=allow_nan, cls=cls, separators=separators, **kwargs)
+        # orjson only writes compact JSON, and only supports the default options of json.dumps
+        self.enabled = separators == (',', ':') and len(kwargs) == 0
+        self.default = self.fallback.encoder.default
+        self.option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def dumps(self, obj):
+        if self.enabled:
+            try:
+                b = orjson.dumps(obj, default=self.default, option=self.option)
+            except Exception:
+                # integers over 64 bits, non-string keys, and errors raised by default are handled by the fallback
+                b = None
+            # orjson writes NaN and infinity as null, and formats some floats differently than repr
+            if b is not None and b"null" not in b and float_pattern.search(b) is None:
+                s = b.decode("utf-8")
+                if not b.isascii() or "\x7f" in s:
+                    s = escape_pattern.sub(escape_character, s)
+                return s
+        return self.fallback.dumps(obj)
+
+    def loads(self, s):
+        if (integer_pattern_text if isinstance(s, str) else integer_pattern).search(s) is not None:
+            return self.fallback.loads(s)
+        try:
+            return orjson.loads(s)
+        except ValueError:
+            # json.loads accepts infinity and lone surrogates
+            return self.fallback.loads(s)
+
+
+def create_backend(name=None, **kwargs):
+    """
+    create_backend returns the JSON backend with the given name.  If name is None or empty, then create_backend returns
+    the standard library backend, since orjson is only faster for some data and is opted into with "orjson".
+    """
+    if name is None or len(name) == 0:
+        name = "json"
+    if name == "json":
+        return StdlibBackend(**kwargs)
+    elif name == "orjson":
+        if orjson is None:
+            raise Exception("json backend orjson is not installed")
+        return ORJSONBackend(**kwargs)
+    raise Exception("unknown json backend {}".format(name))
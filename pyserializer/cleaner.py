@@ -5,7 +5,10 @@
 #
 # =================================================================
 
+import pandas as pd
 import pandas._libs.missing as libmissing
+import pyarrow as pa
+import pyarrow.compute as pc
 
 
 def clean(obj, drop_nulls=True, drop_blanks=True):
@@ -19,4 +22,96 @@ def clean(obj, drop_nulls=True, drop_blanks=True):
             clean(x, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
             for x in obj
         ]
+    elif isinstance(obj, pa.Table):
+        return clean_table(obj, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+    elif isinstance(obj, pd.DataFrame):
+        return clean_dataframe(obj, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
     return obj
+
+
+def drop_mask(values, drop_nulls=True, drop_blanks=True):
+    """
+    drop_mask returns a boolean array that is true for each value in the arrow array that clean would drop, or None if
+    no values can be dropped.  Null and NaN values are nulls, and empty strings are blanks.
+    """
+    mask = None
+    if drop_nulls and values.null_count > 0:
+        mask = pc.is_null(values)
+    if drop_nulls and pa.types.is_floating(values.type):
+        nan = pc.fill_null(pc.is_nan(values), False)
+        mask = nan if mask is None else pc.or_(mask, nan)
+    if drop_blanks and (pa.types.is_string(values.type) or pa.types.is_large_string(values.type)):
+        blank = pc.fill_null(pc.equal(values, ""), False)
+        mask = blank if mask is None else pc.or_(mask, blank)
+    return mask
+
+
+def table_masks(table, drop_nulls=True, drop_blanks=True):
+    """
+    table_masks returns the drop mask for each column of the table, in one vectorized pass per column.
+    """
+    return {
+        name: drop_mask(table.column(i), drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+        for i, name in enumerate(table.column_names)
+    }
+
+
+def dataframe_masks(df, drop_nulls=True, drop_blanks=True):
+    """
+    dataframe_masks returns a data frame of booleans that is true for each value that clean would drop.
+    """
+    mask = df.isna() if drop_nulls else pd.DataFrame(False, index=df.index, columns=df.columns)
+    if drop_blanks:
+        for i in range(len(df.columns)):
+            column = df.iloc[:, i]
+            if column.dtype == object or pd.api.types.is_string_dtype(column.dtype):
+                mask.iloc[:, i] = mask.iloc[:, i] | (column == "").fillna(False).astype(bool)
+    return mask
+
+
+def clean_nested(df, drop_nulls=True, drop_blanks=True):
+    """
+    clean_nested returns a copy of the data frame with the lists and dicts in object columns cleaned.  Columns without
+    lists or dicts are not copied.
+    """
+    df = df.copy(deep=False)
+    for i in range(len(df.columns)):
+        column = df.iloc[:, i]
+        if column.dtype == object:
+            nested = column.map(lambda v: isinstance(v, (dict, list))).to_numpy(dtype=bool)
+            if nested.any():
+                values = column.to_numpy(dtype=object, copy=True)
+                for j in nested.nonzero()[0]:
+                    values[j] = clean(values[j], drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+                df.isetitem(i, values)
+    return df
+
+
+def clean_table(table, drop_nulls=True, drop_blanks=True):
+    """
+    clean_table returns a copy of the table with the values that clean would drop replaced by nulls.  Columns without
+    any values to drop are not copied.
+    """
+    columns = []
+    for name, mask in table_masks(table, drop_nulls=drop_nulls, drop_blanks=drop_blanks).items():
+        column = table.column(name)
+        if mask is not None and pc.any(mask).as_py():
+            column = pc.if_else(mask, pa.scalar(None, column.type), column)
+        columns += [column]
+    return pa.table(columns, schema=table.schema)
+
+
+def clean_dataframe(df, drop_nulls=True, drop_blanks=True):
+    """
+    clean_dataframe returns a copy of the data frame with the values that clean would drop replaced by None.  Columns
+    with values to drop are converted to objects, so that None is not coerced to NaN.
+    """
+    mask = dataframe_masks(df, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+    df = df.copy(deep=False)
+    for i in range(len(df.columns)):
+        m = mask.iloc[:, i].to_numpy(dtype=bool)
+        if m.any():
+            column = df.iloc[:, i].astype(object)
+            column[m] = None
+            df.isetitem(i, column)
+    return df
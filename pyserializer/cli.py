@@ -6,20 +6,34 @@
 # =================================================================
 
 import fire
+import json
 import os
 from urllib.parse import urlparse
 
-import s3fs
+import pyarrow as pa
 import pyathena
 from pyathena.pandas.cursor import PandasCursor
 
-from pyserializer.archive import names
-from pyserializer.serialize import serialize
-from pyserializer.deserialize import deserialize
+from pyserializer.archive import archive_formats, names
+from pyserializer.athena import iter_query
+from pyserializer.backend import backends
+from pyserializer.inputs import expand_inputs, is_pattern, map_inputs, output_paths
+from pyserializer.s3 import create_s3_filesystem
+from pyserializer.serialize import serialize, serialize_iter
+from pyserializer.deserialize import csv_fieldnames, deserialize, deserialize_iter, is_member_pattern
 
 algorithms = [
+    "bzip2",
     "gzip",
-    "zip"
+    "lz4",
+    "xz",
+    "zip",
+    "zstd"
+]
+
+engines = [
+    "arrow",
+    "python"
 ]
 
 formats = [
@@ -31,20 +45,47 @@ formats = [
 ]
 
 
-def create_s3_filesystem(endpoint=None, region=None, acl=None):
-    s3_additional_kwargs = None
-    if acl is not None:
-        s3_additional_kwargs = {
-            "ACL": acl
-        }
-    return s3fs.S3FileSystem(
-        anon=False,
-        client_kwargs={
-            "endpoint_url": endpoint,
-            "region_name": region,
-        },
-        s3_additional_kwargs=s3_additional_kwargs
-    )
+def parse_columns(columns=None):
+    """
+    parse_columns returns the columns as a list of names.  Columns are given either as a list or as a comma-separated
+    string.
+    """
+    if columns is None:
+        return None
+    if isinstance(columns, str):
+        columns = columns.split(",")
+    columns = [str(c).strip() for c in columns if len(str(c).strip()) > 0]
+    return columns if len(columns) > 0 else None
+
+
+def parse_filters(filters=None):
+    """
+    parse_filters returns the filters as a list of tuples in disjunctive normal form.  Filters are given either as a
+    list or as a JSON string, such as '[["year", "=", 2020], ["state", "in", ["MD", "VA"]]]'.
+    """
+    if filters is None:
+        return None
+    if isinstance(filters, str):
+        if len(filters) == 0:
+            return None
+        try:
+            filters = json.loads(filters)
+        except json.JSONDecodeError as e:
+            raise Exception("filters is invalid: {}".format(e))
+    if not isinstance(filters, (list, tuple)) or len(filters) == 0:
+        return None
+
+    def parse_predicate(predicate):
+        if not isinstance(predicate, (list, tuple)) or len(predicate) != 3:
+            raise Exception("filters is invalid: expecting [column, operator, value] but found {}".format(predicate))
+        return tuple(predicate)
+
+    # a single predicate, or a flat list of predicates, is a single conjunction
+    if isinstance(filters[0], str):
+        return [parse_predicate(filters)]
+    if isinstance(filters[0], (list, tuple)) and len(filters[0]) > 0 and isinstance(filters[0][0], str):
+        return [parse_predicate(p) for p in filters]
+    return [[parse_predicate(p) for p in conjunction] for conjunction in filters]
 
 
 class Archive(object):
@@ -68,6 +109,12 @@ class Archive(object):
         drop_blanks=False,
         drop_nulls=False,
         limit=None,
+        input_index="",
+        s3_max_pool_connections=None,
+        s3_retries=None,
+        s3_retry_mode="",
+        s3_block_size=None,
+        s3_cache_type="",
     ):
 
         if src is None or len(src) == 0:
@@ -92,6 +139,14 @@ class Archive(object):
                     )
                 )
 
+        if input_format is not None and len(input_format) > 0:
+            if input_format not in archive_formats:
+                raise Exception(
+                    "input_format is invalid: only the following archive formats are supported: {}".format(
+                        ", ".join(archive_formats)
+                    )
+                )
+
         if output_format is None or len(output_format) == 0:
             raise Exception("output_format is missing")
 
@@ -101,7 +156,12 @@ class Archive(object):
             input_file_system = create_s3_filesystem(
                 endpoint=input_s3_endpoint or None,
                 region=input_s3_region or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION"),
-                acl=None
+                acl=None,
+                max_pool_connections=s3_max_pool_connections,
+                retries=s3_retries,
+                retry_mode=(s3_retry_mode or None),
+                block_size=s3_block_size,
+                cache_type=(s3_cache_type or None)
             )
             src_parts = urlparse(src)
             src_path = "{}{}".format(src_parts.netloc, src_parts.path).removesuffix("/")
@@ -114,17 +174,35 @@ class Archive(object):
             output_file_system = create_s3_filesystem(
                 endpoint=output_s3_endpoint or None,
                 region=output_s3_region or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION"),
-                acl=None
+                acl=None,
+                max_pool_connections=s3_max_pool_connections,
+                retries=s3_retries,
+                retry_mode=(s3_retry_mode or None),
+                block_size=s3_block_size,
+                cache_type=(s3_cache_type or None)
             )
             dest_parts = urlparse(dest)
             dest_path = "{}{}".format(dest_parts.netloc, dest_parts.path).removesuffix("/")
         else:
             dest_path = dest
 
+        # the index is kept on the same filesystem as the archive
+        index_path = None
+        if input_index is not None and len(input_index) > 0:
+            if input_index.startswith("s3://") != src.startswith("s3://"):
+                raise Exception("input_index must be on the same filesystem as src")
+            if input_index.startswith("s3://"):
+                index_parts = urlparse(input_index)
+                index_path = "{}{}".format(index_parts.netloc, index_parts.path)
+            else:
+                index_path = input_index
+
         data = names(
             src=src_path,
-            compression=input_compression,
-            fs=input_file_system
+            compression=(input_compression or None),
+            fs=input_file_system,
+            format=(input_format or None),
+            index=index_path
         )
 
         serialize(
@@ -139,8 +217,9 @@ class Archive(object):
 
 class Athena(object):
 
-    def __init__(self):
-        pass
+    def __init__(self, connect=None):
+        # the connect function is private, so that it is not exposed as a command, and can be replaced in tests
+        self._connect = connect or pyathena.connect
 
     def query(
         self,
@@ -158,6 +237,13 @@ class Athena(object):
         input_format="",
         output_format="",
         limit=None,
+        s3_max_pool_connections=None,
+        s3_retries=None,
+        s3_retry_mode="",
+        s3_block_size=None,
+        s3_cache_type="",
+        stream=False,
+        batch_size=None,
     ):
         allow_nan = allow_nan or False
         drop_blanks = drop_blanks or False
@@ -189,17 +275,49 @@ class Athena(object):
             output_file_system = create_s3_filesystem(
                 endpoint=output_s3_endpoint or None,
                 region=output_s3_region or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION"),
-                acl=None
+                acl=None,
+                max_pool_connections=s3_max_pool_connections,
+                retries=s3_retries,
+                retry_mode=(s3_retry_mode or None),
+                block_size=s3_block_size,
+                cache_type=(s3_cache_type or None)
             )
             dest_parts = urlparse(dest)
             dest_path = "{}{}".format(dest_parts.netloc, dest_parts.path).removesuffix("/")
         else:
             dest_path = dest
 
-        athena_client = pyathena.connect(
+        region = input_athena_region or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION")
+
+        if stream:
+            # the default cursor pages the results with GetQueryResults, so the first batch is written while the rest
+            # of the results are fetched, and memory is bounded by the batch size
+            athena_client = self._connect(
+                work_group=workgroup,
+                endpoint_url=input_athena_endpoint or None,
+                region_name=region
+            )
+            athena_cursor = athena_client.cursor()
+            try:
+                serialize_iter(
+                    allow_nan=allow_nan,
+                    compression=(output_compression or None),
+                    dest=dest_path,
+                    batches=iter_query(cursor=athena_cursor, query=query, batch_size=batch_size),
+                    drop_nulls=drop_nulls,
+                    drop_blanks=drop_blanks,
+                    format=output_format,
+                    fs=output_file_system,
+                    limit=limit
+                )
+            finally:
+                athena_cursor.close()
+            return
+
+        athena_client = self._connect(
             work_group=workgroup,
             endpoint_url=input_athena_endpoint or None,
-            region_name=input_athena_region or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION"),
+            region_name=region,
             cursor_class=PandasCursor
         )
         athena_cursor = athena_client.cursor()
@@ -249,6 +367,35 @@ class CLI(object):
         drop_blanks=False,
         drop_nulls=False,
         limit=None,
+        stream=False,
+        batch_size=None,
+        engine="",
+        json_backend="",
+        output_compression_threads=None,
+        output_compression_block_size=None,
+        output_compression_level=None,
+        columns=None,
+        filters=None,
+        input_threads=True,
+        input_io_threads=None,
+        input_batch_readahead=None,
+        input_fragment_readahead=None,
+        input_buffer_size=None,
+        output_partition_columns=None,
+        output_max_open_files=None,
+        output_upload_part_size=None,
+        output_upload_concurrency=None,
+        s3_max_pool_connections=None,
+        s3_retries=None,
+        s3_retry_mode="",
+        s3_block_size=None,
+        s3_cache_type="",
+        input_workers=None,
+        input_retries=None,
+        output_per_input=False,
+        output_shard_rows=None,
+        output_shard_bytes=None,
+        output_shard_threads=None,
     ):
 
         if src is None or len(src) == 0:
@@ -260,6 +407,41 @@ class CLI(object):
         if src == "<stdin>":
             src = "-"
 
+        # a list, glob pattern, or prefix of inputs is read by a pool of workers, but a parquet dataset is one input
+        multiple = isinstance(src, (list, tuple)) or (
+            src != "-" and (is_pattern(src) or (input_format != "parquet" and (
+                src.endswith("/") or (not src.startswith("s3://") and os.path.isdir(src))
+            )))
+        )
+
+        srcs = list(src) if isinstance(src, (list, tuple)) else [src]
+
+        if multiple:
+            if "-" in srcs or "<stdin>" in srcs:
+                raise Exception("cannot read stdin with multiple inputs")
+            if len({x.startswith("s3://") for x in srcs}) > 1:
+                raise Exception("cannot read inputs from s3 and local files at once")
+            if output_per_input and dest in ["-", "<stdout>"]:
+                raise Exception("cannot write one output per input to stdout")
+        elif output_per_input:
+            if input_compression != "zip" or not is_pattern(input_name or ""):
+                raise Exception("output_per_input is only supported with multiple inputs or a pattern of zip members")
+            if stream:
+                raise Exception("output_per_input is not supported when streaming zip members")
+            if dest in ["-", "<stdout>"]:
+                raise Exception("cannot write one output per input to stdout")
+
+        if output_shard_rows is not None or output_shard_bytes is not None:
+            if dest in ["-", "<stdout>"]:
+                raise Exception("cannot write shards to stdout")
+            if output_partition_columns is not None or output_per_input:
+                raise Exception(
+                    "output_partition_columns and output_per_input are not supported with sharded output"
+                )
+
+        if output_per_input and output_partition_columns is not None:
+            raise Exception("output_partition_columns is not supported with output_per_input")
+
         if dest == "<stdout>":
             dest = "-"
 
@@ -285,21 +467,91 @@ class CLI(object):
         if output_format is None or len(output_format) == 0:
             raise Exception("output_format is missing")
 
+        if engine is not None and len(engine) > 0:
+            if engine not in engines:
+                raise Exception(
+                    "engine is invalid: only the following engines are supported: {}".format(
+                        ", ".join(engines)
+                    )
+                )
+
+        # the python engine drops blanks and nulls while reading, but the arrow engine only reads blanks in csv as
+        # nulls, so the serializers drop them from the output of the arrow engine, matching the python engine
+        output_drop_blanks = engine == "arrow" and bool(drop_blanks)
+        output_drop_nulls = engine == "arrow" and (
+            bool(drop_nulls) or (output_drop_blanks and input_format in ["csv", "tsv"])
+        )
+
+        if json_backend is not None and len(json_backend) > 0:
+            if json_backend not in backends:
+                raise Exception(
+                    "json_backend is invalid: only the following json backends are supported: {}".format(
+                        ", ".join(backends)
+                    )
+                )
+
+        columns = parse_columns(columns)
+
+        filters = parse_filters(filters)
+
+        if columns is not None and input_format != "parquet" and engine != "arrow":
+            raise Exception("columns is only supported for parquet input or when using the arrow engine")
+
+        if filters is not None and input_format != "parquet":
+            raise Exception("filters is only supported for parquet input")
+
+        output_partition_columns = parse_columns(output_partition_columns)
+
+        if output_partition_columns is not None and output_format != "parquet":
+            raise Exception("output_partition_columns is only supported for parquet output")
+
+        if output_max_open_files is not None and (output_partition_columns is None or not stream):
+            raise Exception("output_max_open_files is only supported when streaming partitioned parquet output")
+
+        if output_upload_part_size is not None or output_upload_concurrency is not None:
+            if not dest.startswith("s3://"):
+                raise Exception(
+                    "output_upload_part_size and output_upload_concurrency are only supported for s3 output"
+                )
+
+        if input_format != "parquet":
+            if input_batch_readahead is not None or input_fragment_readahead is not None:
+                raise Exception(
+                    "input_batch_readahead and input_fragment_readahead are only supported for parquet input"
+                )
+            if input_buffer_size is not None:
+                raise Exception("input_buffer_size is only supported for parquet input")
+
+        # the io thread pool is shared by every read, so that many files on object storage are requested at once
+        if input_io_threads is not None:
+            if input_io_threads < 1:
+                raise Exception("input_io_threads is invalid: expecting at least 1 thread but found {}".format(
+                    input_io_threads
+                ))
+            pa.set_io_thread_count(input_io_threads)
+
         if input_compression == "zip" and len(input_name) == 0:
             raise Exception("input_name is missing, required when using zip compression")
 
-        src_path = None
+        src_paths = None
         input_file_system = None
-        if src.startswith("s3://"):
+        if srcs[0].startswith("s3://"):
             input_file_system = create_s3_filesystem(
                 endpoint=input_s3_endpoint or None,
                 region=input_s3_region or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION"),
-                acl=None
+                acl=None,
+                max_pool_connections=s3_max_pool_connections,
+                retries=s3_retries,
+                retry_mode=(s3_retry_mode or None),
+                block_size=s3_block_size,
+                cache_type=(s3_cache_type or None)
             )
-            src_parts = urlparse(src)
-            src_path = "{}{}".format(src_parts.netloc, src_parts.path).removesuffix("/")
+            src_paths = []
+            for x in srcs:
+                src_parts = urlparse(x)
+                src_paths += ["{}{}".format(src_parts.netloc, src_parts.path).removesuffix("/")]
         else:
-            src_path = src
+            src_paths = srcs
 
         dest_path = None
         output_file_system = None
@@ -307,13 +559,179 @@ class CLI(object):
             output_file_system = create_s3_filesystem(
                 endpoint=output_s3_endpoint or None,
                 region=output_s3_region or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION"),
-                acl=None
+                acl=None,
+                max_pool_connections=s3_max_pool_connections,
+                retries=s3_retries,
+                retry_mode=(s3_retry_mode or None),
+                block_size=s3_block_size,
+                cache_type=(s3_cache_type or None)
             )
             dest_parts = urlparse(dest)
             dest_path = "{}{}".format(dest_parts.netloc, dest_parts.path).removesuffix("/")
         else:
             dest_path = dest
 
+        if multiple:
+            paths = expand_inputs(src_paths, fs=input_file_system)
+
+            def read(path):
+                return deserialize_iter(
+                    src=path,
+                    compression=(input_compression or None),
+                    format=input_format,
+                    drop_nulls=drop_nulls or False,
+                    drop_blanks=drop_blanks or False,
+                    fs=input_file_system,
+                    name=input_name or None,
+                    batch_size=batch_size or 10000,
+                    columns=columns,
+                    filters=filters,
+                    engine=engine or None,
+                    json_backend=json_backend or None,
+                    buffer_size=input_buffer_size,
+                    threads=input_threads,
+                    batch_readahead=input_batch_readahead,
+                    fragment_readahead=input_fragment_readahead
+                )
+
+            def write(dest, batches):
+                serialize_iter(
+                    compression=(output_compression or None),
+                    dest=dest,
+                    batches=batches,
+                    format=output_format,
+                    drop_blanks=output_drop_blanks,
+                    drop_nulls=output_drop_nulls,
+                    fs=output_file_system,
+                    limit=limit,
+                    json_backend=json_backend or None,
+                    compression_threads=output_compression_threads,
+                    compression_block_size=output_compression_block_size,
+                    compression_level=output_compression_level,
+                    partition_columns=output_partition_columns,
+                    makedirs=(output_file_system is None),
+                    max_open_files=output_max_open_files,
+                    upload_part_size=output_upload_part_size,
+                    upload_concurrency=output_upload_concurrency,
+                    shard_rows=output_shard_rows,
+                    shard_bytes=output_shard_bytes,
+                    shard_threads=output_shard_threads
+                )
+
+            failures = []
+
+            if output_per_input:
+                outputs = output_paths(paths, dest_path, output_format, output_compression)
+                if output_file_system is None:
+                    for output in outputs.values():
+                        os.makedirs(os.path.dirname(output), exist_ok=True)
+
+                # each worker transforms one input into its own output, and is retried as a whole
+                for path, _, err in map_inputs(
+                    lambda path: write(outputs[path], read(path)),
+                    paths,
+                    workers=input_workers,
+                    retries=input_retries
+                ):
+                    if err is not None:
+                        failures += [path]
+            else:
+                # each worker decodes one input completely before its batches are written, so that a failed input is
+                # retried without writing any of its records twice
+                def merge():
+                    for path, batches, err in map_inputs(
+                        lambda path: list(read(path)),
+                        paths,
+                        workers=input_workers,
+                        retries=input_retries
+                    ):
+                        if err is not None:
+                            failures.append(path)
+                        else:
+                            yield from batches
+
+                write(dest_path, merge())
+
+            if len(failures) > 0:
+                raise Exception("error transforming {} of {} inputs: {}".format(
+                    len(failures),
+                    len(paths),
+                    ", ".join(failures)
+                ))
+
+            return
+
+        src_path = src_paths[0]
+
+        if stream:
+            batches = deserialize_iter(
+                src=src_path,
+                compression=(input_compression or None),
+                format=input_format,
+                drop_nulls=drop_nulls or False,
+                drop_blanks=drop_blanks or False,
+                fs=input_file_system,
+                name=input_name or None,
+                batch_size=batch_size or 10000,
+                columns=columns,
+                filters=filters,
+                engine=engine or None,
+                json_backend=json_backend or None,
+                buffer_size=input_buffer_size,
+                threads=input_threads,
+                batch_readahead=input_batch_readahead,
+                fragment_readahead=input_fragment_readahead
+            )
+
+            # the header of streamed csv is written before later records are read, so it is taken from the header of
+            # the input rather than from the first batch, which may be missing columns that were blank or null
+            output_columns = columns
+            if (
+                output_columns is None and
+                output_format in ["csv", "tsv"] and
+                input_format in ["csv", "tsv"] and
+                (engine or "python") == "python" and
+                src_path != "-" and
+                not (input_compression == "zip" and is_member_pattern(
+                    src=src_path,
+                    fs=input_file_system,
+                    name=input_name or None
+                ))
+            ):
+                output_columns = sorted(csv_fieldnames(
+                    src=src_path,
+                    format=input_format,
+                    compression=(input_compression or None),
+                    fs=input_file_system,
+                    name=input_name or None
+                )) or None
+
+            serialize_iter(
+                compression=(output_compression or None),
+                dest=dest_path,
+                batches=batches,
+                format=output_format,
+                drop_blanks=output_drop_blanks,
+                drop_nulls=output_drop_nulls,
+                columns=output_columns,
+                fs=output_file_system,
+                limit=limit,
+                json_backend=json_backend or None,
+                compression_threads=output_compression_threads,
+                compression_block_size=output_compression_block_size,
+                compression_level=output_compression_level,
+                partition_columns=output_partition_columns,
+                makedirs=(output_file_system is None),
+                max_open_files=output_max_open_files,
+                upload_part_size=output_upload_part_size,
+                upload_concurrency=output_upload_concurrency,
+                shard_rows=output_shard_rows,
+                shard_bytes=output_shard_bytes,
+                shard_threads=output_shard_threads
+            )
+
+            return
+
         data = deserialize(
             src=src_path,
             compression=(input_compression or None),
@@ -321,16 +739,65 @@ class CLI(object):
             drop_nulls=drop_nulls or False,
             drop_blanks=drop_blanks or False,
             fs=input_file_system,
-            name=input_name or None
+            name=input_name or None,
+            columns=columns,
+            filters=filters,
+            engine=engine or None,
+            json_backend=json_backend or None,
+            buffer_size=input_buffer_size,
+            threads=input_threads,
+            batch_readahead=input_batch_readahead,
+            fragment_readahead=input_fragment_readahead,
+            member_workers=input_workers,
+            separate_members=output_per_input
         )
 
+        if output_per_input:
+            outputs = output_paths(list(data.keys()), dest_path, output_format, output_compression)
+            if output_file_system is None:
+                for output in outputs.values():
+                    os.makedirs(os.path.dirname(output), exist_ok=True)
+            for member, records in data.items():
+                serialize(
+                    compression=(output_compression or None),
+                    dest=outputs[member],
+                    data=records,
+                    engine=engine or None,
+                    format=output_format,
+                    drop_blanks=output_drop_blanks,
+                    drop_nulls=output_drop_nulls,
+                    fs=output_file_system,
+                    limit=limit,
+                    json_backend=json_backend or None,
+                    compression_threads=output_compression_threads,
+                    compression_block_size=output_compression_block_size,
+                    compression_level=output_compression_level,
+                    upload_part_size=output_upload_part_size,
+                    upload_concurrency=output_upload_concurrency
+                )
+            return
+
         serialize(
             compression=(output_compression or None),
             dest=dest_path,
             data=data,
+            engine=engine or None,
             format=output_format,
+            drop_blanks=output_drop_blanks,
+            drop_nulls=output_drop_nulls,
             fs=output_file_system,
-            limit=limit
+            limit=limit,
+            json_backend=json_backend or None,
+            compression_threads=output_compression_threads,
+            compression_block_size=output_compression_block_size,
+            compression_level=output_compression_level,
+            partition_columns=output_partition_columns,
+            makedirs=(output_file_system is None),
+            upload_part_size=output_upload_part_size,
+            upload_concurrency=output_upload_concurrency,
+            shard_rows=output_shard_rows,
+            shard_bytes=output_shard_bytes,
+            shard_threads=output_shard_threads
         )
 
 
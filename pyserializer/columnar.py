@@ -0,0 +1,428 @@
+# =================================================================
+#
+# Work of the U.S. Department of Defense, Defense Digital Service.
+# Released as open source under the MIT License.  See LICENSE file.
+#
+# =================================================================
+
+import csv
+import io
+import json
+import re
+
+import numpy as np
+import pandas as pd
+import pandas._libs.missing as libmissing
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from pyserializer.cleaner import clean, clean_table, drop_mask
+
+# strftime directives that arrow formats the same way as python
+arrow_date_directives = {"%", "Y", "m", "d", "y", "j"}
+arrow_time_directives = {"%", "Y", "m", "d", "y", "j", "H", "M", "S", "f", "I", "p", "z"}
+
+
+def arrow_time_format(format, tz=None, date=False):
+    """
+    arrow_time_format translates a python strftime format into the equivalent arrow strftime format and the unit to
+    cast timestamps to before formatting, or returns None if arrow cannot produce the same output.
+    """
+    directives = set(re.findall(r"%(.)", format))
+    if not directives.issubset(arrow_date_directives if date else arrow_time_directives):
+        return None
+    if date:
+        return format, None
+    # arrow prints fractional seconds with %S, depending on the unit of the timestamp
+    if "f" in directives:
+        if format.count("%f") != 1 or format.count("%S.%f") != 1:
+            return None
+        format = format.replace("%S.%f", "%S")
+        unit = "us"
+    else:
+        unit = "s"
+    # python formats the timezone of a naive datetime as an empty string
+    if tz is None:
+        format = format.replace("%z", "")
+    return format, unit
+
+
+def dataframe_columns(df, index=False):
+    """
+    dataframe_columns returns the name and values of each column in the data frame, including the index as "Index" if
+    index is true.  Values are returned as an arrow array, unless the column contains python objects that do not have
+    a primitive arrow type, in which case the values are returned as a list.
+    """
+    columns = []
+    if index:
+        columns += [("Index", series_values(df.index.to_series()))]
+    for i, name in enumerate(df.columns):
+        columns += [(str(name), series_values(df.iloc[:, i]))]
+    return columns
+
+
+def series_values(series):
+    if pd.api.types.is_float_dtype(series.dtype) and isinstance(series.dtype, np.dtype):
+        # keep NaN values as NaN rather than null, as json.dumps would
+        return pa.array(series.to_numpy(), from_pandas=False)
+    try:
+        values = pa.array(series, from_pandas=True)
+    except (pa.ArrowException, TypeError, ValueError):
+        return series.tolist()
+    if series.dtype == object:
+        t = values.type
+        if not (pa.types.is_string(t) or pa.types.is_integer(t) or pa.types.is_boolean(t) or pa.types.is_null(t)):
+            return series.tolist()
+    return values
+
+
+def table_columns(table):
+    return [(name, table.column(i)) for i, name in enumerate(table.column_names)]
+
+
+def slice_values(values, offset, length):
+    if isinstance(values, list):
+        return values[offset:offset+length]
+    return values.slice(offset, length)
+
+
+def encode_strings(values, encoder):
+    """
+    encode_strings encodes an array of strings as JSON strings.  Strings that do not need escaping are quoted with
+    vectorized compute functions and the rest are escaped with the json module's string encoder.
+    """
+    if encoder.ensure_ascii:
+        escape = json.encoder.encode_basestring_ascii
+        pattern = r'[^ -~]|["\\]'
+    else:
+        escape = json.encoder.encode_basestring
+        pattern = r'[\x00-\x1f"\\]'
+    if pa.types.is_large_string(values.type) or pa.types.is_string_view(values.type):
+        values = pc.cast(values, pa.string())
+    quoted = pc.binary_join_element_wise('"', values, '"', "")
+    needs_escape = pc.fill_null(pc.match_substring_regex(values, pattern), False)
+    if not pc.any(needs_escape).as_py():
+        return quoted
+    escaped = pa.array(map(escape, pc.filter(values, needs_escape).to_pylist()), pa.string())
+    return pc.replace_with_mask(quoted, needs_escape, escaped)
+
+
+def encode_floats(values, encoder):
+    # python's float repr is not the same as arrow's cast to string, e.g., 1.0 and 1e-05
+    floats = pc.cast(pc.fill_null(values, 0), pa.float64()).to_numpy(zero_copy_only=False).tolist()
+    encoded = pa.array(map(float.__repr__, floats), pa.string())
+    non_finite = pc.fill_null(pc.invert(pc.is_finite(values)), False)
+    if pc.any(non_finite).as_py():
+        if not encoder.allow_nan:
+            raise ValueError("Out of range float values are not JSON compliant")
+        encoded = pc.if_else(
+            non_finite,
+            pc.if_else(
+                pc.is_nan(values),
+                "NaN",
+                pc.if_else(pc.greater(values, 0), "Infinity", "-Infinity")
+            ),
+            encoded
+        )
+    return pc.if_else(pc.is_null(values), pa.scalar(None, pa.string()), encoded)
+
+
+def encode_temporal(values, encoder):
+    t = values.type
+    date = pa.types.is_date(t)
+    if date:
+        format = getattr(encoder, "date_format", "%Y-%m-%d")
+        result = arrow_time_format(format, date=True)
+    else:
+        format = getattr(encoder, "timestamp_format", "%Y-%m-%dT%H:%M:%S.%f%z")
+        result = arrow_time_format(format, tz=t.tz)
+    # python does not pad years before 1000, while arrow does
+    if result is not None:
+        min_year = pc.min(pc.year(values)).as_py()
+        if min_year is not None and min_year < 1000:
+            result = None
+    if result is None:
+        return encode_objects(values.to_pandas().tolist() if not date else values.to_pylist(), encoder)
+    format, unit = result
+    if unit is not None:
+        values = pc.cast(values, pa.timestamp(unit, tz=t.tz), safe=False)
+    # casting to a string produces the iso format much faster than strftime
+    if date and format == "%Y-%m-%d":
+        formatted = pc.cast(values, pa.string())
+    elif (not date) and t.tz is None and format in ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"]:
+        formatted = pc.cast(values, pa.string())
+        if "T" in format:
+            formatted = pc.replace_substring(formatted, " ", "T", max_replacements=1)
+    else:
+        formatted = pc.strftime(values, format=format)
+    return pc.binary_join_element_wise('"', formatted, '"', "")
+
+
+def encode_objects(values, encoder, drop_nulls=None, drop_blanks=None):
+    """
+    encode_objects encodes each python object using the encoder, which is the fallback for columns without a
+    vectorized encoding.
+    """
+    encoded = []
+    for v in values:
+        if (drop_nulls and libmissing.checknull(v)) or (drop_blanks and isinstance(v, str) and v == ""):
+            encoded += [None]
+        elif v is None or v is pd.NaT or v is pd.NA:
+            encoded += ["null"]
+        elif drop_nulls or drop_blanks:
+            encoded += [encoder.encode(clean(v, drop_nulls=drop_nulls, drop_blanks=drop_blanks))]
+        else:
+            encoded += [encoder.encode(v)]
+    return pa.array(encoded, pa.string())
+
+
+def encode_values(values, encoder, drop_nulls=None, drop_blanks=None):
+    """
+    encode_values encodes each value in the column as a JSON value.  Values that are dropped are returned as nulls,
+    and the values to drop are found with a single vectorized mask.
+    """
+    if isinstance(values, list):
+        return encode_objects(values, encoder, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+
+    if pa.types.is_dictionary(values.type):
+        values = values.dictionary_decode()
+
+    t = values.type
+    if pa.types.is_null(t):
+        return pa.nulls(len(values), pa.string()) if drop_nulls else pa.array(["null"] * len(values), pa.string())
+
+    mask = drop_mask(values, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+    if mask is not None and pa.types.is_floating(t):
+        # dropped NaN values are never encoded, so they cannot fail when allow_nan is false
+        values = pc.if_else(mask, pa.scalar(None, t), values)
+
+    if pa.types.is_boolean(t):
+        encoded = pc.if_else(values, "true", "false")
+    elif pa.types.is_integer(t):
+        encoded = pc.cast(values, pa.string())
+    elif pa.types.is_floating(t):
+        encoded = encode_floats(values, encoder)
+    elif pa.types.is_string(t) or pa.types.is_large_string(t) or pa.types.is_string_view(t):
+        encoded = encode_strings(values, encoder)
+    elif pa.types.is_decimal(t):
+        if getattr(encoder, "decimal_format", "float") == "string":
+            encoded = pc.binary_join_element_wise('"', pc.cast(values, pa.string()), '"', "")
+        else:
+            encoded = pa.array(
+                [None if v is None else float.__repr__(float(v)) for v in values.to_pylist()],
+                pa.string()
+            )
+    elif pa.types.is_date(t) or pa.types.is_timestamp(t):
+        encoded = encode_temporal(values, encoder)
+    else:
+        encoded = encode_objects(values.to_pylist(), encoder, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+
+    if not drop_nulls:
+        encoded = pc.fill_null(encoded, "null")
+
+    if mask is not None:
+        encoded = pc.if_else(mask, pa.scalar(None, pa.string()), encoded)
+
+    return encoded
+
+
+def concat_strings(values):
+    """
+    concat_strings returns the concatenation of all the strings in the array as bytes, read directly from the data
+    buffer of the array.
+    """
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    if len(values) == 0:
+        return b""
+    _, offsets, data = values.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int32)[values.offset:values.offset+len(values)+1]
+    return data.slice(int(offsets[0]), int(offsets[-1] - offsets[0])).to_pybytes()
+
+
+def encode_jsonl(columns, length, encoder, drop_nulls=None, drop_blanks=None):
+    """
+    encode_jsonl encodes length rows of the columns as JSON lines, and returns the lines as bytes.  Each column is
+    encoded into JSON fragments with vectorized compute functions and the fragments are joined into lines.
+    """
+    # each field is prefixed with the item separator and dropped fields are empty, so that every row has a body even
+    # if all of its fields are dropped, and the separator before the first field is removed from the body
+    separator = encoder.item_separator
+    fields = []
+    for name, values in columns:
+        encoded = encode_values(values, encoder, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+        field = pc.binary_join_element_wise(separator + encoder.encode(name) + encoder.key_separator, encoded, "")
+        fields += [pc.fill_null(field, "")]
+    if len(fields) == 0:
+        return b"{}\n" * length
+    body = pc.utf8_slice_codeunits(pc.binary_join_element_wise(*fields, ""), len(separator))
+    return concat_strings(pc.binary_join_element_wise("{", body, "}\n", ""))
+
+
+def write_bytes(f, data):
+    """
+    write_bytes writes utf-8 encoded data to the writer without decoding it, unless the writer only accepts text.
+    """
+    if hasattr(f, "write_bytes"):
+        f.write_bytes(data)
+    else:
+        f.write(bytes(data).decode("utf-8"))
+
+
+def write_jsonl_columns(
+    data=None,
+    drop_blanks=None,
+    drop_nulls=None,
+    f=None,
+    index=False,
+    limit=None,
+    kwargs=None,
+    chunk_size=None
+):
+    """
+    write_jsonl_columns writes a data frame or pyarrow Table as JSON lines, encoding chunk_size rows at a time.
+    """
+
+    kwargs = dict(kwargs)
+    cls = kwargs.pop("cls", None) or json.JSONEncoder
+    encoder = cls(**kwargs)
+
+    if isinstance(data, pd.DataFrame):
+        columns = dataframe_columns(data, index=index)
+    elif isinstance(data, pa.Table):
+        columns = table_columns(data)
+    else:
+        raise Exception("unknown data type {}".format(type(data)))
+
+    length = len(data)
+    if limit is not None and limit > 0 and limit < length:
+        length = limit
+
+    chunk_size = chunk_size if chunk_size is not None and chunk_size > 0 else 65536
+
+    for offset in range(0, length, chunk_size):
+        n = min(chunk_size, length - offset)
+        chunk = encode_jsonl(
+            [(name, slice_values(values, offset, n)) for name, values in columns],
+            n,
+            encoder,
+            drop_nulls=drop_nulls,
+            drop_blanks=drop_blanks
+        )
+        write_bytes(f, chunk)
+
+
+def to_table(data, index=False):
+    """
+    to_table returns the data frame, record batch, or table as a pyarrow Table.  If index is true, then the index of
+    a data frame is included as the first column named "Index".
+    """
+    if isinstance(data, pa.Table):
+        return data
+    elif isinstance(data, pa.RecordBatch):
+        return pa.Table.from_batches([data])
+    elif isinstance(data, pd.DataFrame):
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        if index:
+            table = table.add_column(0, "Index", pa.array(data.index.to_series(), from_pandas=True))
+        return table
+    raise Exception("unknown data type {}".format(type(data)))
+
+
+def encode_csv(columns, length, delimiter):
+    """
+    encode_csv encodes length rows of the columns as csv lines, and returns the lines as bytes.  Only the values that
+    contain the delimiter, a quote, or a line break are quoted, as by the python csv writer.  If no value needs quotes,
+    then the lines are written by the arrow csv writer without quoting.  Otherwise, each column is cast to strings, as
+    by the arrow csv writer, and the values are quoted and joined into lines with vectorized compute functions.
+    """
+    pattern = "[" + re.escape(delimiter) + '"\r\n]'
+    arrays = []
+    quotes = []
+    for values in columns:
+        if isinstance(values, pa.ChunkedArray):
+            values = values.combine_chunks()
+        if pa.types.is_dictionary(values.type):
+            values = values.dictionary_decode()
+        t = values.type
+        needs_quote = None
+        if pa.types.is_string(t) or pa.types.is_large_string(t) or pa.types.is_string_view(t):
+            needs_quote = pc.fill_null(pc.match_substring_regex(values, pattern), False)
+        if len(columns) == 1:
+            # the python writer quotes the only field of a row if it is empty, so that the row is not blank
+            empty = pc.is_null(values) if needs_quote is None else pc.fill_null(pc.equal(values, ""), True)
+            needs_quote = empty if needs_quote is None else pc.or_(needs_quote, empty)
+        arrays += [values]
+        quotes += [needs_quote if needs_quote is not None and pc.any(needs_quote).as_py() else None]
+
+    if len(arrays) == 0:
+        return b"\r\n" * length
+
+    if all(needs_quote is None for needs_quote in quotes):
+        buf = pa.BufferOutputStream()
+        pacsv.write_csv(
+            pa.table(arrays, names=[str(i) for i in range(len(arrays))]),
+            buf,
+            write_options=pacsv.WriteOptions(
+                include_header=False,
+                delimiter=delimiter,
+                eol="\r\n",
+                quoting_style="none"
+            )
+        )
+        return memoryview(buf.getvalue())
+
+    fields = []
+    for values, needs_quote in zip(arrays, quotes):
+        values = pc.fill_null(pc.cast(values, pa.string()), "")
+        if needs_quote is not None:
+            quoted = pc.binary_join_element_wise('"', pc.replace_substring(values, '"', '""'), '"', "")
+            values = pc.if_else(needs_quote, quoted, values)
+        fields += [values]
+    return concat_strings(pc.binary_join_element_wise(pc.binary_join_element_wise(*fields, delimiter), "\r\n", ""))
+
+
+def write_csv_table(
+    data=None,
+    drop_blanks=None,
+    drop_nulls=None,
+    f=None,
+    format=None,
+    columns=None,
+    header=True,
+    index=False,
+    limit=None,
+    chunk_size=None
+):
+    """
+    write_csv_table writes a data frame, record batch, or pyarrow Table as csv or tsv, formatting chunk_size rows at a
+    time.  The columns are written in sorted order, unless columns is given.  Values are quoted only when needed, so
+    that the output is the same as the output of the python csv writer.
+    """
+    table = to_table(data, index=index)
+
+    table = table.select(columns or sorted(table.column_names))
+
+    if limit is not None and limit > 0 and limit < len(table):
+        table = table.slice(0, limit)
+
+    if drop_nulls or drop_blanks:
+        # the python writer drops NaN and blank values, so write them as nulls
+        table = clean_table(table, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+
+    delimiter = "\t" if format == "tsv" else ","
+
+    if header:
+        buf = io.StringIO()
+        csv.writer(buf, delimiter=delimiter).writerow(table.column_names)
+        write_bytes(f, buf.getvalue().encode("utf-8"))
+
+    chunk_size = chunk_size if chunk_size is not None and chunk_size > 0 else 65536
+
+    for offset in range(0, len(table), chunk_size):
+        chunk = table.slice(offset, chunk_size)
+        write_bytes(f, encode_csv(chunk.columns, len(chunk), delimiter))
@@ -6,15 +6,338 @@
 # =================================================================
 
 import csv
+import fnmatch
 import gzip
 import io
+import itertools
 import json
 import sys
-import zipfile
 
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.json as pajson
 import pyarrow.parquet as pq
 
+from pyserializer.backend import create_backend
 from pyserializer.cleaner import clean
+from pyserializer.inputs import is_pattern, map_inputs
+from pyserializer.reader import create_reader, open_zip
+
+
+def csv_options(format=None, columns=None, infer_types=None, drop_blanks=None, block_size=None):
+    """
+    csv_options returns the read, parse, and convert options for the arrow csv reader.  Unless infer_types is set,
+    every column is read as a string, matching the values returned by the python engine.  If drop_blanks is set, then
+    blank values are read as nulls.
+    """
+    read_options = pacsv.ReadOptions(use_threads=True)
+    if block_size is not None and block_size > 0:
+        read_options.block_size = block_size
+    parse_options = pacsv.ParseOptions(delimiter=("\t" if format == "tsv" else ","))
+    convert_options = pacsv.ConvertOptions()
+    if not infer_types:
+        convert_options.default_column_type = pa.string()
+    if columns is not None and len(columns) > 0:
+        convert_options.include_columns = columns
+    if drop_blanks:
+        convert_options.null_values = [""]
+        convert_options.strings_can_be_null = True
+    return read_options, parse_options, convert_options
+
+
+def read_csv_arrow(r, format=None, columns=None, infer_types=None, drop_blanks=None, block_size=None):
+    read_options, parse_options, convert_options = csv_options(
+        format=format,
+        columns=columns,
+        infer_types=infer_types,
+        drop_blanks=drop_blanks,
+        block_size=block_size
+    )
+    return pacsv.read_csv(r.f, read_options=read_options, parse_options=parse_options, convert_options=convert_options)
+
+
+def iter_csv_arrow(r, format=None, columns=None, infer_types=None, drop_blanks=None, block_size=None):
+    read_options, parse_options, convert_options = csv_options(
+        format=format,
+        columns=columns,
+        infer_types=infer_types,
+        drop_blanks=drop_blanks,
+        block_size=block_size
+    )
+    yield from pacsv.open_csv(
+        r.f,
+        read_options=read_options,
+        parse_options=parse_options,
+        convert_options=convert_options
+    )
+
+
+def json_options(schema=None, block_size=None):
+    """
+    json_options returns the read and parse options for the arrow json reader.  If a schema is given, then the fields
+    in the schema are parsed using the schema and any other fields are inferred.
+    """
+    read_options = pajson.ReadOptions(use_threads=True)
+    if block_size is not None and block_size > 0:
+        read_options.block_size = block_size
+    parse_options = pajson.ParseOptions()
+    if schema is not None:
+        parse_options.explicit_schema = schema
+        parse_options.unexpected_field_behavior = "infer"
+    return read_options, parse_options
+
+
+def read_jsonl_arrow(r, columns=None, schema=None, block_size=None):
+    read_options, parse_options = json_options(schema=schema, block_size=block_size)
+    table = pajson.read_json(r.f, read_options=read_options, parse_options=parse_options)
+    if columns is not None and len(columns) > 0:
+        return table.select(columns)
+    return table
+
+
+def iter_jsonl_arrow(r, columns=None, schema=None, block_size=None):
+    read_options, parse_options = json_options(schema=schema, block_size=block_size)
+    for batch in pajson.open_json(r.f, read_options=read_options, parse_options=parse_options):
+        if columns is not None and len(columns) > 0:
+            yield batch.select(columns)
+        else:
+            yield batch
+
+
+def parquet_filter(filters=None):
+    """
+    parquet_filter returns the filters as a dataset expression.  Filters are either an expression, such as
+    pc.field("year") == 2020, or a list of tuples in disjunctive normal form, such as [("year", "=", 2020)].
+    """
+    if filters is None or isinstance(filters, pc.Expression):
+        return filters
+    if len(filters) == 0:
+        return None
+    return pq.filters_to_expression(filters)
+
+
+def parquet_scanner(
+    src=None,
+    columns=None,
+    schema=None,
+    filters=None,
+    fs=None,
+    buffer_size=None,
+    batch_size=None,
+    threads=None,
+    batch_readahead=None,
+    fragment_readahead=None
+):
+    """
+    parquet_scanner returns a scanner for the parquet file or dataset at src, which reads only the given columns.  The
+    filters are pushed down to the scan, so files in hive partitions and row groups whose statistics do not match the
+    filters are skipped without being read.
+
+    Unless threads is False, the scanner decodes row groups in parallel and reads ahead up to fragment_readahead files
+    and batch_readahead batches per file at once, so that reading a dataset of many small files from object storage is
+    not bound by the latency of each request.  The column chunks of each row group are pre-buffered, so that adjacent
+    ranges are coalesced into fewer and larger reads.
+    """
+    dataset = ds.dataset(src, format="parquet", filesystem=fs, schema=schema, partitioning="hive")
+    kwargs = {}
+    if batch_readahead is not None and batch_readahead > 0:
+        kwargs["batch_readahead"] = batch_readahead
+    if fragment_readahead is not None and fragment_readahead > 0:
+        kwargs["fragment_readahead"] = fragment_readahead
+    if buffer_size is not None and buffer_size > 0:
+        fragment_scan_options = ds.ParquetFragmentScanOptions(
+            use_buffered_stream=True,
+            buffer_size=buffer_size,
+            pre_buffer=True
+        )
+    else:
+        fragment_scan_options = ds.ParquetFragmentScanOptions(pre_buffer=True)
+    return dataset.scanner(
+        columns=(columns if columns is not None and len(columns) > 0 else None),
+        filter=parquet_filter(filters),
+        batch_size=batch_size if batch_size is not None and batch_size > 0 else 131072,
+        use_threads=(threads is None or threads),
+        fragment_scan_options=fragment_scan_options,
+        **kwargs
+    )
+
+
+def read_parquet_arrow(
+    src=None,
+    columns=None,
+    schema=None,
+    filters=None,
+    fs=None,
+    buffer_size=None,
+    threads=None,
+    batch_readahead=None,
+    fragment_readahead=None
+):
+    return parquet_scanner(
+        src=src,
+        columns=columns,
+        schema=schema,
+        filters=filters,
+        fs=fs,
+        buffer_size=buffer_size,
+        threads=threads,
+        batch_readahead=batch_readahead,
+        fragment_readahead=fragment_readahead
+    ).to_table()
+
+
+def iter_parquet_arrow(
+    src=None,
+    columns=None,
+    schema=None,
+    filters=None,
+    fs=None,
+    buffer_size=None,
+    batch_size=None,
+    threads=None,
+    batch_readahead=None,
+    fragment_readahead=None
+):
+    """
+    iter_parquet_arrow yields the record batches of the parquet file or dataset at src, in order, with at most
+    batch_size rows each.  Batches are decoded ahead in parallel while the caller consumes earlier batches.
+    """
+    scanner = parquet_scanner(
+        src=src,
+        columns=columns,
+        schema=schema,
+        filters=filters,
+        fs=fs,
+        buffer_size=buffer_size,
+        batch_size=batch_size,
+        threads=threads,
+        batch_readahead=batch_readahead,
+        fragment_readahead=fragment_readahead
+    )
+    for batch in scanner.to_batches():
+        if batch.num_rows > 0:
+            yield batch
+
+
+def deserialize_arrow(
+    src=None,
+    format=None,
+    compression=None,
+    columns=None,
+    schema=None,
+    filters=None,
+    fs=None,
+    drop_blanks=None,
+    infer_types=None,
+    name=None,
+    block_size=None,
+    buffer_size=None,
+    threads=None,
+    batch_readahead=None,
+    fragment_readahead=None
+):
+    """
+    deserialize_arrow reads the source into a pyarrow Table using the multithreaded arrow readers.
+    """
+    if format == "parquet":
+        if src == "-":
+            raise Exception("cannot read parquet from stdin")
+        return read_parquet_arrow(
+            src=src,
+            columns=columns,
+            schema=schema,
+            filters=filters,
+            fs=fs,
+            buffer_size=buffer_size,
+            threads=threads,
+            batch_readahead=batch_readahead,
+            fragment_readahead=fragment_readahead
+        )
+    elif format == "csv" or format == "tsv":
+        with create_reader(compression=compression, f=src, fs=fs, name=name) as r:
+            return read_csv_arrow(
+                r,
+                format=format,
+                columns=columns,
+                infer_types=infer_types,
+                drop_blanks=drop_blanks,
+                block_size=block_size
+            )
+    elif format == "jsonl":
+        with create_reader(compression=compression, f=src, fs=fs, name=name) as r:
+            return read_jsonl_arrow(r, columns=columns, schema=schema, block_size=block_size)
+    else:
+        raise Exception("invalid format for arrow engine {}".format(format))
+
+
+def match_members(src=None, fs=None, pattern=None):
+    """
+    match_members returns the names of the files in the zip archive at src that match the glob pattern, in the order
+    they are stored.  If pattern is None, then every file is returned.  If a file is named pattern, such as data[1].csv,
+    then only that file is returned.
+    """
+    zf, parents = open_zip(src, fs=fs)
+    try:
+        members = [info.filename for info in zf.infolist() if not info.is_dir()]
+    finally:
+        zf.close()
+        for parent in parents:
+            parent.close()
+    if pattern is None:
+        return members
+    if pattern in members:
+        return [pattern]
+    return [member for member in members if fnmatch.fnmatchcase(member, pattern)]
+
+
+def is_member_pattern(src=None, fs=None, name=None):
+    """
+    is_member_pattern returns True if name selects many members of the zip archive at src, because it is None or is a
+    glob pattern that is not the name of a member.
+    """
+    if name is None:
+        return True
+    if not is_pattern(name):
+        return False
+    if src == "-":
+        return True
+    return match_members(src=src, fs=fs, pattern=name) != [name]
+
+
+def deserialize_members(src=None, format=None, fs=None, name=None, workers=None, separate=False, **kwargs):
+    """
+    deserialize_members reads every file in the zip archive at src that matches the glob pattern name, decoding the
+    members concurrently on a pool of workers.  Each worker opens the archive itself, so that members on object storage
+    are fetched with concurrent range requests.  If separate is True, then deserialize_members returns a dict of the
+    data for each member, in the order they are stored.  Otherwise, the data of all the members is concatenated.
+    """
+    if src == "-":
+        raise Exception("cannot unzip stdin")
+
+    members = match_members(src=src, fs=fs, pattern=name)
+
+    if len(members) == 0:
+        raise Exception("no members of {} match {}".format(src, name))
+
+    data = {}
+    for member, result, err in map_inputs(
+        lambda member: deserialize(src=src, format=format, compression="zip", fs=fs, name=member, **kwargs),
+        members,
+        workers=workers
+    ):
+        if err is not None:
+            raise Exception("error reading member {} of {}: {}".format(member, src, err))
+        data[member] = result
+
+    if separate:
+        return data
+
+    results = list(data.values())
+    if all(isinstance(x, pa.Table) for x in results):
+        return pa.concat_tables(results, promote_options="default")
+    return [x for result in results for x in result]
 
 
 def deserialize(
@@ -27,9 +350,83 @@ def deserialize(
     fs=None,
     drop_blanks=None,
     drop_nulls=None,
-    name=None
+    name=None,
+    engine=None,
+    columns=None,
+    infer_types=None,
+    block_size=None,
+    json_backend=None,
+    threads=None,
+    batch_readahead=None,
+    fragment_readahead=None,
+    member_workers=None,
+    separate_members=False
 ):
 
+    # a pattern selects many members of a zip archive, which are decoded concurrently
+    if compression == "zip" and (separate_members or is_member_pattern(src=src, fs=fs, name=name)):
+        return deserialize_members(
+            src=src,
+            format=format,
+            fs=fs,
+            name=name,
+            workers=member_workers,
+            separate=separate_members,
+            schema=schema,
+            drop_blanks=drop_blanks,
+            drop_nulls=drop_nulls,
+            engine=engine,
+            columns=columns,
+            infer_types=infer_types,
+            block_size=block_size,
+            json_backend=json_backend
+        )
+
+    if engine == "arrow":
+        return deserialize_arrow(
+            src=src,
+            format=format,
+            compression=compression,
+            columns=columns,
+            schema=schema,
+            filters=filters,
+            fs=fs,
+            drop_blanks=drop_blanks,
+            infer_types=infer_types,
+            name=name,
+            block_size=block_size,
+            buffer_size=buffer_size,
+            threads=threads,
+            batch_readahead=batch_readahead,
+            fragment_readahead=fragment_readahead
+        )
+    elif engine is not None and engine != "python":
+        raise Exception("invalid engine {}".format(engine))
+
+    backend = create_backend(json_backend)
+
+    # streaming codecs and zip members are decompressed by the reader as the input is read
+    if compression in ["bzip2", "lz4", "xz", "zip", "zstd"]:
+        if src == "-" and compression == "zip":
+            raise Exception("cannot unzip stdin")
+        if format == "json":
+            with create_reader(compression=compression, f=src, fs=fs, name=name) as r:
+                data = backend.load(r.text())
+        elif format in ["csv", "jsonl", "tsv"]:
+            data = list(iter_records(
+                src=src,
+                format=format,
+                compression=compression,
+                fs=fs,
+                name=name,
+                backend=backend
+            ))
+        else:
+            raise Exception("cannot read {} with {} compression".format(format, compression))
+        if drop_nulls or drop_blanks:
+            return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+        return data
+
     if format == "csv" or format == "tsv":
         if compression == "gzip":
             if src == "-":
@@ -55,23 +452,6 @@ def deserialize(
                     if drop_nulls or drop_blanks:
                         return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
                     return data
-        elif compression == "zip":
-            if src == "-":
-                raise Exception("cannot unzip stdout")
-            else:
-                if fs is not None:
-                    raise Exception("cannot unzip from filesystem")
-                else:
-                    data = None
-                    with zipfile.ZipFile(src, 'r') as zf:
-                        with zf.open(name, 'r') as f:
-                            data = [x for x in csv.DictReader(
-                                io.TextIOWrapper(f),
-                                delimiter=("\t" if format == "tsv" else ",")
-                            )]
-                    if drop_nulls or drop_blanks:
-                        return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
-                    return data
         else:
             if src == "-":
                 data = [x for x in csv.DictReader(
@@ -101,7 +481,7 @@ def deserialize(
             if src == "-":
                 data = None
                 with gzip.open(sys.stdin.buffer, mode='rb') as f:
-                    data = json.load(f)
+                    data = backend.load(f)
                 if drop_nulls or drop_blanks:
                     return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
                 return data
@@ -110,20 +490,20 @@ def deserialize(
                     data = None
                     with fs.open(src, 'rb') as f:
                         with gzip.GzipFile(fileobj=f) as gf:
-                            data = json.load(gf)
+                            data = backend.load(gf)
                     if drop_nulls or drop_blanks:
                         return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
                     return data
                 else:
                     data = None
                     with gzip.open(src, 'rb') as f:
-                        data = json.load(f)
+                        data = backend.load(f)
                     if drop_nulls or drop_blanks:
                         return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
                     return data
         else:
             if src == "-":
-                data = json.load(sys.stdin.buffer)
+                data = backend.load(sys.stdin.buffer)
                 if drop_nulls or drop_blanks:
                     return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
                 return data
@@ -131,14 +511,14 @@ def deserialize(
                 if fs is not None:
                     data = None
                     with fs.open(src, 'rb') as f:
-                        data = json.load(f)
+                        data = backend.load(f)
                     if drop_nulls or drop_blanks:
                         return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
                     return data
                 else:
                     data = None
                     with open(src, 'rb') as f:
-                        data = json.load(f)
+                        data = backend.load(f)
                     if drop_nulls or drop_blanks:
                         return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
                     return data
@@ -148,7 +528,7 @@ def deserialize(
                 data = []
                 with gzip.open(sys.stdin.buffer, mode='rb') as f:
                     while (line := f.readline()):
-                        data += [json.loads(line[0:len(line)-1])]
+                        data += [backend.loads(line[0:len(line)-1])]
                 if drop_nulls or drop_blanks:
                     return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
                 return data
@@ -158,14 +538,14 @@ def deserialize(
                     with fs.open(src, 'rb') as f:
                         with gzip.GzipFile(fileobj=f) as gf:
                             while (line := gf.readline()):
-                                data += [json.loads(line[0:len(line)-1])]
+                                data += [backend.loads(line[0:len(line)-1])]
                     if drop_nulls or drop_blanks:
                         return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
                     return data
                 else:
                     data = []
                     with gzip.open(src, 'rt') as f:
-                        data += [json.loads(line) for line in f.readlines()]
+                        data += [backend.loads(line) for line in f.readlines()]
                     if drop_nulls or drop_blanks:
                         return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
                     return data
@@ -173,7 +553,7 @@ def deserialize(
             if src == "-":
                 data = []
                 while (line := sys.stdin.buffer.readline()):
-                    data += [json.loads(line[0:len(line)-1])]
+                    data += [backend.loads(line[0:len(line)-1])]
                 if drop_nulls or drop_blanks:
                     return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
                 return data
@@ -182,7 +562,7 @@ def deserialize(
                     data = []
                     with fs.open(src, 'rb') as f:
                         while (line := f.readline()):
-                            data += [json.loads(line[0:len(line)-1])]
+                            data += [backend.loads(line[0:len(line)-1])]
                     if drop_nulls or drop_blanks:
                         return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
                     return data
@@ -191,25 +571,324 @@ def deserialize(
                     with open(src, 'rb') as f:
                         while (line := f.readline()):
                             if line[len(line)-1] == '\n':
-                                data += [json.loads(line[0:len(line)-1])]
+                                data += [backend.loads(line[0:len(line)-1])]
                             else:
-                                data += [json.loads(line)]
+                                data += [backend.loads(line)]
                     if drop_nulls or drop_blanks:
                         return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
                     return data
     elif format == "parquet":
-        dataset = pq.ParquetDataset(
-            src,
+        table = read_parquet_arrow(
+            src=src,
+            columns=columns,
             schema=schema,
             filters=filters,
-            validate_schema=False,
-            buffer_size=buffer_size if buffer_size is not None else 4096,
-            filesystem=fs,
+            fs=fs,
+            buffer_size=buffer_size,
+            threads=threads,
+            batch_readahead=batch_readahead,
+            fragment_readahead=fragment_readahead
         )
-        data = dataset.read().to_pandas().to_dict('records')
+        data = table.to_pandas().to_dict('records')
         if drop_nulls or drop_blanks:
             return clean(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
         return data
     else:
         raise Exception("invalid format "+format)
     return None
+
+
+def iter_batches(iterable, batch_size):
+    """
+    iter_batches groups the items from the iterable into lists of at most batch_size items.
+    """
+    it = iter(iterable)
+    while (batch := list(itertools.islice(it, batch_size))):
+        yield batch
+
+
+def iter_csv(r, format=None):
+    yield from csv.DictReader(r.text(), delimiter=("\t" if format == "tsv" else ","))
+
+
+def csv_fieldnames(src=None, format=None, compression=None, fs=None, name=None):
+    """
+    csv_fieldnames returns the names of the columns in the header of the csv or tsv file, reading only the first line.
+    """
+    with create_reader(compression=compression, f=src, fs=fs, name=name) as r:
+        return next(csv.reader(r.text(), delimiter=("\t" if format == "tsv" else ",")), [])
+
+
+def iter_json(r, chunk_size=None, backend=None):
+    """
+    iter_json yields each item of a top-level JSON array without reading the whole array into memory.  If the document
+    is not an array, then iter_json yields the document itself.
+    """
+    chunk_size = chunk_size if chunk_size is not None and chunk_size > 0 else 65536
+    decoder = json.JSONDecoder()
+    t = r.text()
+    buf = ""
+    pos = 0
+    eof = False
+
+    # skip whitespace, reading more text as needed, and return the next character or None at the end of the input.
+    def peek():
+        nonlocal buf, pos, eof
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\n\r":
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if eof:
+                return None
+            chunk = t.read(chunk_size)
+            eof = len(chunk) == 0
+            buf += chunk
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = t.read(chunk_size)
+        eof = len(chunk) == 0
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    c = peek()
+    if c is None:
+        return
+    if c != "[":
+        yield (backend or create_backend()).loads(buf[pos:] + t.read())
+        return
+    pos += 1
+    if peek() == "]":
+        return
+    while True:
+        if peek() is None:
+            raise Exception("invalid json: unexpected end of array")
+        start = pos
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        # a value at the end of the buffer may be truncated, so confirm the delimiter that follows it is buffered.
+        pos = end
+        c = peek()
+        if c not in (",", "]"):
+            if c is None or eof:
+                raise Exception("invalid json: expecting , or ] at position {}".format(pos))
+            pos = start
+            fill()
+            continue
+        yield obj
+        pos += 1
+        if c == "]":
+            return
+        if pos > chunk_size:
+            buf = buf[pos:]
+            pos = 0
+
+
+def iter_jsonl(r, backend=None):
+    backend = backend or create_backend()
+    for line in r:
+        line = line.strip()
+        if len(line) > 0:
+            yield backend.loads(line)
+
+
+def iter_parquet(
+    src=None,
+    columns=None,
+    schema=None,
+    filters=None,
+    fs=None,
+    buffer_size=None,
+    batch_size=None,
+    threads=None,
+    batch_readahead=None,
+    fragment_readahead=None
+):
+    for batch in iter_parquet_arrow(
+        src=src,
+        columns=columns,
+        schema=schema,
+        filters=filters,
+        fs=fs,
+        buffer_size=buffer_size,
+        batch_size=batch_size,
+        threads=threads,
+        batch_readahead=batch_readahead,
+        fragment_readahead=fragment_readahead
+    ):
+        yield from batch.to_pylist()
+
+
+def iter_arrow(
+    src=None,
+    format=None,
+    compression=None,
+    columns=None,
+    schema=None,
+    filters=None,
+    fs=None,
+    drop_blanks=None,
+    infer_types=None,
+    name=None,
+    block_size=None,
+    buffer_size=None,
+    batch_size=None,
+    threads=None,
+    batch_readahead=None,
+    fragment_readahead=None
+):
+    if format == "parquet":
+        if src == "-":
+            raise Exception("cannot read parquet from stdin")
+        yield from iter_parquet_arrow(
+            src=src,
+            columns=columns,
+            schema=schema,
+            filters=filters,
+            fs=fs,
+            buffer_size=buffer_size,
+            batch_size=batch_size,
+            threads=threads,
+            batch_readahead=batch_readahead,
+            fragment_readahead=fragment_readahead
+        )
+        return
+    with create_reader(compression=compression, f=src, fs=fs, name=name) as r:
+        if format == "csv" or format == "tsv":
+            yield from iter_csv_arrow(
+                r,
+                format=format,
+                columns=columns,
+                infer_types=infer_types,
+                drop_blanks=drop_blanks,
+                block_size=block_size
+            )
+        elif format == "jsonl":
+            yield from iter_jsonl_arrow(r, columns=columns, schema=schema, block_size=block_size)
+        else:
+            raise Exception("invalid format for arrow engine {}".format(format))
+
+
+def iter_records(src=None, format=None, compression=None, fs=None, name=None, backend=None):
+    with create_reader(compression=compression, f=src, fs=fs, name=name) as r:
+        if format == "csv" or format == "tsv":
+            yield from iter_csv(r, format=format)
+        elif format == "json":
+            yield from iter_json(r, backend=backend)
+        elif format == "jsonl":
+            yield from iter_jsonl(r, backend=backend)
+
+
+def deserialize_iter(
+    src=None,
+    format=None,
+    compression=None,
+    schema=None,
+    filters=None,
+    fs=None,
+    drop_blanks=None,
+    drop_nulls=None,
+    name=None,
+    batch_size=None,
+    engine=None,
+    columns=None,
+    infer_types=None,
+    block_size=None,
+    buffer_size=None,
+    json_backend=None,
+    threads=None,
+    batch_readahead=None,
+    fragment_readahead=None
+):
+    """
+    deserialize_iter is the streaming counterpart to deserialize.  It returns an iterator that yields records one at a
+    time, or lists of at most batch_size records if batch_size is set, so that memory stays constant regardless of the
+    size of the input.  If engine is "arrow", then the iterator yields pyarrow record batches of about block_size bytes
+    of input each.  Parquet is read in batches of at most batch_size rows, which are scanned ahead in parallel unless
+    threads is False.  If the source is a zip archive and name is a glob pattern, then the matching members are read
+    one after another.
+    """
+
+    if compression == "zip" and is_member_pattern(src=src, fs=fs, name=name):
+        if src == "-":
+            raise Exception("cannot unzip stdin")
+        return itertools.chain.from_iterable(
+            deserialize_iter(
+                src=src,
+                format=format,
+                compression=compression,
+                schema=schema,
+                fs=fs,
+                drop_blanks=drop_blanks,
+                drop_nulls=drop_nulls,
+                name=member,
+                batch_size=batch_size,
+                engine=engine,
+                columns=columns,
+                infer_types=infer_types,
+                block_size=block_size,
+                json_backend=json_backend
+            )
+            for member in match_members(src=src, fs=fs, pattern=name)
+        )
+
+    if engine == "arrow":
+        return iter_arrow(
+            src=src,
+            format=format,
+            compression=compression,
+            columns=columns,
+            schema=schema,
+            filters=filters,
+            fs=fs,
+            drop_blanks=drop_blanks,
+            infer_types=infer_types,
+            name=name,
+            block_size=block_size,
+            buffer_size=buffer_size,
+            batch_size=batch_size,
+            threads=threads,
+            batch_readahead=batch_readahead,
+            fragment_readahead=fragment_readahead
+        )
+    elif engine is not None and engine != "python":
+        raise Exception("invalid engine {}".format(engine))
+
+    if format == "parquet":
+        if src == "-":
+            raise Exception("cannot read parquet from stdin")
+        records = iter_parquet(
+            src=src,
+            columns=columns,
+            schema=schema,
+            filters=filters,
+            fs=fs,
+            buffer_size=buffer_size,
+            batch_size=batch_size,
+            threads=threads,
+            batch_readahead=batch_readahead,
+            fragment_readahead=fragment_readahead)
+    elif format in ["csv", "json", "jsonl", "tsv"]:
+        records = iter_records(
+            src=src,
+            format=format,
+            compression=compression,
+            fs=fs,
+            name=name,
+            backend=create_backend(json_backend))
+    else:
+        raise Exception("invalid format {}".format(format))
+
+    if drop_nulls or drop_blanks:
+        records = (clean(x, drop_nulls=drop_nulls, drop_blanks=drop_blanks) for x in records)
+
+    if batch_size is not None and batch_size > 0:
+        return iter_batches(records, batch_size)
+
+    return records
@@ -11,54 +11,177 @@ import json
 import ipaddress
 
 import pandas as pd
+import pyarrow as pa
 import numpy as np
 
+# the default formats for dates, datetimes, and timestamps
+default_date_format = "%Y-%m-%d"
+default_datetime_format = "%Y-%m-%dT%H:%M:%S.%f%z"
 
-class Encoder(json.JSONEncoder):
+
+def format_iso_date(obj):
     """
-    Encoder extends the default JSON encoder to add support for new functions.
+    format_iso_date formats the date using the default date format, without calling strftime.
     """
+    # strftime does not zero-pad years before 1000, while isoformat does
+    if obj.year < 1000:
+        return obj.strftime(default_date_format)
+    return obj.isoformat()
 
-    def __init__(self, **kwargs):
-        formats = kwargs.pop("formats", {})
-        self.decimal_format = formats.pop("decimal", "float")
-        self.date_format = formats.pop("date", "%Y-%m-%d")
-        self.datetime_format = formats.pop("datetime", "%Y-%m-%dT%H:%M:%S.%f%z")
-        self.timestamp_format = formats.pop("timestamp", "%Y-%m-%dT%H:%M:%S.%f%z")
-        return super(Encoder, self).__init__(**kwargs)
 
-    def default(self, obj):
+def format_iso_datetime(obj):
+    """
+    format_iso_datetime formats the datetime or timestamp using the default datetime format, without calling strftime.
+    """
+    if obj.year < 1000:
+        return obj.strftime(default_datetime_format)
+    offset = obj.utcoffset()
+    if offset is None:
+        # call the datetime method directly, which is faster for timestamps and ignores nanoseconds as %f does
+        return datetime.datetime.isoformat(obj, timespec="microseconds")
+    # isoformat separates the hours and minutes of the offset with a colon, while %z does not
+    if offset.microseconds != 0 or offset.seconds % 60 != 0:
+        return obj.strftime(default_datetime_format)
+    minutes = int(offset.total_seconds()) // 60
+    return "{}{}{:02d}{:02d}".format(
+        datetime.datetime.isoformat(obj.replace(tzinfo=None), timespec="microseconds"),
+        "-" if minutes < 0 else "+",
+        abs(minutes) // 60,
+        abs(minutes) % 60)
+
+
+def create_formatter(format, default_format, default_formatter):
+    """
+    create_formatter returns a function that formats a date or datetime using the format.  The default format uses
+    a precompiled formatter rather than strftime.
+    """
+    if format == default_format:
+        return default_formatter
+    return lambda obj: obj.strftime(format)
+
+
+def encode_string(encoder, obj):
+    return str(obj)
+
+
+def encode_decimal(encoder, obj):
+    return str(obj) if encoder.decimal_format == "string" else float(obj)
+
+
+def encode_timestamp(encoder, obj):
+    return encoder.format_timestamp(obj)
+
 
-        if isinstance(obj, Exception):
-            return str(obj)
+def encode_datetime(encoder, obj):
+    return encoder.format_datetime(obj)
 
-        if isinstance(obj, decimal.Decimal):
-            return str(obj) if self.decimal_format == "string" else float(obj)
 
-        # timestamp comes before datetime, because a timestamp object is a subclass of datetime
-        if isinstance(obj, pd.Timestamp):
-            return obj.strftime(self.timestamp_format)
+def encode_date(encoder, obj):
+    return encoder.format_date(obj)
 
-        # datetime comes before date, because a datetime object is a subclass of date
-        if isinstance(obj, datetime.datetime):
-            return obj.strftime(self.datetime_format)
 
-        if isinstance(obj, datetime.date):
-            return obj.strftime(self.date_format)
+def encode_dataframe(encoder, obj):
+    return obj.to_dict('records')
 
-        if isinstance(obj, pd.DataFrame):
-            return obj.to_dict('records')
 
-        if isinstance(obj, np.integer):
-            return int(obj)
+def encode_table(encoder, obj):
+    return obj.to_pylist()
 
-        if isinstance(obj, np.floating):
-            return float(obj)
 
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
+def encode_integer(encoder, obj):
+    return int(obj)
+
+
+def encode_float(encoder, obj):
+    return float(obj)
+
+
+def encode_array(encoder, obj):
+    return obj.tolist()
+
+
+class Encoder(json.JSONEncoder):
+    """
+    Encoder extends the default JSON encoder to add support for new functions.  Values are encoded by the handler
+    registered for the nearest type in the method resolution order of the value, so a handler for a subclass, such
+    as pd.Timestamp, takes precedence over the handler for its parent class, such as datetime.datetime.
+    """
+
+    handlers = {
+        Exception: encode_string,
+        decimal.Decimal: encode_decimal,
+        pd.Timestamp: encode_timestamp,
+        datetime.datetime: encode_datetime,
+        datetime.date: encode_date,
+        pd.DataFrame: encode_dataframe,
+        pa.Table: encode_table,
+        pa.RecordBatch: encode_table,
+        np.integer: encode_integer,
+        np.floating: encode_float,
+        np.ndarray: encode_array,
+        ipaddress.IPv4Network: encode_string,
+        ipaddress.IPv6Network: encode_string,
+    }
+
+    # cache of resolved handlers keyed by the exact type of the value, which is reset when a handler is registered
+    resolved = {}
+
+    @classmethod
+    def register(cls, t, handler):
+        """
+        register registers the handler for values of type t on the encoder class and its subclasses that do not
+        override the handler.  The handler is called with the encoder and the value, and returns a JSON serializable
+        value.
+        """
+        if "handlers" not in cls.__dict__:
+            cls.handlers = dict(cls.handlers)
+        cls.handlers[t] = handler
+        # subclasses may inherit the handler, so reset their caches too
+        classes = [cls]
+        while len(classes) > 0:
+            c = classes.pop()
+            c.resolved = {}
+            classes += c.__subclasses__()
+
+    def __init__(self, **kwargs):
+        formats = kwargs.pop("formats", {})
+        handlers = kwargs.pop("handlers", None)
+        self.decimal_format = formats.pop("decimal", "float")
+        self.date_format = formats.pop("date", default_date_format)
+        self.datetime_format = formats.pop("datetime", default_datetime_format)
+        self.timestamp_format = formats.pop("timestamp", default_datetime_format)
+        self.format_date = create_formatter(self.date_format, default_date_format, format_iso_date)
+        self.format_datetime = create_formatter(self.datetime_format, default_datetime_format, format_iso_datetime)
+        self.format_timestamp = create_formatter(self.timestamp_format, default_datetime_format, format_iso_datetime)
+        if handlers is not None and len(handlers) > 0:
+            # handlers given to the encoder apply only to this encoder
+            self.handlers = {**self.handlers, **handlers}
+            self.resolved = {}
+        elif "resolved" not in type(self).__dict__:
+            # each encoder class has its own cache, since subclasses may have different handlers
+            type(self).resolved = {}
+        return super(Encoder, self).__init__(**kwargs)
+
+    def resolve(self, t):
+        """
+        resolve returns the handler for the type t, or None if no handler is registered for the type or its parents.
+        """
+        try:
+            return self.resolved[t]
+        except KeyError:
+            pass
+        handler = None
+        for parent in t.__mro__:
+            if parent in self.handlers:
+                handler = self.handlers[parent]
+                break
+        self.resolved[t] = handler
+        return handler
+
+    def default(self, obj):
 
-        if isinstance(obj, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
-            return str(obj)
+        handler = self.resolve(type(obj))
+        if handler is not None:
+            return handler(self, obj)
 
         return super(Encoder, self).default(obj)
@@ -0,0 +1,165 @@
+# =================================================================
+#
+# Work of the U.S. Department of Defense, Defense Digital Service.
+# Released as open source under the MIT License.  See LICENSE file.
+#
+# =================================================================
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import os
+import posixpath
+import sys
+
+extensions = {
+    "bzip2": ".bz2",
+    "csv": ".csv",
+    "gzip": ".gz",
+    "json": ".json",
+    "jsonl": ".jsonl",
+    "lz4": ".lz4",
+    "parquet": ".parquet",
+    "tsv": ".tsv",
+    "xz": ".xz",
+    "zip": ".zip",
+    "zstd": ".zst"
+}
+
+
+def is_pattern(path):
+    return any(c in path for c in "*?[")
+
+
+def is_hidden(path):
+    # files such as _SUCCESS and .crc files written by spark and hadoop are not data
+    name = path.rstrip("/").rsplit("/", 1)[-1]
+    return name.startswith("_") or name.startswith(".")
+
+
+def expand_inputs(src=None, fs=None):
+    """
+    expand_inputs returns the paths of the input files for the source, which is a path, a glob pattern, a directory or
+    prefix, or a list of any of them.  Directories and prefixes are expanded to all the files beneath them, in sorted
+    order, skipping hidden files.  Paths are on the given filesystem, or local if fs is None.  Each path is returned
+    once, in the order it is first found.
+    """
+    if isinstance(src, str):
+        src = [src]
+    paths = []
+    for item in src:
+        if item == "-":
+            paths += [item]
+        elif is_pattern(item):
+            found = sorted(fs.glob(item) if fs is not None else glob.glob(item, recursive=True))
+            if len(found) == 0:
+                raise Exception("no inputs match {}".format(item))
+            for path in found:
+                if fs is not None and fs.isdir(path):
+                    paths += [p for p in sorted(fs.find(path)) if not is_hidden(p)]
+                elif fs is None and os.path.isdir(path):
+                    paths += expand_inputs(path)
+                else:
+                    paths += [path]
+        elif fs is not None and fs.isdir(item):
+            paths += [p for p in sorted(fs.find(item)) if not is_hidden(p)]
+        elif fs is None and os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs[:] = sorted(d for d in dirs if not is_hidden(d))
+                paths += [os.path.join(root, f) for f in sorted(files) if not is_hidden(f)]
+        else:
+            paths += [item]
+    return list(dict.fromkeys(paths))
+
+
+def file_extension(format=None, compression=None):
+    """
+    file_extension returns the file extension for the format and compression, such as .jsonl.gz.  Parquet files are
+    compressed internally, so the compression is not included.
+    """
+    ext = extensions.get(format, "")
+    if compression is not None and len(compression) > 0 and format != "parquet":
+        ext += extensions.get(compression, "")
+    return ext
+
+
+def output_path(src=None, dest=None, format=None, compression=None, root=None):
+    """
+    output_path returns the path in the dest directory for the output of the input file at src.  The extensions of the
+    input format and compression are replaced by the extensions of the output format and compression, so that
+    data.jsonl.gz becomes data.csv when written as uncompressed csv.  If root is set, then the directories of src
+    below root are kept beneath dest, otherwise only the name of src is used.
+    """
+    if root is not None:
+        name = src.rstrip("/").removeprefix(root).lstrip("/")
+    else:
+        name = src.rstrip("/").rsplit("/", 1)[-1]
+    for suffix in [".bz2", ".gz", ".lz4", ".xz", ".zip", ".zst", ".zstd"]:
+        name = name.removesuffix(suffix)
+    for suffix in [".csv", ".json", ".jsonl", ".parquet", ".tsv"]:
+        name = name.removesuffix(suffix)
+    return dest.rstrip("/") + "/" + name + file_extension(format=format, compression=compression)
+
+
+def output_paths(paths=None, dest=None, format=None, compression=None):
+    """
+    output_paths returns a dict of the output path in the dest directory for each input path.  The directories of
+    each input below the deepest directory shared by all the inputs are kept, so that dt=1/part-0.jsonl and
+    dt=2/part-0.jsonl are written to different outputs.  If two inputs would still be written to the same output,
+    such as data.jsonl and data.jsonl.gz, then an exception is raised before any output is written.
+    """
+    parents = [posixpath.dirname(path.rstrip("/")) for path in paths]
+    try:
+        root = posixpath.commonpath(parents) if len(parents) > 0 else ""
+    except ValueError:
+        # absolute and relative paths share no directory
+        root = ""
+    outputs = {}
+    inputs = {}
+    for path in paths:
+        output = output_path(src=path, dest=dest, format=format, compression=compression, root=root)
+        if output in inputs:
+            raise Exception("inputs {} and {} are both written to {}".format(inputs[output], path, output))
+        inputs[output] = path
+        outputs[path] = output
+    return outputs
+
+
+def call_with_retries(func, path, retries=None):
+    """
+    call_with_retries calls func with the path, and calls it again up to retries times if it raises an exception.
+    Every failure is reported to stderr.  If the last attempt fails, then its exception is raised.
+    """
+    attempts = 1 + (retries if retries is not None and retries > 0 else 0)
+    for attempt in range(attempts):
+        try:
+            return func(path)
+        except Exception as err:
+            print("error processing input {} (attempt {} of {}): {}".format(path, attempt + 1, attempts, err),
+                  file=sys.stderr)
+            if attempt + 1 == attempts:
+                raise
+
+
+def map_inputs(func, paths, workers=None, retries=None):
+    """
+    map_inputs calls func for each path on a pool of workers, retrying each path up to retries times, and yields a
+    tuple of the path, the result, and the exception if every attempt failed.  Results are yielded in the order of
+    the paths, and at most workers paths are processed or waiting to be consumed at once, so that memory is bounded.
+    """
+    workers = workers if (workers is not None) and (workers > 0) else min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for path in paths:
+            if len(pending) >= workers:
+                yield result(*pending.popleft())
+            pending.append((path, executor.submit(call_with_retries, func, path, retries=retries)))
+        while len(pending) > 0:
+            yield result(*pending.popleft())
+
+
+def result(path, future):
+    try:
+        return path, future.result(), None
+    except Exception as err:
+        return path, None, err
@@ -5,13 +5,71 @@
 #
 # =================================================================
 
+from collections import OrderedDict
 import os
+from concurrent.futures import ThreadPoolExecutor
 
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 import pyarrow as pa
 import pandas as pd
 
 
+def group_keys(table, columns):
+    """
+    group_keys returns a table of the columns, with dictionary (categorical) columns decoded to their values, since
+    dictionary arrays cannot be sorted or compared directly.
+    """
+    keys = []
+    for column in columns:
+        values = table.column(column)
+        if pa.types.is_dictionary(values.type):
+            values = values.cast(values.type.value_type)
+        keys += [values]
+    return pa.table(keys, names=columns)
+
+
+def group_table(table, columns, dropna=True):
+    """
+    group_table yields a tuple of the values of the columns and a table of the matching rows for each distinct
+    combination of values, in ascending order, like DataFrame.groupby.  The rows are sorted once by the columns, and
+    each group is a zero-copy slice of the sorted table.  If dropna is True, then rows where any of the columns is null
+    or NaN are dropped.  Otherwise, null and NaN values are grouped together after all other values.  Dictionary
+    (categorical) columns are grouped by their values, and keep their type in the groups.
+    """
+    keys = group_keys(table, columns)
+    if dropna:
+        mask = None
+        for column in columns:
+            valid = pc.invert(pc.is_null(keys.column(column), nan_is_null=True))
+            mask = valid if mask is None else pc.and_(mask, valid)
+        if mask is not None and pc.all(mask).as_py() is not True:
+            table = table.filter(mask)
+            keys = keys.filter(mask)
+    if table.num_rows == 0:
+        return
+    indices = pc.sort_indices(keys, sort_keys=[(column, "ascending") for column in columns])
+    table = table.take(indices)
+    keys = keys.take(indices)
+    # a group starts at the first row and wherever any of the columns differs from the previous row
+    changed = None
+    for column in columns:
+        values = keys.column(column)
+        current, previous = values.slice(1), values.slice(0, table.num_rows - 1)
+        ne = pc.fill_null(pc.not_equal(current, previous), False)
+        if not dropna:
+            current_null = pc.is_null(current, nan_is_null=True)
+            previous_null = pc.is_null(previous, nan_is_null=True)
+            ne = pc.or_(
+                pc.and_(ne, pc.invert(pc.and_(current_null, previous_null))),
+                pc.xor(current_null, previous_null)
+            )
+        changed = ne if changed is None else pc.or_(changed, ne)
+    starts = [0] + [i + 1 for i in pc.indices_nonzero(changed).to_pylist()] + [table.num_rows]
+    for start, end in zip(starts[:-1], starts[1:]):
+        yield tuple(keys.column(column)[start].as_py() for column in columns), table.slice(start, end - start)
+
+
 class PartitionWriter():
 
     def __init__(self, where, schema, compression=None, filesystem=None, zero_copy_only=False):
@@ -37,59 +95,33 @@ class PartitionWriter():
     ):
         if limit is not None and limit == 0:
             return
+        table = None
+        if isinstance(data, pd.DataFrame):
+            table = pa.Table.from_pandas(
+                data.head(limit) if limit is not None and limit > 0 else data,
+                schema=self.schema,
+                preserve_index=preserve_index,
+                safe=safe
+            )
+        elif isinstance(data, pa.Table):
+            table = data
+            if limit is not None and limit > 0 and limit < table.num_rows:
+                table = table.slice(0, limit)
+        elif isinstance(data, list):
+            table = pa.Table.from_pandas(
+                pd.DataFrame(data[0:limit] if limit is not None and limit > 0 and limit < len(data) else data),
+                schema=self.schema,
+                preserve_index=preserve_index,
+                safe=safe
+            )
+        else:
+            raise Exception("error writing parquet partition: unknown data type {}".format(type(data)))
         if row_group_columns is not None and len(row_group_columns) > 0:
-            df = None
-            if isinstance(data, pd.DataFrame):
-                df = data
-            elif isinstance(data, pa.Table):
-                df = data.to_pandas(zero_copy_only=self.zero_copy_only)
-            elif isinstance(data, list):
-                df = pd.DataFrame(data)
-            else:
-                raise Exception("error writing parquet partition: unknown data type {}".format(type(data)))
-            if limit is not None and limit > 0:
-                df = df.head(limit)
-            # create row groups for each column
-            for keys, rg in df.groupby([data[column] for column in row_group_columns]):
-                # write each row group
-                self.writer.write_table(
-                    pa.Table.from_pandas(
-                        rg,
-                        schema=self.schema,
-                        preserve_index=preserve_index,
-                        safe=safe
-                    ),
-                    row_group_size=row_group_size
-                )
+            # write the rows for each distinct value of the row group columns as their own row groups
+            for keys, rg in group_table(table, row_group_columns, dropna=False):
+                self.writer.write_table(rg, row_group_size=row_group_size)
         else:
-            table = None
-            if isinstance(data, pd.DataFrame):
-                table = pa.Table.from_pandas(
-                    data.head(limit) if limit is not None and limit > 0 else data,
-                    schema=self.schema,
-                    preserve_index=preserve_index,
-                    safe=safe
-                )
-            elif isinstance(data, pa.Table):
-                if limit is not None and limit > 0 and limit < len(data):
-                    table = pa.Table.from_pandas(
-                        data.to_pandas(zero_copy_only=self.zero_copy_only).head(limit),
-                        schema=self.schema,
-                        preserve_index=preserve_index,
-                        safe=safe
-                    )
-                else:
-                    table = data
-            elif isinstance(data, list):
-                table = pa.Table.from_pandas(
-                    pd.DataFrame(data[0:limit] if limit is not None and limit > 0 and limit < len(data) else data),
-                    schema=self.schema,
-                    preserve_index=preserve_index,
-                    safe=safe
-                )
-            else:
-                raise Exception("error writing parquet partition: unknown data type {}".format(type(data)))
-            # write entire data frame as 1 row group
+            # write entire table as 1 row group
             self.writer.write_table(table, row_group_size=row_group_size)
 
     def close(self):
@@ -126,7 +158,21 @@ def write_partition(
     pw.close()
 
 
+executors = [
+    "process",
+    "thread"
+]
+
+
 class DatasetWriter():
+    """
+    DatasetWriter writes a dataset as a directory of hive partitions, with one parquet file per partition.  Partitions
+    are written concurrently by nthreads workers.  If executor is "thread", then the workers are threads in the current
+    process, which share the data without copying it, since arrow releases the GIL while encoding and writing parquet.
+    If executor is "process", then each partition is pickled and written by a pool of worker processes created from the
+    multiprocessing context passed to write_dataset.  If executor is None, then processes are used if a context is
+    passed, and threads otherwise.
+    """
 
     def __init__(
         self,
@@ -139,7 +185,8 @@ class DatasetWriter():
         preserve_index=None,
         schema=None,
         timeout=None,
-        zero_copy_only=False
+        zero_copy_only=False,
+        executor=None
     ):
 
         self.where = where
@@ -147,11 +194,17 @@ class DatasetWriter():
         self.compression = compression
         self.filesystem = filesystem
         self.preserve_index = preserve_index
-        self.nthreads = nthreads if (nthreads is not None) and (nthreads > 0) else int(os.cpu_count()/2)
+        self.nthreads = nthreads if (nthreads is not None) and (nthreads > 0) else max(1, int(os.cpu_count()/2))
         self.makedirs = makedirs
         self.schema = schema
         self.timeout = timeout if timeout is not None else 600
         self.zero_copy_only = zero_copy_only
+        self.executor = executor
+
+        if executor is not None and executor not in executors:
+            raise Exception("executor is invalid: only the following executors are supported: {}".format(
+                ", ".join(executors)
+            ))
 
         if schema is not None:
             if not isinstance(schema, pa.Schema):
@@ -170,7 +223,9 @@ class DatasetWriter():
     def format_partition_directory(self, key, value):
         return '{}={}'.format(key, self.format_partition_value(value))
 
-    def format_partition_filename(self, values):
+    def format_partition_filename(self, values, part=None):
+        if part is not None and part > 0:
+            return '-'.join([self.format_partition_value(value) for value in values])+'.{}.parquet'.format(part)
         return '-'.join([self.format_partition_value(value) for value in values])+'.parquet'
 
     def format_partition_parent(self, values):
@@ -181,38 +236,40 @@ class DatasetWriter():
         if limit is not None and limit == 0:
             return
 
-        if self.nthreads > 1:
+        executor = self.executor if self.executor is not None else ("process" if ctx is not None else "thread")
+
+        if executor == "process":
             if ctx is None:
-                raise Exception("ctx is not defined, but required when using {} threads".format(self.nthreads))
+                raise Exception("ctx is not defined, but required when using the process executor")
 
-        df = None
         table = None
 
         if isinstance(dataset, pd.DataFrame):
-            df = dataset
             table = pa.Table.from_pandas(
-                df,
+                dataset.head(limit) if limit is not None and limit > 0 else dataset,
                 schema=self.schema,
                 preserve_index=self.preserve_index
             )
-            if limit is not None and limit > 0:
-                df = df.head(limit)
         elif isinstance(dataset, pa.Table):
-            df = dataset.to_pandas(zero_copy_only=self.zero_copy_only)
             table = dataset
-            if limit is not None and limit > 0:
-                df = df.head(limit)
+            if limit is not None and limit > 0 and limit < table.num_rows:
+                table = table.slice(0, limit)
         elif isinstance(dataset, list):
             if limit is not None and limit > 0 and limit < len(dataset):
                 dataset = dataset[0:limit]
-            df = pd.DataFrame(dataset)
             table = pa.Table.from_pandas(
-                df,
+                pd.DataFrame(dataset),
                 schema=self.schema,
                 preserve_index=self.preserve_index
             )
+        else:
+            raise Exception("error writing parquet dataset: unknown data type {}".format(type(dataset)))
+
+        for col in self.partition_columns:
+            if col not in table.schema.names:
+                raise ValueError('error writing parquet dataset: partition column {} is missing'.format(col))
 
-        if len(df.columns.drop(self.partition_columns)) == 0:
+        if len([col for col in table.schema.names if col not in self.partition_columns]) == 0:
             raise ValueError('error writing parquet dataset: no data left to save outside partition columns')
 
         schema = table.schema
@@ -221,18 +278,16 @@ class DatasetWriter():
             if col in self.partition_columns:
                 schema = schema.remove(schema.get_field_index(col))
 
-        pool = ctx.Pool(processes=self.nthreads)
+        if executor == "process":
+            pool = ctx.Pool(processes=self.nthreads)
+        else:
+            pool = ThreadPoolExecutor(max_workers=self.nthreads)
 
         results = []
 
-        groups = df.drop(
-            self.partition_columns,
-            axis='columns').groupby([df[col] for col in self.partition_columns])
-
-        for values, dfp in groups:
+        for values, group in group_table(table, self.partition_columns):
 
-            if not isinstance(values, tuple):
-                values = (values,)
+            part = group.drop_columns(self.partition_columns)
 
             partition_directory = self.format_partition_parent(values)
 
@@ -244,7 +299,7 @@ class DatasetWriter():
                 partition_directory,
                 self.format_partition_filename(values)
             )
-            result = pool.apply_async(write_partition, args=(where, schema, dfp), kwds=dict(
+            kwds = dict(
                 compression=self.compression,
                 filesystem=self.filesystem,
                 row_group_columns=row_group_columns,
@@ -252,15 +307,134 @@ class DatasetWriter():
                 preserve_index=self.preserve_index,
                 safe=safe,
                 zero_copy_only=self.zero_copy_only,
-            ))
-            results += [result]
+            )
+            if executor == "process":
+                results += [pool.apply_async(write_partition, args=(where, schema, part), kwds=kwds)]
+            else:
+                results += [pool.submit(write_partition, where, schema, part, **kwds)]
 
-        pool.close()
+        if executor == "process":
+            pool.close()
+        else:
+            pool.shutdown(wait=False)
 
         # Wait for all partitions to be written
         for i in range(len(results)):
             try:
-                results[i].get(timeout=self.timeout)
+                if executor == "process":
+                    results[i].get(timeout=self.timeout)
+                else:
+                    results[i].result(timeout=self.timeout)
             except Exception as err:
                 print("error serializing partition", i, err)
                 raise err
+
+
+class IncrementalDatasetWriter(DatasetWriter):
+    """
+    IncrementalDatasetWriter writes a stream of batches as a directory of hive partitions.  A parquet writer is kept
+    open for each partition, and the rows of each batch are appended to it as new row groups, so that a partition
+    receiving data from many batches is written to one large file.  At most max_open_files writers are open at once.
+    When a new partition is opened beyond that limit, then the writer that was least recently used is closed, and if
+    that partition receives more data, then its rows are written to a new file, such as 2021-1.1.parquet.
+    """
+
+    def __init__(
+        self,
+        where,
+        partition_columns,
+        compression=None,
+        filesystem=None,
+        makedirs=True,
+        preserve_index=None,
+        schema=None,
+        max_open_files=None
+    ):
+        super().__init__(
+            where,
+            partition_columns,
+            compression=compression,
+            filesystem=filesystem,
+            makedirs=makedirs,
+            nthreads=1,
+            preserve_index=preserve_index,
+            schema=schema
+        )
+        self.max_open_files = max_open_files if (max_open_files is not None) and (max_open_files > 0) else 64
+        self.partition_schema = None
+        self.writers = OrderedDict()
+        self.files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open_partition(self, values):
+        partition_directory = self.format_partition_parent(values)
+
+        if self.makedirs:
+            os.makedirs(os.path.join(self.where, partition_directory), exist_ok=True)
+
+        part = self.files.get(values, 0)
+        self.files[values] = part + 1
+
+        where = os.path.join(
+            self.where,
+            partition_directory,
+            self.format_partition_filename(values, part=part)
+        )
+        return PartitionWriter(
+            where,
+            self.partition_schema,
+            compression=self.compression,
+            filesystem=self.filesystem)
+
+    def write_batch(self, batch, row_group_size=None, safe=True):
+
+        table = None
+
+        if isinstance(batch, pa.RecordBatch):
+            table = pa.Table.from_batches([batch])
+        elif isinstance(batch, pa.Table):
+            table = batch
+        elif isinstance(batch, pd.DataFrame):
+            table = pa.Table.from_pandas(batch, schema=self.schema, preserve_index=self.preserve_index)
+        elif isinstance(batch, list):
+            table = pa.Table.from_pandas(pd.DataFrame(batch), schema=self.schema, preserve_index=self.preserve_index)
+        else:
+            raise Exception("error writing parquet dataset: unknown data type {}".format(type(batch)))
+
+        for col in self.partition_columns:
+            if col not in table.schema.names:
+                raise ValueError('error writing parquet dataset: partition column {} is missing'.format(col))
+
+        for values, group in group_table(table, self.partition_columns):
+
+            part = group.drop_columns(self.partition_columns)
+
+            if len(part.schema.names) == 0:
+                raise ValueError('error writing parquet dataset: no data left to save outside partition columns')
+
+            # every file is written with the schema of the first batch
+            if self.partition_schema is None:
+                self.partition_schema = part.schema
+            elif not part.schema.equals(self.partition_schema, check_metadata=False):
+                part = part.select(self.partition_schema.names).cast(self.partition_schema, safe=safe)
+
+            pw = self.writers.get(values)
+            if pw is None:
+                pw = self.open_partition(values)
+                self.writers[values] = pw
+                if len(self.writers) > self.max_open_files:
+                    # close the writer that was least recently used
+                    self.writers.popitem(last=False)[1].close()
+            else:
+                self.writers.move_to_end(values)
+
+            pw.write_partition(part, row_group_size=row_group_size)
+
+    def close(self):
+        while len(self.writers) > 0:
+            self.writers.popitem(last=False)[1].close()
@@ -0,0 +1,164 @@
+# =================================================================
+#
+# Work of the U.S. Department of Defense, Defense Digital Service.
+# Released as open source under the MIT License.  See LICENSE file.
+#
+# =================================================================
+
+import bz2
+import gzip
+import io
+import lzma
+import sys
+import zipfile
+
+import pyarrow as pa
+
+
+class Reader(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, f=None):
+        raise NotImplementedError
+
+    def __iter__(self):
+        return iter(self.f)
+
+    def close(self):
+        raise NotImplementedError
+
+    def read(self, size=-1):
+        return self.f.read(size)
+
+    def readline(self):
+        return self.f.readline()
+
+    def text(self, encoding="utf-8"):
+        """
+        text returns a text stream over the underlying binary stream.  The text stream is detached when the reader is
+        closed, so that closing the reader never closes a stream it does not own, such as stdin.
+        """
+        t = io.TextIOWrapper(self.f, encoding=encoding, newline="")
+        self.wrappers += [t]
+        return t
+
+
+class FileReader(Reader):
+
+    def __init__(self, f, parents=None):
+        self.f = f
+        self.parents = parents or []
+        self.wrappers = []
+
+    def close(self):
+        for t in self.wrappers:
+            t.detach()
+        self.f.close()
+        for parent in reversed(self.parents):
+            parent.close()
+
+
+class Unclosable(object):
+    """
+    Unclosable wraps a binary stream that is owned by someone else, such as stdin, so that closing a decompressing
+    stream does not close it.
+    """
+
+    def __init__(self, f):
+        self.f = f
+
+    @property
+    def closed(self):
+        return self.f.closed
+
+    def close(self):
+        pass
+
+    def read(self, size=-1):
+        return self.f.read(size)
+
+    def readable(self):
+        return True
+
+
+def open_codec(codec, f):
+    """
+    open_codec returns a buffered binary stream that decompresses the zstd or lz4 frames read from f.
+    """
+    return io.BufferedReader(pa.CompressedInputStream(f, codec))
+
+
+def open_zip(f, fs=None):
+    """
+    open_zip returns the zip archive at the path, and the files to close after the archive is closed.  If fs is set,
+    then the archive is opened on the filesystem as a seekable file, so that only the central directory and the
+    members that are read are fetched with range requests, rather than the whole archive.
+    """
+    if fs is not None:
+        src = fs.open(f, 'rb')
+        return zipfile.ZipFile(src, 'r'), [src]
+    return zipfile.ZipFile(f, 'r'), []
+
+
+class StreamReader(Reader):
+
+    def __init__(self, f):
+        self.f = f
+        self.wrappers = []
+
+    def close(self):
+        for t in self.wrappers:
+            t.detach()
+
+
+def create_reader(compression=None, f=None, fs=None, name=None):
+    """
+    create_reader returns a binary reader for the source, which is either stdin ("-"), a path on the given filesystem,
+    or a local path.  If the source is compressed, then the reader returns the decompressed bytes.
+    """
+    if compression == "gzip":
+        if f == "-":
+            return FileReader(gzip.GzipFile(fileobj=sys.stdin.buffer, mode='rb'))
+        if fs is not None:
+            src = fs.open(f, 'rb')
+            return FileReader(gzip.GzipFile(fileobj=src, mode='rb'), parents=[src])
+        return FileReader(gzip.open(f, 'rb'))
+    elif compression == "zstd" or compression == "lz4":
+        if f == "-":
+            return FileReader(open_codec(compression, Unclosable(sys.stdin.buffer)))
+        if fs is not None:
+            src = fs.open(f, 'rb')
+            return FileReader(open_codec(compression, src), parents=[src])
+        return FileReader(open_codec(compression, pa.OSFile(f, 'rb')))
+    elif compression == "bzip2":
+        if f == "-":
+            return FileReader(bz2.BZ2File(sys.stdin.buffer, mode='rb'))
+        if fs is not None:
+            src = fs.open(f, 'rb')
+            return FileReader(bz2.BZ2File(src, mode='rb'), parents=[src])
+        return FileReader(bz2.open(f, 'rb'))
+    elif compression == "xz":
+        if f == "-":
+            return FileReader(lzma.LZMAFile(sys.stdin.buffer, mode='rb'))
+        if fs is not None:
+            src = fs.open(f, 'rb')
+            return FileReader(lzma.LZMAFile(src, mode='rb'), parents=[src])
+        return FileReader(lzma.open(f, 'rb'))
+    elif compression == "zip":
+        if f == "-":
+            raise Exception("cannot unzip stdin")
+        zf, parents = open_zip(f, fs=fs)
+        return FileReader(zf.open(name, 'r'), parents=[zf] + parents)
+    elif compression is None or len(compression) == 0:
+        if f == "-":
+            return StreamReader(sys.stdin.buffer)
+        if fs is not None:
+            return FileReader(fs.open(f, 'rb'))
+        return FileReader(open(f, 'rb'))
+    else:
+        raise Exception("unknown compression {}".format(compression))
@@ -0,0 +1,251 @@
+# =================================================================
+#
+# Work of the U.S. Department of Defense, Defense Digital Service.
+# Released as open source under the MIT License.  See LICENSE file.
+#
+# =================================================================
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import s3fs
+
+cache_types = [
+    "blockcache",
+    "bytes",
+    "first",
+    "mmap",
+    "none",
+    "readahead"
+]
+
+retry_modes = [
+    "adaptive",
+    "legacy",
+    "standard"
+]
+
+# filesystems are cached by their options, so that connections and credentials are reused across calls
+filesystems = {}
+filesystems_lock = threading.Lock()
+
+# S3 rejects multipart uploads with parts smaller than 5 MiB, except for the last part
+minimum_part_size = 5 * 1024 * 1024
+
+default_part_size = 16 * 1024 * 1024
+
+default_concurrency = 8
+
+# S3 limits a multipart upload to 10,000 parts
+maximum_parts = 10000
+
+
+class MultipartUpload(object):
+    """
+    MultipartUpload is a binary stream that uploads to an object on S3 using a multipart upload.  Each part of
+    part_size bytes is uploaded by a pool of concurrency threads as soon as it is written, so that encoding continues
+    while earlier parts are uploaded.  At most concurrency parts are buffered or in flight at once.  If less than
+    part_size bytes are written, then the object is uploaded with a single request when the stream is closed.  The
+    filesystem is an s3fs filesystem, or any object that provides split_path and call_s3 in the same way.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def __init__(self, fs, path, part_size=None, concurrency=None):
+        if part_size is not None and part_size < minimum_part_size:
+            raise Exception("part_size is invalid: expecting at least {} bytes but found {}".format(
+                minimum_part_size,
+                part_size
+            ))
+        self.fs = fs
+        self.path = path
+        self.bucket, self.key = fs.split_path(path)[0:2]
+        self.part_size = part_size if part_size is not None else default_part_size
+        self.concurrency = concurrency if (concurrency is not None) and (concurrency > 0) else default_concurrency
+        self.kwargs = dict(getattr(fs, "s3_additional_kwargs", None) or {})
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.executor = None
+        self.parts = []
+        self.pending = deque()
+        self.closed = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.part_size:
+            part = bytes(self.buffer[0:self.part_size])
+            del self.buffer[0:self.part_size]
+            self.upload_part(part)
+        return len(data)
+
+    def flush(self):
+        # parts are only uploaded once they are full, since S3 rejects small parts
+        pass
+
+    def upload_part(self, body):
+        if self.upload_id is None:
+            self.upload_id = self.fs.call_s3(
+                "create_multipart_upload",
+                Bucket=self.bucket,
+                Key=self.key,
+                **self.kwargs
+            )["UploadId"]
+            self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        if len(self.parts) == maximum_parts:
+            raise Exception("error uploading {}: more than {} parts, increase the part size".format(
+                self.path,
+                maximum_parts
+            ))
+        # wait for the oldest part, so that memory is bounded when encoding is faster than uploading
+        while len(self.pending) >= self.concurrency:
+            self.pending.popleft().result()
+        number = len(self.parts) + 1
+        future = self.executor.submit(
+            self.fs.call_s3,
+            "upload_part",
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=number,
+            Body=body
+        )
+        self.parts += [(number, future)]
+        self.pending.append(future)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.upload_id is None:
+                self.fs.call_s3(
+                    "put_object",
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    Body=bytes(self.buffer),
+                    **self.kwargs
+                )
+            else:
+                if len(self.buffer) > 0:
+                    self.upload_part(bytes(self.buffer))
+                parts = [{"PartNumber": number, "ETag": future.result()["ETag"]} for number, future in self.parts]
+                self.fs.call_s3(
+                    "complete_multipart_upload",
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self.upload_id,
+                    MultipartUpload={"Parts": parts}
+                )
+                self.executor.shutdown()
+        except Exception:
+            self.abort()
+            raise
+        self.closed = True
+        self.buffer = bytearray()
+        if hasattr(self.fs, "invalidate_cache"):
+            self.fs.invalidate_cache(self.path)
+
+    def abort(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.buffer = bytearray()
+        if self.upload_id is not None:
+            for number, future in self.parts:
+                future.cancel()
+            self.executor.shutdown()
+            self.fs.call_s3(
+                "abort_multipart_upload",
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id
+            )
+
+
+def open_upload(fs, path, part_size=None, concurrency=None):
+    """
+    open_upload returns a binary stream that writes to the path on the filesystem.  If part_size or concurrency is set,
+    then the filesystem must be an S3 filesystem, and the stream is a concurrent MultipartUpload.  Otherwise, the
+    stream is opened by the filesystem.
+    """
+    if part_size is not None or concurrency is not None:
+        # s3fs provides call_s3 from version 0.5.0
+        if not (hasattr(fs, "call_s3") and hasattr(fs, "split_path")):
+            raise Exception("upload_part_size and upload_concurrency are only supported by s3fs 0.5.0 or later")
+        return MultipartUpload(fs, path, part_size=part_size, concurrency=concurrency)
+    return fs.open(path, 'wb')
+
+
+def create_s3_filesystem(
+    endpoint=None,
+    region=None,
+    acl=None,
+    max_pool_connections=None,
+    retries=None,
+    retry_mode=None,
+    block_size=None,
+    cache_type=None,
+    cache=True
+):
+    """
+    create_s3_filesystem returns an S3 filesystem for the endpoint and region, which adds the ACL to every object that
+    it writes.  max_pool_connections is the size of the connection pool, retries is the maximum number of attempts for
+    each request, with a retry_mode of "standard", "adaptive", or "legacy", and block_size and cache_type control how
+    files are read ahead.  If cache is True, then the filesystem is created once for each combination of options and
+    reused by later calls, so that repeated calls do not set up new connections or load credentials again.
+    """
+    if retry_mode is not None and retry_mode not in retry_modes:
+        raise Exception("retry_mode is invalid: only the following retry modes are supported: {}".format(
+            ", ".join(retry_modes)
+        ))
+    if cache_type is not None and cache_type not in cache_types:
+        raise Exception("cache_type is invalid: only the following cache types are supported: {}".format(
+            ", ".join(cache_types)
+        ))
+    key = (endpoint, region, acl, max_pool_connections, retries, retry_mode, block_size, cache_type)
+    with filesystems_lock:
+        if cache and key in filesystems:
+            return filesystems[key]
+        s3_additional_kwargs = None
+        if acl is not None:
+            s3_additional_kwargs = {
+                "ACL": acl
+            }
+        config_kwargs = {}
+        if max_pool_connections is not None and max_pool_connections > 0:
+            config_kwargs["max_pool_connections"] = max_pool_connections
+        if (retries is not None and retries > 0) or retry_mode is not None:
+            config_kwargs["retries"] = {}
+            if retries is not None and retries > 0:
+                config_kwargs["retries"]["max_attempts"] = retries
+            if retry_mode is not None:
+                config_kwargs["retries"]["mode"] = retry_mode
+        kwargs = {}
+        if block_size is not None and block_size > 0:
+            kwargs["default_block_size"] = block_size
+        if cache_type is not None:
+            kwargs["default_cache_type"] = cache_type
+        fs = s3fs.S3FileSystem(
+            anon=False,
+            client_kwargs={
+                "endpoint_url": endpoint,
+                "region_name": region,
+            },
+            config_kwargs=(config_kwargs if len(config_kwargs) > 0 else None),
+            s3_additional_kwargs=s3_additional_kwargs,
+            skip_instance_cache=(not cache),
+            **kwargs
+        )
+        if cache:
+            filesystems[key] = fs
+        return fs
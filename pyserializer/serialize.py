@@ -5,92 +5,77 @@
 #
 # =================================================================
 
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import csv
+import itertools
 import json
+import os
 
+import numpy as np
 import pyarrow as pa
 import pandas as pd
 
-from pyserializer.cleaner import clean
+from pyserializer.backend import create_backend
+from pyserializer.cleaner import clean, clean_dataframe, clean_nested, dataframe_masks
+from pyserializer.columnar import write_csv_table, write_jsonl_columns
 from pyserializer.encoder import Encoder
-from pyserializer.parquet import DatasetWriter, PartitionWriter
-from pyserializer.writer import create_writer
-
-
-def write_jsonl_tuples(drop_blanks=None, drop_nulls=None, f=None, limit=None, tuples=None, kwargs=None):
-    if limit is not None and limit > 0 and limit < len(tuples):
-        if drop_nulls or drop_blanks:
-            count = 0
-            for item in tuples:
-                f.write(
-                    json.dumps(
-                        clean(
-                            item._asdict(),
-                            drop_nulls=drop_nulls,
-                            drop_blanks=drop_blanks
-                        ),
-                        **kwargs
-                    )+"\n"
-                )
-                count += 1
-                if count >= limit:
-                    break
+from pyserializer.inputs import file_extension
+from pyserializer.s3 import open_upload
+from pyserializer.parquet import DatasetWriter, IncrementalDatasetWriter, PartitionWriter
+from pyserializer.writer import CountingFile, create_writer
+
+# the number of records written to a shard rolled by size before the size of a record is known
+shard_sample_rows = 100
+
+
+def parquet_compression(compression=None):
+    """
+    parquet_compression returns the name of the parquet codec for the compression algorithm, or None if the
+    algorithm has no parquet codec.
+    """
+    if compression in ["gzip", "lz4", "snappy", "zstd"]:
+        return compression.upper()
+    return None
+
+
+def write_jsonl_frame(drop_blanks=None, drop_nulls=None, f=None, limit=None, data=None, index=False, backend=None):
+    """
+    write_jsonl_frame writes the rows of the data frame as JSON lines.  The values to drop are found with vectorized
+    masks once for the whole frame, rather than by cleaning each row, and nested lists and dicts are cleaned once per
+    column.  The keys are the field names of DataFrame.itertuples.
+    """
+    if limit is not None and limit > 0 and limit < len(data):
+        data = data.head(limit)
+    fields = (["Index"] if index else []) + list(data.columns)
+    keys = namedtuple("Pandas", fields, rename=True)._fields
+    if not (drop_nulls or drop_blanks):
+        for row in data.itertuples(index=index, name=None):
+            f.write(backend.dumps(dict(zip(keys, row)))+"\n")
+        return
+    mask = dataframe_masks(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks).to_numpy(dtype=bool)
+    if index:
+        mask = np.hstack([np.zeros((len(data), 1), dtype=bool), mask])
+    dropped = mask.any(axis=1)
+    data = clean_nested(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+    for row, row_mask, row_dropped in zip(data.itertuples(index=index, name=None), mask, dropped):
+        if row_dropped:
+            f.write(backend.dumps({k: v for k, v, m in zip(keys, row, row_mask) if not m})+"\n")
         else:
-            count = 0
-            for item in tuples:
-                f.write(json.dumps(item._asdict(), **kwargs)+"\n")
-                count += 1
-                if count >= limit:
-                    break
-    else:
-        if drop_nulls or drop_blanks:
-            for item in tuples:
-                f.write(
-                    json.dumps(
-                        clean(
-                            item._asdict(),
-                            drop_nulls=drop_nulls,
-                            drop_blanks=drop_blanks
-                        ),
-                        **kwargs
-                    )+"\n"
-                )
-        else:
-            for item in tuples:
-                f.write(json.dumps(item._asdict(), **kwargs)+"\n")
+            f.write(backend.dumps(dict(zip(keys, row)))+"\n")
 
 
-def write_csv_tuples(drop_blanks=None, drop_nulls=None, cw=None, limit=None, tuples=None):
-    if limit is not None and limit > 0 and limit < len(tuples):
-        if drop_nulls or drop_blanks:
-            count = 0
-            for item in tuples:
-                cw.writerow(clean(
-                    item._asdict(),
-                    drop_nulls=drop_nulls,
-                    drop_blanks=drop_blanks
-                ))
-                count += 1
-                if count >= limit:
-                    break
-        else:
-            count = 0
-            for item in tuples:
-                cw.writerow(item._asdict())
-                count += 1
-                if count >= limit:
-                    break
+def write_csv_tuples(cw=None, limit=None, tuples=None):
+    if limit is not None and limit > 0:
+        count = 0
+        for item in tuples:
+            cw.writerow(item._asdict())
+            count += 1
+            if count >= limit:
+                break
     else:
-        if drop_nulls or drop_blanks:
-            for item in tuples:
-                cw.writerow(clean(
-                    item._asdict(),
-                    drop_nulls=drop_nulls,
-                    drop_blanks=drop_blanks
-                ))
-        else:
-            for item in tuples:
-                cw.writerow(item._asdict())
+        for item in tuples:
+            cw.writerow(item._asdict())
 
 
 def serialize(
@@ -115,8 +100,64 @@ def serialize(
     safe=True,
     timeout=None,
     zero_copy_only=False,
-    pretty=False
+    pretty=False,
+    engine=None,
+    json_backend=None,
+    compression_threads=None,
+    compression_block_size=None,
+    compression_level=None,
+    executor=None,
+    nthreads=None,
+    upload_part_size=None,
+    upload_concurrency=None,
+    shard_rows=None,
+    shard_bytes=None,
+    shard_threads=None
 ):
+    if engine is not None and engine not in ["arrow", "python"]:
+        raise Exception("invalid engine {}".format(engine))
+
+    if shard_rows is not None or shard_bytes is not None:
+        # shards are rolled between batches, so the data is split into batches like those read by deserialize_iter
+        if isinstance(data, pd.DataFrame):
+            batches = pa.Table.from_pandas(data, schema=schema, preserve_index=index).to_batches(max_chunksize=10000)
+        elif isinstance(data, pa.Table):
+            batches = data.to_batches(max_chunksize=10000)
+        elif isinstance(data, list):
+            batches = (data[i:i+10000] for i in range(0, len(data), 10000))
+        else:
+            raise Exception("unknown data type {}".format(type(data)))
+        serialize_iter(
+            allow_nan=allow_nan,
+            dest=dest,
+            batches=batches,
+            drop_blanks=drop_blanks,
+            drop_nulls=drop_nulls,
+            encoder=encoder,
+            format=format,
+            compression=compression,
+            columns=columns,
+            limit=limit,
+            row_group_size=row_group_size,
+            fs=fs,
+            schema=schema,
+            index=index,
+            safe=safe,
+            pretty=pretty,
+            json_backend=json_backend,
+            compression_threads=compression_threads,
+            compression_block_size=compression_block_size,
+            compression_level=compression_level,
+            partition_columns=partition_columns,
+            makedirs=makedirs,
+            upload_part_size=upload_part_size,
+            upload_concurrency=upload_concurrency,
+            shard_rows=shard_rows,
+            shard_bytes=shard_bytes,
+            shard_threads=shard_threads
+        )
+        return
+
     if format == "json":
 
         kwargs = {
@@ -125,13 +166,35 @@ def serialize(
             "separators": ((', ', ': ') if pretty else (',', ':'))
         }
 
+        backend = create_backend(json_backend, **kwargs)
+
+        # tables and data frames are encoded as they are, so drop their blanks and nulls as the other formats do
+        if (drop_nulls or drop_blanks) and isinstance(data, (pa.Table, pa.RecordBatch, pd.DataFrame)):
+            data = clean(
+                data.to_dict('records') if isinstance(data, pd.DataFrame) else data.to_pylist(),
+                drop_nulls=drop_nulls,
+                drop_blanks=drop_blanks
+            )
+
         if fs is not None:
-            with fs.open(dest, 'wb') as f:
-                with create_writer(f=f, compression=compression) as w:
-                    w.write(json.dumps(data, **kwargs))
+            with open_upload(fs, dest, part_size=upload_part_size, concurrency=upload_concurrency) as f:
+                with create_writer(
+                    f=f,
+                    compression=compression,
+                    threads=compression_threads,
+                    block_size=compression_block_size,
+                    level=compression_level
+                ) as w:
+                    w.write(backend.dumps(data))
         else:
-            with create_writer(f=dest, compression=compression) as w:
-                w.write(json.dumps(data, **kwargs))
+            with create_writer(
+                f=dest,
+                compression=compression,
+                threads=compression_threads,
+                block_size=compression_block_size,
+                level=compression_level
+            ) as w:
+                w.write(backend.dumps(data))
 
     elif format == "jsonl":
 
@@ -147,60 +210,107 @@ def serialize(
             "separators": ((', ', ': ') if pretty else (',', ':'))
         }
 
+        backend = create_backend(json_backend, **kwargs)
+
         if fs is not None:
-            with fs.open(dest, 'wb') as f:
-                with create_writer(f=f, compression=compression) as w:
+            with open_upload(fs, dest, part_size=upload_part_size, concurrency=upload_concurrency) as f:
+                with create_writer(
+                    f=f,
+                    compression=compression,
+                    threads=compression_threads,
+                    block_size=compression_block_size,
+                    level=compression_level
+                ) as w:
 
                     # if list, then slice the list all at once, since already in memory
                     if isinstance(data, list):
-                        json.dump(data[0], w, **kwargs)
+                        w.write(backend.dumps(data[0]))
                         for item in (data[1:limit] if limit is not None and limit > 0 else data[1:]):
-                            w.write("\n")
-                            json.dump(item, w, **kwargs)
+                            w.write("\n" + backend.dumps(item))
 
                     # if dataframe, then iterate through the data time.
-                    if isinstance(data, pd.DataFrame):
-                        write_jsonl_tuples(
+                    if isinstance(data, pd.DataFrame) and engine != "arrow":
+                        write_jsonl_frame(
+                            drop_blanks=drop_blanks,
+                            drop_nulls=drop_nulls,
+                            f=w,
+                            limit=limit,
+                            data=data,
+                            index=index,
+                            backend=backend
+                        )
+
+                    # if table, or dataframe with the arrow engine, then encode the data column by column.
+                    if isinstance(data, pa.Table) or (isinstance(data, pd.DataFrame) and engine == "arrow"):
+                        write_jsonl_columns(
+                            data=data,
                             drop_blanks=drop_blanks,
                             drop_nulls=drop_nulls,
                             f=w,
+                            index=index,
                             limit=limit,
-                            tuples=data.itertuples(index=index),
                             kwargs=kwargs
                         )
 
         else:
-            with create_writer(f=dest, compression=compression) as w:
+            with create_writer(
+                f=dest,
+                compression=compression,
+                threads=compression_threads,
+                block_size=compression_block_size,
+                level=compression_level
+            ) as w:
 
                 # if list, then slice the list all at once, since already in memory
                 if isinstance(data, list):
-                    json.dump(data[0], w, **kwargs)
+                    w.write(backend.dumps(data[0]))
                     for item in (data[1:limit] if limit is not None and limit > 0 else data[1:]):
-                        w.write("\n")
-                        json.dump(item, w, **kwargs)
+                        w.write("\n" + backend.dumps(item))
 
                 # if dataframe, then iterate through the data time.
-                if isinstance(data, pd.DataFrame):
-                    write_jsonl_tuples(
+                if isinstance(data, pd.DataFrame) and engine != "arrow":
+                    write_jsonl_frame(
                         drop_blanks=drop_blanks,
                         drop_nulls=drop_nulls,
                         f=w,
                         limit=limit,
-                        tuples=data.itertuples(index=index),
+                        data=data,
+                        index=index,
+                        backend=backend
+                    )
+
+                # if table, or dataframe with the arrow engine, then encode the data column by column.
+                if isinstance(data, pa.Table) or (isinstance(data, pd.DataFrame) and engine == "arrow"):
+                    write_jsonl_columns(
+                        data=data,
+                        drop_blanks=drop_blanks,
+                        drop_nulls=drop_nulls,
+                        f=w,
+                        index=index,
+                        limit=limit,
                         kwargs=kwargs
                     )
 
     elif format == "csv" or format == "tsv":
 
-        if (not isinstance(data, pa.Table)) and (not isinstance(data, pd.DataFrame)) and (not isinstance(data, list)):
+        if not isinstance(data, (pa.Table, pa.RecordBatch, pd.DataFrame, list)):
             raise Exception("unknown data type {}".format(type(data)))
 
         if len(data) == 0:
             return
 
+        # tables, record batches, and data frames with the arrow engine are written in bulk by the arrow csv writer
+        bulk = isinstance(data, (pa.Table, pa.RecordBatch)) or (isinstance(data, pd.DataFrame) and engine == "arrow")
+
         if fs is not None:
-            with fs.open(dest, 'wb') as f:
-                with create_writer(f=f, compression=compression) as w:
+            with open_upload(fs, dest, part_size=upload_part_size, concurrency=upload_concurrency) as f:
+                with create_writer(
+                    f=f,
+                    compression=compression,
+                    threads=compression_threads,
+                    block_size=compression_block_size,
+                    level=compression_level
+                ) as w:
 
                     # if list, then slice the list all at once, since already in memory
                     if isinstance(data, list):
@@ -221,23 +331,36 @@ def serialize(
                                 cw.writerow(r)
 
                     # if dataframe, then iterate through the data time.
-                    if isinstance(data, pd.DataFrame):
+                    if isinstance(data, pd.DataFrame) and engine != "arrow":
                         fieldnames = sorted(list(data.columns))
                         cw = csv.DictWriter(w, delimiter=("\t" if format == "tsv" else ","), fieldnames=fieldnames)
                         cw.writeheader()
-                        if limit is not None and limit > 0 and limit < len(data):
-                            data = data.head(limit)
-                        else:
-                            write_csv_tuples(
-                                drop_blanks=drop_blanks,
-                                drop_nulls=drop_nulls,
-                                cw=cw,
-                                limit=limit,
-                                tuples=data.itertuples(index=index)
-                            )
+                        # drop values with vectorized masks rather than cleaning each row
+                        if drop_nulls or drop_blanks:
+                            data = clean_dataframe(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+                        write_csv_tuples(cw=cw, limit=limit, tuples=data.itertuples(index=index))
+
+                    # if bulk, then write the data with the arrow csv writer.
+                    if bulk:
+                        write_csv_table(
+                            data=data,
+                            drop_blanks=drop_blanks,
+                            drop_nulls=drop_nulls,
+                            f=w,
+                            format=format,
+                            columns=columns,
+                            index=index,
+                            limit=limit
+                        )
 
         else:
-            with create_writer(f=dest, compression=compression) as w:
+            with create_writer(
+                f=dest,
+                compression=compression,
+                threads=compression_threads,
+                block_size=compression_block_size,
+                level=compression_level
+            ) as w:
 
                 # if list, then slice the list all at once, since already in memory
                 if isinstance(data, list):
@@ -258,20 +381,27 @@ def serialize(
                             cw.writerow(r)
 
                 # if dataframe, then iterate through the data time.
-                if isinstance(data, pd.DataFrame):
+                if isinstance(data, pd.DataFrame) and engine != "arrow":
                     fieldnames = sorted(list(data.columns))
                     cw = csv.DictWriter(w, delimiter=("\t" if format == "tsv" else ","), fieldnames=fieldnames)
                     cw.writeheader()
-                    if limit is not None and limit > 0 and limit < len(data):
-                        data = data.head(limit)
-                    else:
-                        write_csv_tuples(
-                            drop_blanks=drop_blanks,
-                            drop_nulls=drop_nulls,
-                            cw=cw,
-                            limit=limit,
-                            tuples=data.itertuples(index=index)
-                        )
+                    # drop values with vectorized masks rather than cleaning each row
+                    if drop_nulls or drop_blanks:
+                        data = clean_dataframe(data, drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+                    write_csv_tuples(cw=cw, limit=limit, tuples=data.itertuples(index=index))
+
+                # if bulk, then write the data with the arrow csv writer.
+                if bulk:
+                    write_csv_table(
+                        data=data,
+                        drop_blanks=drop_blanks,
+                        drop_nulls=drop_nulls,
+                        f=w,
+                        format=format,
+                        columns=columns,
+                        index=index,
+                        limit=limit
+                    )
 
     elif format == "parquet":
 
@@ -285,13 +415,14 @@ def serialize(
             dw = DatasetWriter(
                 dest,
                 partition_columns,
-                compression=compression.upper() if compression in ['gzip', 'snappy'] else None,
+                compression=parquet_compression(compression),
                 filesystem=fs,
                 makedirs=makedirs,
-                nthreads=None,
+                nthreads=nthreads,
                 preserve_index=index,
                 schema=schema,
-                timeout=timeout
+                timeout=timeout,
+                executor=executor
             )
             dw.write_dataset(
                 data,
@@ -309,18 +440,507 @@ def serialize(
                 table = data
             elif isinstance(data, list):
                 table = pa.Table.from_pandas(pd.DataFrame(data), preserve_index=index)
+            if fs is not None:
+                with open_upload(fs, dest, part_size=upload_part_size, concurrency=upload_concurrency) as f:
+                    pw = PartitionWriter(
+                        f,
+                        table.schema,
+                        compression=parquet_compression(compression))
+                    pw.write_partition(
+                        table,
+                        row_group_size=row_group_size,
+                        row_group_columns=row_group_columns,
+                        preserve_index=index,
+                        safe=safe,
+                        limit=limit)
+                    pw.close()
+            else:
+                pw = PartitionWriter(
+                    dest,
+                    table.schema,
+                    compression=parquet_compression(compression))
+                pw.write_partition(
+                    table,
+                    row_group_size=row_group_size,
+                    row_group_columns=row_group_columns,
+                    preserve_index=index,
+                    safe=safe,
+                    limit=limit)
+                pw.close()
+    else:
+        raise Exception("invalid format {}".format(format))
+
+
+def limit_batches(batches=None, limit=None):
+    """
+    limit_batches skips empty batches and stops consuming batches once limit records have been yielded.
+    """
+    count = 0
+    for batch in batches:
+        if limit is not None and limit > 0 and count + len(batch) > limit:
+            batch = batch[0:limit-count]
+        if len(batch) > 0:
+            count += len(batch)
+            yield batch
+        # stop before the next batch is read, so that a paged source is not asked for a page that is not written
+        if limit is not None and limit > 0 and count >= limit:
+            return
+
+
+def write_json_batches(f=None, batches=None, kwargs=None, backend=None):
+    # write the items of a single JSON array, using the same separator as json.dumps would use
+    separator = kwargs["separators"][0]
+    f.write("[")
+    first = True
+    for batch in batches:
+        for item in batch:
+            if first:
+                first = False
+            else:
+                f.write(separator)
+            f.write(backend.dumps(item))
+    f.write("]")
+
+
+def write_jsonl_batches(drop_blanks=None, drop_nulls=None, f=None, batches=None, kwargs=None, backend=None):
+    batches = iter(batches)
+    first = next(batches)
+    if isinstance(first, pa.RecordBatch):
+        for batch in itertools.chain([first], batches):
+            write_jsonl_columns(
+                data=pa.Table.from_batches([batch]),
+                drop_blanks=drop_blanks,
+                drop_nulls=drop_nulls,
+                f=f,
+                kwargs=kwargs)
+        return
+    for i, item in enumerate(itertools.chain.from_iterable(itertools.chain([first], batches))):
+        f.write(("\n" if i > 0 else "") + backend.dumps(item))
+
+
+def write_csv_batches(drop_blanks=None, drop_nulls=None, f=None, batches=None, columns=None, format=None):
+    """
+    write_csv_batches writes the batches as csv or tsv with a single header.  Without explicit columns, the header is
+    taken from the keys of the first batch, since later batches are not read yet.  Missing keys, such as blanks and
+    nulls that were dropped, are written as empty cells.  A key that is not in the header raises an exception, since
+    the header has already been written.
+    """
+    batches = iter(batches)
+    first = next(batches)
+    if isinstance(first, pa.RecordBatch):
+        columns = columns or sorted(first.schema.names)
+        for i, batch in enumerate(itertools.chain([first], batches)):
+            write_csv_table(
+                data=batch,
+                drop_blanks=drop_blanks,
+                drop_nulls=drop_nulls,
+                f=f,
+                format=format,
+                columns=columns,
+                header=(i == 0))
+        return
+    fieldnames = columns or sorted(list({k for d in first for k in d.keys()}))
+    cw = csv.DictWriter(
+        f,
+        delimiter=("\t" if format == "tsv" else ","),
+        fieldnames=fieldnames,
+        restval="",
+        extrasaction="raise")
+    cw.writeheader()
+    for batch in itertools.chain([first], batches):
+        try:
+            cw.writerows(batch)
+        except ValueError as err:
+            raise Exception("error writing {}: a record has a column that is not in the header {}: {}".format(
+                format,
+                fieldnames,
+                err
+            ))
+
+
+def write_batches(
+    drop_blanks=None,
+    drop_nulls=None,
+    f=None,
+    batches=None,
+    columns=None,
+    format=None,
+    kwargs=None,
+    backend=None
+):
+    # lists of records are already cleaned, while record batches are cleaned by the columnar writers
+    if format == "json":
+        batches = (
+            clean(batch.to_pylist(), drop_nulls=drop_nulls, drop_blanks=drop_blanks)
+            if isinstance(batch, pa.RecordBatch) else batch
+            for batch in batches
+        )
+        write_json_batches(f=f, batches=batches, kwargs=kwargs, backend=backend)
+    elif format == "jsonl":
+        write_jsonl_batches(
+            drop_blanks=drop_blanks,
+            drop_nulls=drop_nulls,
+            f=f,
+            batches=batches,
+            kwargs=kwargs,
+            backend=backend)
+    elif format == "csv" or format == "tsv":
+        write_csv_batches(
+            drop_blanks=drop_blanks,
+            drop_nulls=drop_nulls,
+            f=f,
+            batches=batches,
+            columns=columns,
+            format=format)
+
+
+def serialize_iter(
+    allow_nan=False,
+    dest=None,
+    batches=None,
+    drop_blanks=None,
+    drop_nulls=None,
+    encoder=None,
+    format=None,
+    compression=None,
+    columns=None,
+    limit=None,
+    row_group_size=None,
+    fs=None,
+    schema=None,
+    index=False,
+    safe=True,
+    pretty=False,
+    json_backend=None,
+    compression_threads=None,
+    compression_block_size=None,
+    compression_level=None,
+    partition_columns=None,
+    makedirs=False,
+    max_open_files=None,
+    upload_part_size=None,
+    upload_concurrency=None,
+    shard_rows=None,
+    shard_bytes=None,
+    shard_threads=None
+):
+    """
+    serialize_iter is the streaming counterpart to serialize.  It writes an iterable of batches, where each batch is a
+    list of records or a pyarrow RecordBatch, such as the batches returned by deserialize_iter.  Only one batch is held
+    in memory at a time, and no more batches are consumed once limit records have been written.  If partition_columns
+    is set, then parquet is written as a dataset of hive partitions, with at most max_open_files files open at once.
+    If shard_rows or shard_bytes is set, then the batches are written as shards in the dest directory, as described by
+    serialize_shards.
+    """
+
+    if format not in ["csv", "json", "jsonl", "parquet", "tsv"]:
+        raise Exception("invalid format {}".format(format))
+
+    if shard_rows is not None or shard_bytes is not None:
+        if partition_columns is not None and len(partition_columns) > 0:
+            raise Exception("cannot shard output that is partitioned")
+        return serialize_shards(
+            dest=dest,
+            batches=batches,
+            format=format,
+            compression=compression,
+            limit=limit,
+            fs=fs,
+            makedirs=makedirs,
+            shard_rows=shard_rows,
+            shard_bytes=shard_bytes,
+            shard_threads=shard_threads,
+            upload_part_size=upload_part_size,
+            upload_concurrency=upload_concurrency,
+            allow_nan=allow_nan,
+            drop_blanks=drop_blanks,
+            drop_nulls=drop_nulls,
+            encoder=encoder,
+            columns=columns,
+            row_group_size=row_group_size,
+            schema=schema,
+            index=index,
+            safe=safe,
+            pretty=pretty,
+            json_backend=json_backend,
+            compression_threads=compression_threads,
+            compression_block_size=compression_block_size,
+            compression_level=compression_level
+        )
+
+    batches = limit_batches(batches=batches, limit=limit)
+
+    if drop_nulls or drop_blanks:
+        batches = (
+            clean(batch, drop_nulls=drop_nulls, drop_blanks=drop_blanks) if isinstance(batch, list) else batch
+            for batch in batches
+        )
+
+    first = next(batches, None)
+    if first is None:
+        if format == "json":
+            first = []
+        else:
+            return
+
+    batches = itertools.chain([first], batches)
+
+    if format == "parquet" and partition_columns is not None and len(partition_columns) > 0:
+        with IncrementalDatasetWriter(
+            dest,
+            partition_columns,
+            compression=parquet_compression(compression),
+            filesystem=fs,
+            makedirs=makedirs,
+            preserve_index=index,
+            schema=schema,
+            max_open_files=max_open_files
+        ) as dw:
+            for batch in batches:
+                dw.write_batch(batch, row_group_size=row_group_size, safe=safe)
+        return
+
+    if format == "parquet":
+        if isinstance(first, pa.RecordBatch):
+            table = pa.Table.from_batches([first])
+            batches = (pa.Table.from_batches([batch]).cast(table.schema) for batch in batches)
+        else:
+            table = pa.Table.from_pandas(pd.DataFrame(first), schema=schema, preserve_index=index)
+        if fs is not None:
+            with open_upload(fs, dest, part_size=upload_part_size, concurrency=upload_concurrency) as f:
+                pw = PartitionWriter(
+                    f,
+                    table.schema,
+                    compression=parquet_compression(compression))
+                for batch in batches:
+                    pw.write_partition(
+                        batch,
+                        row_group_size=row_group_size,
+                        preserve_index=index,
+                        safe=safe)
+                pw.close()
+        else:
             pw = PartitionWriter(
                 dest,
                 table.schema,
-                compression=compression.upper() if compression in ['gzip', 'snappy'] else None,
-                filesystem=fs)
-            pw.write_partition(
-                table,
-                row_group_size=row_group_size,
-                row_group_columns=row_group_columns,
-                preserve_index=index,
-                safe=safe,
-                limit=limit)
+                compression=parquet_compression(compression))
+            for batch in batches:
+                pw.write_partition(
+                    batch,
+                    row_group_size=row_group_size,
+                    preserve_index=index,
+                    safe=safe)
             pw.close()
+        return
+
+    kwargs = {
+        "allow_nan": allow_nan,
+        "cls": (encoder if encoder is not None else Encoder),
+        "separators": ((', ', ': ') if pretty else (',', ':'))
+    }
+
+    backend = create_backend(json_backend, **kwargs)
+
+    if fs is not None:
+        with open_upload(fs, dest, part_size=upload_part_size, concurrency=upload_concurrency) as f:
+            with create_writer(
+                f=f,
+                compression=compression,
+                threads=compression_threads,
+                block_size=compression_block_size,
+                level=compression_level
+            ) as w:
+                write_batches(
+                    drop_blanks=drop_blanks,
+                    drop_nulls=drop_nulls,
+                    f=w,
+                    batches=batches,
+                    columns=columns,
+                    format=format,
+                    kwargs=kwargs,
+                    backend=backend)
     else:
-        raise Exception("invalid format {}".format(format))
+        with create_writer(
+            f=dest,
+            compression=compression,
+            threads=compression_threads,
+            block_size=compression_block_size,
+            level=compression_level
+        ) as w:
+            write_batches(
+                drop_blanks=drop_blanks,
+                drop_nulls=drop_nulls,
+                f=w,
+                batches=batches,
+                columns=columns,
+                format=format,
+                kwargs=kwargs,
+                backend=backend)
+
+
+def slice_batch(batch, start, end):
+    if isinstance(batch, pa.RecordBatch):
+        return batch.slice(start, end - start)
+    return batch[start:end]
+
+
+def serialize_shards(
+    dest=None,
+    batches=None,
+    format=None,
+    compression=None,
+    limit=None,
+    fs=None,
+    makedirs=False,
+    shard_rows=None,
+    shard_bytes=None,
+    shard_threads=None,
+    upload_part_size=None,
+    upload_concurrency=None,
+    **kwargs
+):
+    """
+    serialize_shards writes an iterable of batches as numbered shards in the dest directory, such as
+    part-00000.jsonl.gz, rolling to a new shard after shard_rows records or once shard_bytes bytes have been written.
+    For csv, json, and jsonl, shard_bytes is the size of the encoded output before compression, so compressed shards
+    are smaller than shard_bytes by the compression ratio, and a shard exceeds shard_bytes by at most 1/64 of
+    shard_bytes and one record.  For parquet, shard_bytes is the size of the file, which is counted as each row group
+    is written, and a shard exceeds shard_bytes by the error in the estimated size of its last row group, usually a
+    few percent, and the footer.  Batches are split into writes or row groups sized from the bytes per record already
+    written to the shard.  If only shard_rows is set, then
+    shard_threads shards are encoded and compressed at once.  Each shard is written by serialize_iter with the
+    remaining keyword arguments.  A manifest.json with the name, number of records, and size of each shard is written
+    last, and the manifest is returned.
+    """
+
+    if shard_rows is not None and shard_rows <= 0:
+        raise Exception("shard_rows is invalid: expecting at least 1 row but found {}".format(shard_rows))
+
+    if shard_bytes is not None and shard_bytes <= 0:
+        raise Exception("shard_bytes is invalid: expecting at least 1 byte but found {}".format(shard_bytes))
+
+    if fs is None and makedirs:
+        os.makedirs(dest, exist_ok=True)
+
+    batches = limit_batches(batches=batches, limit=limit)
+
+    # a batch that spans two shards is split, and the rest is written at the start of the next shard
+    remainder = []
+
+    def shard_batches(counter):
+        count = 0
+        while shard_rows is None or count < shard_rows:
+            if shard_bytes is not None and counter is not None and counter.bytes >= shard_bytes:
+                return
+            batch = remainder.pop() if len(remainder) > 0 else next(batches, None)
+            if batch is None:
+                return
+            end = len(batch)
+            if shard_rows is not None:
+                end = min(end, shard_rows - count)
+            if shard_bytes is not None and counter is not None:
+                # write the records estimated to fit in the rest of the shard from the size of the records already
+                # written, starting with a few records to measure.  Text is written half of the rest at a time, so
+                # that the estimate is corrected as the records change in size, while parquet is written in as few
+                # row groups as possible.
+                if count > 0 and counter.bytes > 0:
+                    rest = (shard_bytes - counter.bytes) * count // counter.bytes
+                    if format != "parquet" and rest > shard_sample_rows:
+                        rest = rest // 2
+                    end = min(end, max(1, rest))
+                else:
+                    end = min(end, shard_sample_rows)
+            if end < len(batch):
+                remainder.append(slice_batch(batch, end, len(batch)))
+                batch = slice_batch(batch, 0, end)
+            count += len(batch)
+            yield batch
+
+    def write_shard(name, shard):
+        path = dest.rstrip("/") + "/" + name
+        rows = 0
+
+        def count_rows(batches):
+            nonlocal rows
+            for batch in batches:
+                rows += len(batch)
+                yield batch
+
+        if fs is not None:
+            f = open_upload(fs, path, part_size=upload_part_size, concurrency=upload_concurrency)
+        else:
+            f = open(path, 'wb')
+        with f:
+            out = CountingFile(f)
+            if format == "parquet":
+                serialize_iter(
+                    dest=out,
+                    batches=count_rows(shard(out)),
+                    format=format,
+                    compression=compression,
+                    **kwargs
+                )
+            else:
+                # the shard is compressed here, so that the encoded bytes are counted before compression, and the
+                # encoder writes small blocks, so that the count is never behind by more than 1/64 of shard_bytes
+                with create_writer(
+                    f=out,
+                    compression=compression,
+                    threads=kwargs.get("compression_threads"),
+                    block_size=kwargs.get("compression_block_size"),
+                    level=kwargs.get("compression_level")
+                ) as w:
+                    encoded = CountingFile(w)
+                    serialize_iter(
+                        dest=encoded,
+                        batches=count_rows(shard(encoded)),
+                        format=format,
+                        compression=None,
+                        **dict(kwargs, compression_block_size=min(65536, max(1, (shard_bytes or 0) // 64)))
+                    )
+        return {"name": name, "rows": rows, "bytes": out.bytes}
+
+    def has_next():
+        if len(remainder) == 0:
+            batch = next(batches, None)
+            if batch is None:
+                return False
+            remainder.append(batch)
+        return True
+
+    ext = file_extension(format=format, compression=compression)
+
+    shards = []
+    if shard_bytes is None and shard_threads is not None and shard_threads > 1:
+        # shards are collected in order and written by a pool of threads, with at most shard_threads waiting
+        with ThreadPoolExecutor(max_workers=shard_threads) as executor:
+            pending = deque()
+            while has_next():
+                shard = list(shard_batches(None))
+                name = "part-{:05d}{}".format(len(shards) + len(pending), ext)
+                if len(pending) >= shard_threads:
+                    shards += [pending.popleft().result()]
+                pending.append(executor.submit(write_shard, name, lambda cf, shard=shard: iter(shard)))
+            while len(pending) > 0:
+                shards += [pending.popleft().result()]
+    else:
+        while has_next():
+            shards += [write_shard("part-{:05d}{}".format(len(shards), ext), shard_batches)]
+
+    manifest = {
+        "format": format,
+        "compression": compression,
+        "rows": sum(shard["rows"] for shard in shards),
+        "bytes": sum(shard["bytes"] for shard in shards),
+        "shards": shards
+    }
+
+    path = dest.rstrip("/") + "/manifest.json"
+    if fs is not None:
+        with fs.open(path, 'wb') as f:
+            f.write(json.dumps(manifest, indent=2).encode("utf-8"))
+    else:
+        with open(path, 'wb') as f:
+            f.write(json.dumps(manifest, indent=2).encode("utf-8"))
+
+    return manifest
@@ -5,21 +5,38 @@
 #
 # =================================================================
 
+import contextlib
 import datetime
 import decimal
+import gzip
+import io
 import json
 from multiprocessing import get_context
 import os
 import shutil
+import tarfile
 import tempfile
 import unittest
+import zipfile
 
+import fsspec
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
-from pyserializer.deserialize import deserialize
+from pyserializer.archive import names
+from pyserializer.athena import iter_query
+from pyserializer.backend import orjson
+from pyserializer.cleaner import clean
+from pyserializer.cli import Athena
+from pyserializer.deserialize import csv_fieldnames, deserialize, deserialize_iter
 from pyserializer.encoder import Encoder
-from pyserializer.parquet import DatasetWriter
-from pyserializer.serialize import serialize
+from pyserializer.inputs import expand_inputs, map_inputs, output_path, output_paths
+from pyserializer.parquet import DatasetWriter, PartitionWriter, group_table
+from pyserializer.s3 import MultipartUpload, create_s3_filesystem
+from pyserializer.serialize import serialize, serialize_iter
+from pyserializer.writer import create_writer
 
 
 class TestEncoder(unittest.TestCase):
@@ -155,6 +172,601 @@ class TestEncoder(unittest.TestCase):
             'error encoding decimal'
         )
 
+    def test_datetime_timezone(self):
+        self.assertEqual(
+            json.dumps(
+                datetime.datetime(
+                    2001, 1, 1, hour=1, minute=1, second=1,
+                    tzinfo=datetime.timezone(-datetime.timedelta(hours=5, minutes=30))
+                ),
+                cls=Encoder
+            ),
+            '"2001-01-01T01:01:01.000000-0530"',
+            'error encoding datetime with timezone'
+        )
+
+    def test_date_before_1000(self):
+        self.assertEqual(
+            json.dumps(datetime.date(999, 1, 1), cls=Encoder),
+            json.dumps(datetime.date(999, 1, 1).strftime("%Y-%m-%d")),
+            'error encoding date before year 1000'
+        )
+
+    def test_register(self):
+        class Point(object):
+            def __init__(self, x, y):
+                self.x = x
+                self.y = y
+
+        class PointEncoder(Encoder):
+            pass
+
+        PointEncoder.register(Point, lambda encoder, obj: [obj.x, obj.y])
+        self.assertEqual(
+            json.dumps({"point": Point(1, 2)}, cls=PointEncoder),
+            '{"point": [1, 2]}',
+            'error encoding value with registered handler'
+        )
+        with self.assertRaises(TypeError):
+            json.dumps(Point(1, 2), cls=Encoder)
+
+    def test_handlers(self):
+        self.assertEqual(
+            json.dumps(
+                [decimal.Decimal('1.5'), datetime.date(2001, 1, 1)],
+                cls=Encoder,
+                handlers={datetime.date: lambda encoder, obj: obj.year}
+            ),
+            '[1.5, 2001]',
+            'error encoding value with handler'
+        )
+        self.assertEqual(
+            json.dumps(datetime.date(2001, 1, 1), cls=Encoder),
+            '"2001-01-01"',
+            'error encoding date after using handler'
+        )
+
+
+class TestCleaner(unittest.TestCase):
+
+    def test_clean_table(self):
+        data = pa.table({"hello": ["world", "", None], "value": [1.0, float('nan'), None]})
+        self.assertEqual(
+            clean(data).to_pylist(),
+            [{"hello": "world", "value": 1.0}, {"hello": None, "value": None}, {"hello": None, "value": None}],
+            'error cleaning table'
+        )
+
+    def test_clean_table_blanks(self):
+        data = pa.table({"hello": ["world", "", None], "order": [1, 2, 3]})
+        self.assertEqual(
+            clean(data, drop_nulls=False, drop_blanks=True).column("hello").to_pylist(),
+            ["world", None, None],
+            'error cleaning blanks from table'
+        )
+
+    def test_clean_dataframe(self):
+        data = pd.DataFrame({"hello": ["world", "", None], "order": [1, 2, 3], "value": [1.0, float('nan'), 3.0]})
+        result = clean(data)
+        self.assertEqual(
+            result.to_dict(orient="records"),
+            [
+                {"hello": "world", "order": 1, "value": 1.0},
+                {"hello": None, "order": 2, "value": None},
+                {"hello": None, "order": 3, "value": 3.0}
+            ],
+            'error cleaning data frame'
+        )
+        self.assertEqual(str(result["order"].dtype), "int64", 'error cleaning data frame changed column without drops')
+
+
+class TestWriter(unittest.TestCase):
+
+    def test_buffered_file_object(self):
+        f = io.BytesIO()
+        with create_writer(f=f, block_size=4) as w:
+            w.write("pl\u00e4")
+            w.write(b"net")
+        self.assertEqual(f.getvalue(), "pl\u00e4net".encode("utf-8"), 'error writing to file object')
+        self.assertEqual((w.bytes_in, w.bytes_out), (7, 7), 'error counting bytes written')
+
+    def test_gzip_file_object(self):
+        f = io.BytesIO()
+        with create_writer(compression="gzip", f=f, block_size=4, threads=2) as w:
+            for i in range(100):
+                w.write("hello {}\n".format(i))
+        self.assertEqual(
+            gzip.decompress(f.getvalue()).decode("utf-8"),
+            "".join("hello {}\n".format(i) for i in range(100)),
+            'error compressing to file object'
+        )
+        self.assertEqual(w.bytes_out, len(f.getvalue()), 'error counting compressed bytes written')
+
+
+class TestParquet(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_group_table(self):
+        table = pa.table({
+            "state": ["VA", "MD", None, "VA", "MD"],
+            "score": [1.0, float("nan"), 2.0, 1.0, 3.0],
+            "order": [1, 2, 3, 4, 5]
+        })
+        self.assertEqual(
+            [(keys, group.column("order").to_pylist()) for keys, group in group_table(table, ["state", "score"])],
+            [(("MD", 3.0), [5]), (("VA", 1.0), [1, 4])],
+            'error grouping table'
+        )
+        self.assertEqual(
+            [group.column("order").to_pylist() for keys, group in group_table(table, ["state"], dropna=False)],
+            [[2, 5], [1, 4], [3]],
+            'error grouping table with nulls'
+        )
+
+    def test_group_table_dictionary(self):
+        table = pa.table({
+            "state": pa.array(["VA", "MD", None, "VA"]).dictionary_encode(),
+            "order": [1, 2, 3, 4]
+        })
+        groups = list(group_table(table, ["state"], dropna=False))
+        self.assertEqual(
+            [(keys, group.column("order").to_pylist()) for keys, group in groups],
+            [(("MD",), [2]), (("VA",), [1, 4]), ((None,), [3])],
+            'error grouping table by dictionary column'
+        )
+        self.assertTrue(pa.types.is_dictionary(groups[0][1].column("state").type), 'error keeping dictionary column')
+        # a pandas categorical column is partitioned by its values
+        test_dir_dataset = os.path.join(self.test_dir, 'data')
+        serialize(
+            dest=test_dir_dataset,
+            data=pd.DataFrame({"state": pd.Categorical(["VA", "MD", "VA"]), "order": [1, 2, 3]}),
+            format="parquet",
+            partition_columns=["state"],
+            makedirs=True
+        )
+        self.assertEqual(
+            sorted(os.listdir(test_dir_dataset)),
+            ["state=MD", "state=VA"],
+            'error writing categorical parquet partitions'
+        )
+
+    def test_partition_writer_row_groups(self):
+        test_file = os.path.join(self.test_dir, 'data.parquet')
+        table = pa.table({
+            "ciao": ["sun", "moon", None, "sun", "moon"],
+            "order": [1, 2, 3, 4, 5]
+        })
+        pw = PartitionWriter(test_file, table.schema)
+        pw.write_partition(table, row_group_columns=["ciao"], limit=4)
+        pw.close()
+        f = pq.ParquetFile(test_file)
+        self.assertEqual(
+            [f.read_row_group(i).column("order").to_pylist() for i in range(f.num_row_groups)],
+            [[2], [1, 4], [3]],
+            'error writing row groups'
+        )
+
+    def test_incremental_dataset_writer(self):
+        test_dir_dataset = os.path.join(self.test_dir, 'data')
+        batches = [
+            [{"hour": 1, "order": 1}, {"hour": 2, "order": 2}],
+            [{"hour": 3, "order": 3}, {"hour": 1, "order": 4}],
+            [{"hour": 1, "order": 5}, {"hour": 2, "order": 6}]
+        ]
+        serialize_iter(
+            dest=test_dir_dataset,
+            batches=iter(batches),
+            format="parquet",
+            partition_columns=["hour"],
+            makedirs=True,
+            max_open_files=2
+        )
+        self.assertEqual(
+            {d: sorted(os.listdir(os.path.join(test_dir_dataset, d))) for d in os.listdir(test_dir_dataset)},
+            {"hour=1": ["1.parquet"], "hour=2": ["2.1.parquet", "2.parquet"], "hour=3": ["3.parquet"]},
+            'error rolling files for evicted partitions'
+        )
+        self.assertEqual(
+            pq.ParquetFile(os.path.join(test_dir_dataset, "hour=3", "3.parquet")).read().to_pylist(),
+            [{"order": 3}],
+            'error writing partition'
+        )
+        result = deserialize(src=test_dir_dataset, format="parquet")
+        self.assertEqual(
+            sorted((x['hour'], x['order']) for x in result),
+            [(1, 1), (1, 4), (1, 5), (2, 2), (2, 6), (3, 3)],
+            'error writing incremental dataset'
+        )
+
+
+class StubS3FileSystem(object):
+
+    def __init__(self):
+        self.calls = []
+        self.objects = {}
+        self.uploads = {}
+
+    def split_path(self, path):
+        bucket, key = path.split("/", 1)
+        return bucket, key, None
+
+    def call_s3(self, method, **kwargs):
+        self.calls += [method]
+        if method == "put_object":
+            self.objects[kwargs["Key"]] = kwargs["Body"]
+        elif method == "create_multipart_upload":
+            self.uploads["1"] = {}
+            return {"UploadId": "1"}
+        elif method == "upload_part":
+            self.uploads[kwargs["UploadId"]][kwargs["PartNumber"]] = kwargs["Body"]
+            return {"ETag": str(kwargs["PartNumber"])}
+        elif method == "complete_multipart_upload":
+            parts = self.uploads.pop(kwargs["UploadId"])
+            self.objects[kwargs["Key"]] = b"".join(parts[p["PartNumber"]] for p in kwargs["MultipartUpload"]["Parts"])
+        elif method == "abort_multipart_upload":
+            self.uploads.pop(kwargs["UploadId"])
+        return {}
+
+
+class TestS3(unittest.TestCase):
+
+    def test_multipart_upload(self):
+        fs = StubS3FileSystem()
+        data = os.urandom(1024 * 1024)
+        with MultipartUpload(fs, "bucket/data.bin", part_size=5 * 1024 * 1024, concurrency=2) as f:
+            for i in range(12):
+                f.write(data)
+        self.assertEqual(fs.objects["data.bin"], data * 12, 'error uploading parts')
+        self.assertEqual(
+            fs.calls,
+            ["create_multipart_upload"] + ["upload_part"] * 3 + ["complete_multipart_upload"],
+            'error uploading parts'
+        )
+
+    def test_multipart_upload_abort(self):
+        fs = StubS3FileSystem()
+        with self.assertRaises(ValueError):
+            with MultipartUpload(fs, "bucket/data.bin", part_size=5 * 1024 * 1024) as f:
+                f.write(os.urandom(6 * 1024 * 1024))
+                raise ValueError("error encoding")
+        self.assertEqual(fs.calls[-1], "abort_multipart_upload", 'error aborting upload')
+        self.assertEqual(fs.objects, {}, 'error aborting upload')
+
+    def test_create_s3_filesystem(self):
+        fs = create_s3_filesystem(region="us-east-1", max_pool_connections=32, retries=5, retry_mode="adaptive")
+        self.assertIs(
+            create_s3_filesystem(region="us-east-1", max_pool_connections=32, retries=5, retry_mode="adaptive"),
+            fs,
+            'error reusing cached filesystem'
+        )
+        self.assertIsNot(create_s3_filesystem(region="us-west-2"), fs, 'error caching filesystem by region')
+        self.assertEqual(
+            fs.config_kwargs,
+            {"max_pool_connections": 32, "retries": {"max_attempts": 5, "mode": "adaptive"}},
+            'error configuring filesystem'
+        )
+        # multipart uploads use the client of the filesystem
+        self.assertTrue(hasattr(fs, "call_s3"), 'error creating filesystem with call_s3')
+        with self.assertRaises(Exception):
+            create_s3_filesystem(cache_type="unknown")
+
+    def test_open_upload_unsupported(self):
+        fs = fsspec.filesystem("memory")
+        with self.assertRaises(Exception):
+            serialize(dest="/test_open_upload_unsupported/data.jsonl", data=[{"a": 1}], format="jsonl", fs=fs,
+                      upload_part_size=5 * 1024 * 1024)
+
+    def test_serialize_upload(self):
+        fs = StubS3FileSystem()
+        data = [{"hello": "world", "order": 1}, {"hello": "planet", "order": 2}]
+        serialize(dest="bucket/data.jsonl", data=data, format="jsonl", fs=fs, upload_concurrency=4)
+        self.assertEqual(fs.calls, ["put_object"], 'error uploading small object')
+        self.assertEqual(
+            [json.loads(line) for line in fs.objects["data.jsonl"].decode("utf-8").splitlines()],
+            data,
+            'error uploading jsonl'
+        )
+        serialize(dest="bucket/data.parquet", data=data, format="parquet", fs=fs, upload_concurrency=4)
+        self.assertEqual(
+            pq.read_table(io.BytesIO(fs.objects["data.parquet"])).to_pylist(),
+            data,
+            'error uploading parquet'
+        )
+
+
+class TestInputs(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_expand_inputs(self):
+        for name in ["a.jsonl", "b.jsonl", "_SUCCESS", "sub/c.jsonl", ".hidden/d.jsonl"]:
+            path = os.path.join(self.test_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write("{}")
+        self.assertEqual(
+            expand_inputs(self.test_dir),
+            [os.path.join(self.test_dir, name) for name in ["a.jsonl", "b.jsonl", "sub/c.jsonl"]],
+            'error expanding directory'
+        )
+        self.assertEqual(
+            expand_inputs([os.path.join(self.test_dir, "b.jsonl"), os.path.join(self.test_dir, "*.jsonl")]),
+            [os.path.join(self.test_dir, name) for name in ["b.jsonl", "a.jsonl"]],
+            'error expanding patterns'
+        )
+
+    def test_output_path(self):
+        self.assertEqual(
+            output_path("bucket/in/data.jsonl.gz", "bucket/out/", "csv", "zstd"),
+            "bucket/out/data.csv.zst",
+            'error replacing extensions'
+        )
+        self.assertEqual(
+            output_path("in/data", "out", "parquet", "gzip"),
+            "out/data.parquet",
+            'error adding extensions'
+        )
+
+    def test_output_paths(self):
+        self.assertEqual(
+            output_paths(["in/dt=1/part-0.jsonl", "in/dt=2/part-0.jsonl.gz"], "out", "csv", None),
+            {"in/dt=1/part-0.jsonl": "out/dt=1/part-0.csv", "in/dt=2/part-0.jsonl.gz": "out/dt=2/part-0.csv"},
+            'error keeping directories of inputs'
+        )
+        with self.assertRaises(Exception):
+            output_paths(["in/data.jsonl", "in/data.jsonl.gz"], "out", "csv", None)
+
+    def test_map_inputs(self):
+        attempts = {}
+
+        def func(path):
+            attempts[path] = attempts.get(path, 0) + 1
+            if path == "b" and attempts[path] < 2:
+                raise Exception("temporary error")
+            if path == "c":
+                raise Exception("permanent error")
+            return path.upper()
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            results = list(map_inputs(func, ["a", "b", "c", "d"], workers=2, retries=1))
+        self.assertEqual(
+            [(path, result, err is not None) for path, result, err in results],
+            [("a", "A", False), ("b", "B", False), ("c", None, True), ("d", "D", False)],
+            'error mapping inputs'
+        )
+        self.assertEqual(attempts, {"a": 1, "b": 2, "c": 2, "d": 1}, 'error retrying inputs')
+
+
+class StubAthenaCursor(object):
+
+    def __init__(self, description, rows):
+        self.description = None
+        self.pending = description
+        self.rows = rows
+        self.fetches = 0
+        self.closed = False
+
+    def execute(self, query):
+        self.query = query
+        self.description = self.pending
+        return self
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        rows, self.rows = self.rows[0:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        self.closed = True
+
+
+class StubAthenaConnection(object):
+
+    def __init__(self, cursor):
+        self.stub_cursor = cursor
+        self.kwargs = None
+
+    def __call__(self, **kwargs):
+        self.kwargs = kwargs
+        return self
+
+    def cursor(self):
+        return self.stub_cursor
+
+
+class TestAthena(unittest.TestCase):
+
+    description = [
+        ("a", "integer", None, None, 10, 0, "UNKNOWN"),
+        ("b", "varchar", None, None, 2147483647, 0, "UNKNOWN"),
+        ("c", "decimal", None, None, 10, 2, "UNKNOWN")
+    ]
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_iter_query(self):
+        cursor = StubAthenaCursor(self.description, [
+            (1, "x", decimal.Decimal("1.50")),
+            (2, None, None),
+            (None, None, None)
+        ])
+        batches = list(iter_query(cursor=cursor, query="SELECT 1", batch_size=2))
+        self.assertEqual(cursor.query, "SELECT 1", 'error executing query')
+        self.assertEqual([batch.num_rows for batch in batches], [2, 1], 'error paging results')
+        # every batch has the schema from the description, even if all of its values are null
+        self.assertEqual(
+            [batch.schema for batch in batches],
+            [pa.schema([("a", pa.int32()), ("b", pa.string()), ("c", pa.decimal128(10, 2))])] * 2,
+            'error typing results'
+        )
+        self.assertEqual(
+            pa.Table.from_batches(batches).to_pylist(),
+            [
+                {"a": 1, "b": "x", "c": decimal.Decimal("1.50")},
+                {"a": 2, "b": None, "c": None},
+                {"a": None, "b": None, "c": None}
+            ],
+            'error reading results'
+        )
+
+    def test_query_stream(self):
+        cursor = StubAthenaCursor(self.description, [(i, str(i), decimal.Decimal(i)) for i in range(10)])
+        connect = StubAthenaConnection(cursor)
+        test_file = os.path.join(self.test_dir, 'results.jsonl')
+        Athena(connect=connect).query(
+            workgroup="primary",
+            query="SELECT a, b, c FROM t",
+            dest=test_file,
+            output_format="jsonl",
+            input_athena_region="us-east-1",
+            limit=3,
+            stream=True,
+            batch_size=2
+        )
+        with open(test_file) as f:
+            self.assertEqual(
+                [json.loads(line) for line in f],
+                [{"a": i, "b": str(i), "c": i} for i in range(3)],
+                'error exporting results'
+            )
+        self.assertNotIn("cursor_class", connect.kwargs, 'error connecting with default cursor')
+        # no more pages are fetched once the limit is written
+        self.assertEqual(cursor.fetches, 2, 'error limiting results')
+        self.assertTrue(cursor.closed, 'error closing cursor')
+
+    def test_query_stream_complex_types(self):
+        description = [
+            ("a", "integer", None, None, 10, 0, "UNKNOWN"),
+            ("d", "array", None, None, 0, 0, "UNKNOWN"),
+            ("e", "map", None, None, 0, 0, "UNKNOWN")
+        ]
+        # the complex columns are all nulls in the first batch
+        cursor = StubAthenaCursor(description, [
+            (1, None, None),
+            (2, None, None),
+            (3, [1, 2], {"k": "v"})
+        ])
+        connect = StubAthenaConnection(cursor)
+        test_file = os.path.join(self.test_dir, 'results.parquet')
+        Athena(connect=connect).query(
+            workgroup="primary",
+            query="SELECT a, d, e FROM t",
+            dest=test_file,
+            output_format="parquet",
+            input_athena_region="us-east-1",
+            stream=True,
+            batch_size=2
+        )
+        table = pq.read_table(test_file)
+        self.assertEqual(
+            table.schema,
+            pa.schema([("a", pa.int32()), ("d", pa.string()), ("e", pa.string())]),
+            'error typing complex columns'
+        )
+        self.assertEqual(
+            table.to_pylist(),
+            [
+                {"a": 1, "d": None, "e": None},
+                {"a": 2, "d": None, "e": None},
+                {"a": 3, "d": "[1,2]", "e": "{\"k\":\"v\"}"}
+            ],
+            'error exporting complex columns'
+        )
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write_tar(self, path, mode, members):
+        with tarfile.open(path, mode) as tf:
+            for name, data in members:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = 1600000000
+                tf.addfile(info, io.BytesIO(data))
+
+    def test_names_zip_filesystem(self):
+        fs = fsspec.filesystem("memory")
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(zipfile.ZipInfo("data/a.txt", date_time=(2020, 1, 2, 3, 4, 6)), "hello" * 100)
+        with fs.open("/test_names_zip_filesystem/data.zip", 'wb') as f:
+            f.write(buf.getvalue())
+        result = names(src="/test_names_zip_filesystem/data.zip", compression="zip", fs=fs)
+        fs.rm("/test_names_zip_filesystem", recursive=True)
+        self.assertEqual(
+            [(x["name"], x["size"], x["crc"], x["mtime"]) for x in result],
+            [("data/a.txt", 500, zipfile.crc32(b"hello" * 100), "2020-01-02T03:04:06")],
+            'error listing zip archive'
+        )
+
+    def test_names_tar(self):
+        test_file = os.path.join(self.test_dir, 'data.tar')
+        self.write_tar(test_file, "w", [("a.jsonl", b'{"a":1}\n'), ("b.jsonl", b'{"a":2}\n' * 100)])
+        self.assertEqual(
+            [(x["name"], x["size"], x["compressed_size"], x["offset"]) for x in names(src=test_file, format="tar")],
+            [("a.jsonl", 8, 8, 512), ("b.jsonl", 800, 800, 1536)],
+            'error listing tar archive'
+        )
+
+    def test_names_tar_gzip_index(self):
+        test_file = os.path.join(self.test_dir, 'data.tar.gz')
+        test_index = os.path.join(self.test_dir, 'data.tar.gz.index')
+        self.write_tar(test_file, "w:gz", [("a.jsonl", b'{"a":1}\n')])
+        result = names(src=test_file, format="tar", compression="gzip", index=test_index)
+        self.assertEqual(
+            result,
+            [{
+                "name": "a.jsonl",
+                "size": 8,
+                "compressed_size": None,
+                "crc": None,
+                "mtime": "2020-09-13T12:26:40+00:00",
+                "offset": 512
+            }],
+            'error listing compressed tar archive'
+        )
+        # the cached index is used while the archive is unchanged
+        with open(test_index) as f:
+            index = json.load(f)
+        index["members"][0]["name"] = "cached.jsonl"
+        with open(test_index, "w") as f:
+            json.dump(index, f)
+        self.assertEqual(
+            names(src=test_file, format="tar", compression="gzip", index=test_index)[0]["name"],
+            "cached.jsonl",
+            'error reading cached index'
+        )
+        # the index is rebuilt when the archive changes
+        self.write_tar(test_file, "w:gz", [("a.jsonl", b'{"a":1}\n'), ("b.jsonl", b'{"a":2}\n')])
+        self.assertEqual(
+            [x["name"] for x in names(src=test_file, format="tar", compression="gzip", index=test_index)],
+            ["a.jsonl", "b.jsonl"],
+            'error rebuilding index'
+        )
+
+    def test_names_invalid(self):
+        with self.assertRaises(Exception):
+            names(src="data.tar.gz", compression="gzip")
+
 
 class TestSerializer(unittest.TestCase):
 
@@ -384,6 +996,244 @@ class TestSerializer(unittest.TestCase):
             'error serializing to parquet and then deserializing back'
         )
 
+    def test_roundtrip_parquet_dataset_threads(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_roundtrip_parquet_dataset_threads')
+        os.makedirs(test_dir, exist_ok=True)
+        test_dir_dataset = os.path.join(test_dir, 'data')
+        #
+        data = [
+            {"hello": "world", "ciao": "sun", "order": 1},
+            {"hello": "world", "ciao": "moon", "order": 2},
+            {"hello": "planet", "ciao": "sun", "order": 3},
+            {"hello": "planet", "ciao": "moon", "order": 4}
+        ]
+        #
+        serialize(
+            dest=test_dir_dataset,
+            data=pa.Table.from_pylist(data),
+            format="parquet",
+            partition_columns=["hello"],
+            makedirs=True,
+            nthreads=2
+        )
+        #
+        self.assertEqual(
+            sorted(os.listdir(test_dir_dataset)),
+            ["hello=planet", "hello=world"],
+            'error writing parquet partitions with threads'
+        )
+        #
+        result = deserialize(src=test_dir_dataset, format="parquet")
+        #
+        self.assertEqual(
+            sorted(result, key=lambda x: x['order']),
+            sorted(data, key=lambda x: x['order']),
+            'error serializing to parquet with threads and then deserializing back'
+        )
+        #
+        with self.assertRaises(Exception):
+            serialize(
+                dest=test_dir_dataset,
+                data=data,
+                format="parquet",
+                partition_columns=["hello"],
+                executor="process"
+            )
+
+    def test_serialize_parquet_dataset_table(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_serialize_parquet_dataset_table')
+        os.makedirs(test_dir, exist_ok=True)
+        test_dir_dataset = os.path.join(test_dir, 'data')
+        #
+        table = pa.table({
+            "year": [2021, 2020, None, 2020, 2021, 2020],
+            "active": [True, False, True, False, True, True],
+            "order": [1, 2, 3, 4, 5, 6]
+        })
+        #
+        serialize(
+            dest=test_dir_dataset,
+            data=table,
+            format="parquet",
+            partition_columns=["year", "active"],
+            makedirs=True,
+            limit=5
+        )
+        #
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(test_dir_dataset, "year=2020"))),
+            ["active=0"],
+            'error writing boolean parquet partitions'
+        )
+        self.assertEqual(
+            pq.read_table(os.path.join(test_dir_dataset, "year=2021", "active=1", "2021-1.parquet")).to_pylist(),
+            [{"order": 1}, {"order": 5}],
+            'error writing parquet partition'
+        )
+        #
+        result = deserialize(src=test_dir_dataset, format="parquet", columns=["order"])
+        self.assertEqual(
+            sorted(x['order'] for x in result),
+            [1, 2, 4, 5],
+            'error writing parquet dataset without null partition keys'
+        )
+
+    def test_serialize_shards_rows(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_serialize_shards_rows')
+        #
+        data = [{"hello": "world", "order": i} for i in range(25)]
+        #
+        serialize(
+            dest=test_dir,
+            data=data,
+            format="jsonl",
+            compression="gzip",
+            makedirs=True,
+            shard_rows=10,
+            shard_threads=2
+        )
+        #
+        with open(os.path.join(test_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+        self.assertEqual(
+            [(shard["name"], shard["rows"]) for shard in manifest["shards"]],
+            [("part-00000.jsonl.gz", 10), ("part-00001.jsonl.gz", 10), ("part-00002.jsonl.gz", 5)],
+            'error sharding output by rows'
+        )
+        self.assertEqual(
+            [shard["bytes"] for shard in manifest["shards"]],
+            [os.path.getsize(os.path.join(test_dir, shard["name"])) for shard in manifest["shards"]],
+            'error counting shard sizes'
+        )
+        #
+        result = []
+        for shard in manifest["shards"]:
+            result += deserialize(src=os.path.join(test_dir, shard["name"]), format="jsonl", compression="gzip")
+        self.assertEqual(result, data, 'error reading shards')
+
+    def test_serialize_iter_shards_bytes(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_serialize_iter_shards_bytes')
+        #
+        batches = [pa.RecordBatch.from_pylist([{"hello": "world", "order": i}]) for i in range(20)]
+        #
+        manifest = serialize_iter(
+            dest=test_dir,
+            batches=iter(batches),
+            format="csv",
+            makedirs=True,
+            limit=15,
+            shard_bytes=50,
+            compression_block_size=1
+        )
+        #
+        self.assertEqual(manifest["rows"], 15, 'error limiting sharded output')
+        self.assertTrue(len(manifest["shards"]) > 1, 'error sharding output by size')
+        result = []
+        for shard in manifest["shards"]:
+            self.assertTrue(shard["bytes"] >= 50 or shard is manifest["shards"][-1], 'error rolling shard early')
+            result += deserialize(src=os.path.join(test_dir, shard["name"]), format="csv")
+        self.assertEqual([int(x["order"]) for x in result], list(range(15)), 'error reading shards')
+
+    def test_serialize_iter_shards_bytes_large_batch(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_serialize_iter_shards_bytes_large_batch')
+        #
+        batches = [[{"hello": "world" * (i % 7), "order": i} for i in range(2000)]]
+        #
+        manifest = serialize_iter(
+            dest=test_dir,
+            batches=iter(batches),
+            format="jsonl",
+            compression="gzip",
+            makedirs=True,
+            shard_bytes=4000
+        )
+        #
+        self.assertEqual(manifest["rows"], 2000, 'error writing sharded output')
+        result = []
+        for shard in manifest["shards"]:
+            with open(os.path.join(test_dir, shard["name"]), 'rb') as f:
+                data = gzip.decompress(f.read())
+            # a shard is split within the batch, and exceeds the size by at most 1/64 of the size and one record
+            self.assertTrue(len(data) <= 4000 + 4000 // 64 + 64, 'error rolling shard late')
+            self.assertTrue(len(data) >= 4000 or shard is manifest["shards"][-1], 'error rolling shard early')
+            result += [json.loads(line)["order"] for line in data.decode("utf-8").splitlines()]
+        self.assertEqual(result, list(range(2000)), 'error reading shards')
+
+    def test_deserialize_zip_members_filesystem(self):
+        #
+        fs = fsspec.filesystem("memory")
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("data/a.jsonl", '{"order":1}\n{"order":2}\n')
+            zf.writestr("data/b.jsonl", '{"order":3}\n')
+            zf.writestr("data/readme.txt", 'hello')
+        with fs.open("/test_deserialize_zip_members_filesystem/data.zip", 'wb') as f:
+            f.write(buf.getvalue())
+        src = "/test_deserialize_zip_members_filesystem/data.zip"
+        #
+        self.assertEqual(
+            deserialize(src=src, format="jsonl", compression="zip", name="data/b.jsonl", fs=fs),
+            [{"order": 3}],
+            'error reading zip member from filesystem'
+        )
+        self.assertEqual(
+            deserialize(src=src, format="jsonl", compression="zip", name="*.jsonl", fs=fs, member_workers=2),
+            [{"order": 1}, {"order": 2}, {"order": 3}],
+            'error reading zip members concurrently'
+        )
+        self.assertEqual(
+            deserialize(src=src, format="jsonl", compression="zip", name="*.jsonl", fs=fs, separate_members=True),
+            {"data/a.jsonl": [{"order": 1}, {"order": 2}], "data/b.jsonl": [{"order": 3}]},
+            'error reading zip members separately'
+        )
+        self.assertEqual(
+            deserialize(src=src, format="jsonl", compression="zip", name="*.jsonl", fs=fs, engine="arrow")
+            .column("order").to_pylist(),
+            [1, 2, 3],
+            'error reading zip members as table'
+        )
+        self.assertEqual(
+            list(deserialize_iter(src=src, format="jsonl", compression="zip", name="*.jsonl", fs=fs, batch_size=5)),
+            [[{"order": 1}, {"order": 2}], [{"order": 3}]],
+            'error streaming zip members'
+        )
+        fs.rm("/test_deserialize_zip_members_filesystem", recursive=True)
+
+    def test_deserialize_zip_member_glob_characters(self):
+        #
+        test_file = os.path.join(self.test_dir, 'test_deserialize_zip_member_glob_characters.zip')
+        with zipfile.ZipFile(test_file, 'w') as zf:
+            zf.writestr("data[1].csv", 'order\n1\n')
+            zf.writestr("data1.csv", 'order\n2\n')
+            zf.writestr("data2.csv", 'order\n3\n')
+        #
+        self.assertEqual(
+            deserialize(src=test_file, format="csv", compression="zip", name="data[1].csv"),
+            [{"order": "1"}],
+            'error reading zip member by exact name'
+        )
+        self.assertEqual(
+            list(deserialize_iter(src=test_file, format="csv", compression="zip", name="data[1].csv")),
+            [{"order": "1"}],
+            'error streaming zip member by exact name'
+        )
+        self.assertEqual(
+            deserialize(src=test_file, format="csv", compression="zip", name="data[1].csv", separate_members=True),
+            {"data[1].csv": [{"order": "1"}]},
+            'error reading zip member by exact name separately'
+        )
+        # a name that is not a member is a pattern
+        self.assertEqual(
+            deserialize(src=test_file, format="csv", compression="zip", name="data[12].csv"),
+            [{"order": "2"}, {"order": "3"}],
+            'error reading zip members by pattern'
+        )
+
     def test_roundtrip_csv_gzip(self):
         #
         test_dir = os.path.join(self.test_dir, 'test_roundtrip_csv_gzip')
@@ -479,3 +1329,530 @@ class TestSerializer(unittest.TestCase):
             sorted(data, key=lambda x: x['order']),
             'error serializing to json lines (jsonl ) and then deserializing back'
         )
+
+    def test_deserialize_iter_jsonl_gzip_batches(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_deserialize_iter_jsonl_gzip_batches')
+        os.makedirs(test_dir, exist_ok=True)
+        test_file = os.path.join(test_dir, 'data.jsonl.gz')
+        #
+        data = [{"hello": "world", "order": str(i)} for i in range(10)]
+        #
+        serialize(
+            compression="gzip",
+            dest=test_file,
+            data=data,
+            format="jsonl",
+        )
+        #
+        batches = list(deserialize_iter(
+            batch_size=4,
+            compression="gzip",
+            format="jsonl",
+            src=test_file,
+        ))
+        #
+        self.assertEqual(
+            [len(batch) for batch in batches],
+            [4, 4, 2],
+            'error deserializing json lines (jsonl) in batches'
+        )
+        self.assertEqual(
+            [x for batch in batches for x in batch],
+            data,
+            'error deserializing json lines (jsonl) in batches'
+        )
+
+    def test_deserialize_iter_json_array(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_deserialize_iter_json_array')
+        os.makedirs(test_dir, exist_ok=True)
+        test_file = os.path.join(test_dir, 'data.json')
+        #
+        data = [
+            {"hello": "world", "ciao": "", "order": 1},
+            {"hello": "planet", "ciao": None, "order": 2}
+        ]
+        #
+        serialize(dest=test_file, data=data, format="json", pretty=True)
+        #
+        result = list(deserialize_iter(
+            drop_blanks=True,
+            drop_nulls=True,
+            format="json",
+            src=test_file,
+        ))
+        #
+        self.assertEqual(
+            result,
+            [{"hello": "world", "order": 1}, {"hello": "planet", "order": 2}],
+            'error deserializing json array as an iterator'
+        )
+
+    def test_deserialize_iter_parquet(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_deserialize_iter_parquet')
+        os.makedirs(test_dir, exist_ok=True)
+        test_file = os.path.join(test_dir, 'data.parquet')
+        #
+        data = [{"hello": "world", "order": i} for i in range(5)]
+        #
+        serialize(dest=test_file, data=data, format="parquet")
+        #
+        result = list(deserialize_iter(src=test_file, format="parquet"))
+        #
+        self.assertEqual(
+            result,
+            data,
+            'error deserializing parquet as an iterator'
+        )
+
+    def test_roundtrip_jsonl_stream_limit(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_roundtrip_jsonl_stream_limit')
+        os.makedirs(test_dir, exist_ok=True)
+        test_file_jsonl = os.path.join(test_dir, 'data.jsonl.gz')
+        test_file_csv = os.path.join(test_dir, 'data.csv')
+        #
+        data = [{"hello": "world", "order": str(i)} for i in range(10)]
+        #
+        serialize(compression="gzip", dest=test_file_jsonl, data=data, format="jsonl")
+        #
+        serialize_iter(
+            batches=deserialize_iter(batch_size=3, compression="gzip", format="jsonl", src=test_file_jsonl),
+            dest=test_file_csv,
+            format="csv",
+            limit=4
+        )
+        #
+        result = None
+        with open(test_file_csv, mode='rt') as f:
+            result = f.read()
+        self.assertEqual(
+            result,
+            'hello,order\nworld,0\nworld,1\nworld,2\nworld,3\n',
+            'error streaming json lines (jsonl) to csv with limit'
+        )
+
+    def test_deserialize_csv_gzip_arrow(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_deserialize_csv_gzip_arrow')
+        os.makedirs(test_dir, exist_ok=True)
+        test_file = os.path.join(test_dir, 'data.csv.gz')
+        #
+        data = [
+            {"hello": "world", "ciao": "sun", "order": "1"},
+            {"hello": "world", "ciao": "", "order": "2"}
+        ]
+        #
+        serialize(compression="gzip", dest=test_file, data=data, format="csv")
+        #
+        result = deserialize(compression="gzip", engine="arrow", format="csv", src=test_file)
+        #
+        self.assertIsInstance(result, pa.Table, 'error deserializing csv with arrow engine')
+        self.assertEqual(
+            result.to_pylist(),
+            data,
+            'error deserializing csv with arrow engine'
+        )
+        #
+        result = deserialize(
+            columns=["order", "ciao"],
+            compression="gzip",
+            drop_blanks=True,
+            engine="arrow",
+            format="csv",
+            infer_types=True,
+            src=test_file
+        )
+        #
+        self.assertEqual(
+            result.to_pylist(),
+            [{"order": 1, "ciao": "sun"}, {"order": 2, "ciao": None}],
+            'error deserializing csv with arrow engine, column selection, and type inference'
+        )
+
+    def test_deserialize_jsonl_gzip_arrow(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_deserialize_jsonl_gzip_arrow')
+        os.makedirs(test_dir, exist_ok=True)
+        test_file = os.path.join(test_dir, 'data.jsonl.gz')
+        #
+        data = [{"hello": "world", "order": i} for i in range(10)]
+        #
+        serialize(compression="gzip", dest=test_file, data=data, format="jsonl")
+        #
+        result = deserialize(
+            compression="gzip",
+            engine="arrow",
+            format="jsonl",
+            schema=pa.schema([("order", pa.int32())]),
+            src=test_file
+        )
+        #
+        self.assertEqual(
+            result.schema,
+            pa.schema([("order", pa.int32()), ("hello", pa.string())]),
+            'error deserializing json lines (jsonl) with arrow engine and explicit schema'
+        )
+        self.assertEqual(
+            result.to_pylist(),
+            data,
+            'error deserializing json lines (jsonl) with arrow engine'
+        )
+        #
+        batches = list(deserialize_iter(
+            block_size=64,
+            columns=["order"],
+            compression="gzip",
+            engine="arrow",
+            format="jsonl",
+            src=test_file
+        ))
+        #
+        self.assertEqual(
+            [x for batch in batches for x in batch.to_pylist()],
+            [{"order": i} for i in range(10)],
+            'error deserializing json lines (jsonl) in record batches with arrow engine'
+        )
+
+    def test_serialize_jsonl_table_default(self):
+        test_dir = os.path.join(self.test_dir, 'test_serialize_jsonl_table_default')
+        os.makedirs(test_dir, exist_ok=True)
+        test_file = os.path.join(test_dir, 'data.jsonl')
+        data = pa.table({
+            "hello": ["world", "", None, "pl\"an\u00e9t"],
+            "order": [1, 2, 3, 4],
+            "value": [1.0, 0.5, None, 1e-05]
+        })
+        serialize(dest=test_file, data=data, format="jsonl", drop_blanks=True, drop_nulls=True)
+        result = None
+        with open(test_file, mode='rt') as f:
+            result = f.read()
+        self.assertEqual(
+            result,
+            '{"hello":"world","order":1,"value":1.0}\n{"order":2,"value":0.5}\n{"order":3}\n' +
+            '{"hello":"pl\\"an\\u00e9t","order":4,"value":1e-05}\n',
+            'error encoding table as JSON Lines (jsonl)'
+        )
+
+    def test_serialize_jsonl_table_empty_rows(self):
+        test_dir = os.path.join(self.test_dir, 'test_serialize_jsonl_table_empty_rows')
+        os.makedirs(test_dir, exist_ok=True)
+        test_file = os.path.join(test_dir, 'data.jsonl')
+        data = pa.table({"hello": ["world", None, ""], "order": [1, None, None]})
+        serialize(dest=test_file, data=data, format="jsonl", drop_blanks=True, drop_nulls=True)
+        result = None
+        with open(test_file, mode='rt') as f:
+            result = f.read()
+        self.assertEqual(
+            result,
+            '{"hello":"world","order":1}\n{}\n{}\n',
+            'error encoding rows with every field dropped as JSON Lines (jsonl)'
+        )
+
+    def test_serialize_jsonl_dataframe_arrow(self):
+        test_dir = os.path.join(self.test_dir, 'test_serialize_jsonl_dataframe_arrow')
+        os.makedirs(test_dir, exist_ok=True)
+        data = pd.DataFrame([
+            {
+                "hello": "world",
+                "date": datetime.date(2001, 1, 1),
+                "timestamp": pd.Timestamp(year=2001, month=1, day=1, hour=1, minute=1, second=1, microsecond=1),
+                "value": float('nan'),
+                "nested": {"a": None, "b": ""}
+            },
+            {
+                "hello": "",
+                "date": datetime.date(2001, 1, 2),
+                "timestamp": pd.Timestamp(year=2001, month=1, day=2),
+                "value": 2.0,
+                "nested": [1, 2]
+            }
+        ])
+        results = []
+        for engine in ["python", "arrow"]:
+            test_file = os.path.join(test_dir, 'data.{}.jsonl'.format(engine))
+            serialize(dest=test_file, data=data, engine=engine, format="jsonl", drop_blanks=True, drop_nulls=True)
+            with open(test_file, mode='rt') as f:
+                results += [f.read()]
+        self.assertEqual(
+            results[1],
+            results[0],
+            'error encoding data frame as JSON Lines (jsonl) with arrow engine'
+        )
+
+    def test_serialize_json_table_drop(self):
+        test_dir = os.path.join(self.test_dir, 'test_serialize_json_table_drop')
+        os.makedirs(test_dir, exist_ok=True)
+        data = pa.table({"a": ["x", ""], "b": [None, 2]})
+        for name, value in [("table", data), ("dataframe", data.to_pandas())]:
+            test_file = os.path.join(test_dir, 'data.{}.json'.format(name))
+            serialize(dest=test_file, data=value, format="json", drop_blanks=True, drop_nulls=True)
+            with open(test_file, mode='rt') as f:
+                self.assertEqual(
+                    json.load(f),
+                    [{"a": "x"}, {"b": 2}],
+                    'error dropping blanks and nulls from {} encoded as json'.format(name)
+                )
+
+    def test_serialize_csv_dataframe_limit(self):
+        test_dir = os.path.join(self.test_dir, 'test_serialize_csv_dataframe_limit')
+        os.makedirs(test_dir, exist_ok=True)
+        data = pd.DataFrame([{"hello": "world", "order": 1}, {"hello": "planet", "order": 2}])
+        for engine, expected in [
+            ("python", 'hello,order\nworld,1\n'),
+            ("arrow", 'hello,order\nworld,1\n')
+        ]:
+            test_file = os.path.join(test_dir, 'data.{}.csv'.format(engine))
+            serialize(dest=test_file, data=data, engine=engine, format="csv", limit=1)
+            result = None
+            with open(test_file, mode='rt') as f:
+                result = f.read()
+            self.assertEqual(
+                result,
+                expected,
+                'error encoding data frame as csv with limit using {} engine'.format(engine)
+            )
+
+    def test_serialize_csv_table_quoting(self):
+        test_dir = os.path.join(self.test_dir, 'test_serialize_csv_table_quoting')
+        os.makedirs(test_dir, exist_ok=True)
+        data = [
+            {"hello": "world", "quoted": "has,comma", "order": 1},
+            {"hello": "", "quoted": 'q"uote', "order": None},
+            {"hello": "sp ace", "quoted": "line\nbreak", "order": 3},
+            {"hello": None, "quoted": "tab\tx", "order": 4}
+        ]
+        for format in ["csv", "tsv"]:
+            results = []
+            for value in [data, pa.Table.from_pylist(data)]:
+                test_file = os.path.join(test_dir, 'data.{}.{}'.format(len(results), format))
+                serialize(dest=test_file, data=value, format=format)
+                with open(test_file, mode='rb') as f:
+                    results += [f.read()]
+            self.assertEqual(
+                results[1],
+                results[0],
+                'error quoting {} written by arrow csv writer'.format(format)
+            )
+
+    def test_roundtrip_tsv_table_gzip(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_roundtrip_tsv_table_gzip')
+        os.makedirs(test_dir, exist_ok=True)
+        test_file = os.path.join(test_dir, 'data.tsv.gz')
+        #
+        data = pa.table({"order": ["1", "2"], "hello": ["world", "pla\tnet"]})
+        #
+        serialize(compression="gzip", dest=test_file, data=data, format="tsv")
+        #
+        result = deserialize(compression="gzip", format="tsv", src=test_file)
+        #
+        self.assertEqual(
+            result,
+            [{"hello": "world", "order": "1"}, {"hello": "pla\tnet", "order": "2"}],
+            'error serializing table to tsv and then deserializing back'
+        )
+
+    def test_serialize_iter_csv_batches_header(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_serialize_iter_csv_batches_header')
+        os.makedirs(test_dir, exist_ok=True)
+        test_file = os.path.join(test_dir, 'data.csv')
+        #
+        with open(test_file, mode='wt') as f:
+            f.write("b,a\n1,\n2,x\n")
+        columns = csv_fieldnames(src=test_file, format="csv")
+        self.assertEqual(columns, ["b", "a"], 'error reading csv header')
+        # the first batch is missing the blank column, which is still written in the header
+        batches = deserialize_iter(src=test_file, format="csv", drop_blanks=True, batch_size=1)
+        serialize_iter(dest=test_file + ".out", batches=batches, format="csv", columns=sorted(columns))
+        with open(test_file + ".out", mode='rt') as f:
+            self.assertEqual(f.read(), 'a,b\n,1\nx,2\n', 'error writing csv with fixed header')
+        # without columns, a column missing from the first batch cannot be written
+        with self.assertRaises(Exception):
+            serialize_iter(
+                dest=test_file + ".out",
+                batches=deserialize_iter(src=test_file, format="csv", drop_blanks=True, batch_size=1),
+                format="csv"
+            )
+
+    def test_serialize_iter_jsonl_batches_blanks(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_serialize_iter_jsonl_batches_blanks')
+        os.makedirs(test_dir, exist_ok=True)
+        test_file = os.path.join(test_dir, 'data.jsonl')
+        #
+        data = pa.table({"hello": ["world", "", None], "order": [1, 2, 3]})
+        #
+        serialize_iter(dest=test_file, batches=data.to_batches(max_chunksize=2), format="jsonl", drop_blanks=True)
+        #
+        result = None
+        with open(test_file, mode='rt') as f:
+            result = f.read()
+        self.assertEqual(
+            result,
+            '{"hello":"world","order":1}\n{"order":2}\n{"hello":null,"order":3}\n',
+            'error dropping blanks from record batches'
+        )
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_roundtrip_jsonl_json_backend(self):
+        test_dir = os.path.join(self.test_dir, 'test_roundtrip_jsonl_json_backend')
+        os.makedirs(test_dir, exist_ok=True)
+        data = [
+            {"hello": "world", "order": 1, "value": 1.5, "date": datetime.date(2001, 1, 1)},
+            {"hello": "pl\u00e4net", "order": 2**70, "value": 1e-05, "nested": {"a": [1e16, 0.0001]}},
+            {"hello": None, "order": 3, "value": float('nan'), "timestamp": pd.Timestamp(year=2001, month=1, day=1)},
+            {"hello": "", "order": 4, "value": decimal.Decimal('1.25'), "empty": {}},
+            {"hello": "\x7f caf\u00e9 \U0001f600", "order": 5}
+        ]
+        results = []
+        for json_backend in ["json", "orjson"]:
+            test_file = os.path.join(test_dir, 'data.{}.jsonl'.format(json_backend))
+            serialize(allow_nan=True, dest=test_file, data=data, format="jsonl", json_backend=json_backend)
+            with open(test_file, mode='rt') as f:
+                results += [f.read()]
+            self.assertEqual(
+                repr(deserialize(src=test_file, format="jsonl", json_backend=json_backend)),
+                repr(deserialize(src=test_file, format="jsonl", json_backend="json")),
+                'error decoding JSON Lines (jsonl) with {} backend'.format(json_backend)
+            )
+        self.assertEqual(
+            results[1],
+            results[0],
+            'error encoding JSON Lines (jsonl) with orjson backend'
+        )
+
+    def test_serialize_jsonl_gzip_threads(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_serialize_jsonl_gzip_threads')
+        os.makedirs(test_dir, exist_ok=True)
+        test_file = os.path.join(test_dir, 'data.jsonl.gz')
+        #
+        data = [{"hello": "world", "order": i} for i in range(1000)]
+        #
+        serialize(
+            compression="gzip",
+            compression_block_size=1024,
+            compression_threads=4,
+            dest=test_file,
+            data=data,
+            format="jsonl")
+        #
+        result = None
+        with gzip.open(test_file, mode='rt') as f:
+            result = f.read()
+        self.assertEqual(
+            result,
+            "\n".join(json.dumps(x, separators=(',', ':')) for x in data),
+            'error compressing JSON Lines (jsonl) in parallel'
+        )
+
+    def test_roundtrip_jsonl_codecs(self):
+        test_dir = os.path.join(self.test_dir, 'test_roundtrip_jsonl_codecs')
+        os.makedirs(test_dir, exist_ok=True)
+        data = [{"hello": "world", "order": i} for i in range(100)]
+        for compression in ["bzip2", "lz4", "xz", "zstd"]:
+            test_file = os.path.join(test_dir, 'data.jsonl.{}'.format(compression))
+            serialize(
+                compression=compression,
+                compression_block_size=256,
+                compression_level=1,
+                dest=test_file,
+                data=data,
+                format="jsonl")
+            self.assertEqual(
+                deserialize(compression=compression, format="jsonl", src=test_file),
+                data,
+                'error serializing JSON Lines (jsonl) with {} compression and then deserializing back'.format(
+                    compression
+                )
+            )
+            self.assertEqual(
+                [x for batch in deserialize_iter(
+                    batch_size=10,
+                    compression=compression,
+                    format="jsonl",
+                    src=test_file) for x in batch],
+                data,
+                'error streaming JSON Lines (jsonl) with {} compression'.format(compression)
+            )
+
+    def test_deserialize_parquet_columns_filters(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_deserialize_parquet_columns_filters')
+        os.makedirs(test_dir, exist_ok=True)
+        test_dir_dataset = os.path.join(test_dir, 'data')
+        #
+        pq.write_to_dataset(
+            pa.table({
+                "year": [2019, 2020, 2020, 2021],
+                "state": ["VA", "MD", "VA", "MD"],
+                "order": [1, 2, 3, 4]
+            }),
+            test_dir_dataset,
+            partition_cols=["year"]
+        )
+        #
+        result = deserialize(
+            src=test_dir_dataset,
+            format="parquet",
+            columns=["order", "year"],
+            filters=[("year", "=", 2020)]
+        )
+        self.assertEqual(
+            sorted(result, key=lambda x: x['order']),
+            [{"order": 2, "year": 2020}, {"order": 3, "year": 2020}],
+            'error deserializing parquet with columns and partition filters'
+        )
+        #
+        result = deserialize(
+            src=test_dir_dataset,
+            format="parquet",
+            columns=["order"],
+            filters=(pc.field("state") == "VA"),
+            engine="arrow"
+        )
+        self.assertIsInstance(result, pa.Table, 'error deserializing parquet as table')
+        self.assertEqual(
+            sorted(result.column("order").to_pylist()),
+            [1, 3],
+            'error deserializing parquet with expression filters'
+        )
+
+    def test_deserialize_iter_parquet_readahead(self):
+        #
+        test_dir = os.path.join(self.test_dir, 'test_deserialize_iter_parquet_readahead')
+        os.makedirs(test_dir, exist_ok=True)
+        #
+        for i in range(8):
+            pq.write_table(
+                pa.table({"order": list(range(i * 100, (i + 1) * 100))}),
+                os.path.join(test_dir, "part-{}.parquet".format(i)),
+                row_group_size=25
+            )
+        #
+        batches = list(deserialize_iter(
+            src=test_dir,
+            format="parquet",
+            engine="arrow",
+            batch_size=10,
+            batch_readahead=4,
+            fragment_readahead=4,
+            buffer_size=65536
+        ))
+        self.assertTrue(all(batch.num_rows <= 10 for batch in batches), 'error limiting parquet batch size')
+        self.assertEqual(
+            sorted(x for batch in batches for x in batch.column("order").to_pylist()),
+            list(range(800)),
+            'error reading parquet dataset with readahead'
+        )
+        #
+        result = deserialize(src=test_dir, format="parquet", threads=False)
+        self.assertEqual(
+            [x['order'] for x in result],
+            list(range(800)),
+            'error reading parquet dataset without threads'
+        )
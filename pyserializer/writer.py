@@ -5,8 +5,26 @@
 #
 # =================================================================
 
-import gzip
+import bz2
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import lzma
+import os
+import struct
 import sys
+import zlib
+
+import pyarrow as pa
+
+# gzip header with no file name or modification time, using the deflate method and an unknown operating system
+gzip_header = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+# an empty final deflate block, which ends a stream of sync flushed blocks
+gzip_final_block = b"\x03\x00"
+
+# the size of the deflate window, which is the most history a block can reference
+gzip_window_size = 32768
 
 
 class Writer(object):
@@ -27,41 +45,230 @@ class Writer(object):
         raise NotImplementedError
 
 
-class FileWriter(Writer):
+def compress_block(block, dictionary=None, level=None):
+    """
+    compress_block compresses the block as raw deflate ending with a sync flush, so that compressed blocks can be
+    concatenated.  The dictionary is the uncompressed data that precedes the block in the stream.
+    """
+    if dictionary is not None and len(dictionary) > 0:
+        c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, 8, zlib.Z_DEFAULT_STRATEGY, dictionary)
+    else:
+        c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return c.compress(block) + c.flush(zlib.Z_SYNC_FLUSH)
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
+
+class CountingFile(object):
+    """
+    CountingFile wraps a binary stream and counts the bytes written to it, so that the size of an output is known while
+    it is being written.  Closing the CountingFile does not close the stream.
+    """
 
     def __init__(self, f):
         self.f = f
+        self.bytes = 0
+
+    @property
+    def closed(self):
+        return getattr(self.f, "closed", False)
 
     def close(self):
-        self.f.close()
+        pass
+
+    def flush(self):
+        self.f.flush()
+
+    def writable(self):
+        return True
 
     def write(self, data):
+        self.bytes += len(data)
         self.f.write(data)
+        return len(data)
+
 
+class BufferedWriter(Writer):
+    """
+    BufferedWriter encodes text as utf-8 and coalesces writes into blocks of block_size bytes, so that the destination
+    receives a few large writes rather than one or two writes per record.  bytes_in counts the bytes written to the
+    writer, and bytes_out counts the bytes written to the destination.
+    """
 
-class StreamWriter(Writer):
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
-    def __init__(self, w):
-        self.w = w
+    def __init__(self, f, block_size=None, closefd=False):
+        self.f = f
+        self.closefd = closefd
+        self.block_size = block_size if block_size is not None and block_size > 0 else 1048576
+        self.buffer = []
+        self.buffered = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.closed = False
 
     def close(self):
-        pass
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.flush()
+        finally:
+            if self.closefd:
+                self.f.close()
+            else:
+                self.f.flush()
+
+    def flush(self):
+        if self.buffered > 0:
+            self.output(b"".join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+
+    def output(self, data):
+        self.f.write(data)
+        self.bytes_out += len(data)
 
     def write(self, data):
-        self.w.write(data)
+        self.write_bytes(data.encode("utf-8") if isinstance(data, str) else data)
 
+    def write_bytes(self, data):
+        self.buffer.append(data)
+        self.buffered += len(data)
+        self.bytes_in += len(data)
+        if self.buffered >= self.block_size:
+            self.flush()
 
-def create_writer(compression=None, f=None):
-    if compression == "gzip":
-        if f == "-":
-            return FileWriter(gzip.open(sys.stdout, 'wt'))
-        return FileWriter(gzip.open(f, 'wt'))
-    elif compression is None or len(compression) == 0:
-        if f == "-":
-            return StreamWriter(sys.stdout)
-        return FileWriter(open(f, 'wt'))
-    else:
+
+class BlockWriter(BufferedWriter):
+    """
+    BlockWriter compresses each block on a pool of threads and writes the compressed blocks in order.  At most two
+    blocks per thread are held in memory.  Subclasses implement compress, which returns a future for the compressed
+    block, and may write a header and trailer.
+    """
+
+    def __init__(self, f, threads=None, block_size=None, closefd=False):
+        super(BlockWriter, self).__init__(
+            f,
+            block_size=block_size if block_size is not None and block_size > 0 else 131072,
+            closefd=closefd)
+        self.threads = threads if threads is not None and threads > 0 else (os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.threads)
+        self.pending = deque()
+        self.blocks = 0
+
+    def compress(self, block):
+        raise NotImplementedError
+
+    def trailer(self):
+        return b""
+
+    def flush(self):
+        # always compress at least one block, so that empty output is still a valid compressed stream
+        if self.buffered > 0 or self.blocks == 0:
+            block = b"".join(self.buffer)
+            self.buffer = []
+            self.buffered = 0
+            self.blocks += 1
+            self.pending.append(self.compress(block))
+        # write the blocks that are ready in order, and wait for the oldest block if too many are pending
+        while len(self.pending) > 0 and (self.pending[0].done() or len(self.pending) > 2 * self.threads):
+            self.output(self.pending.popleft().result())
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.flush()
+            while len(self.pending) > 0:
+                self.output(self.pending.popleft().result())
+            self.output(self.trailer())
+        finally:
+            self.executor.shutdown()
+            if self.closefd:
+                self.f.close()
+            else:
+                self.f.flush()
+
+
+class ParallelGzipWriter(BlockWriter):
+    """
+    ParallelGzipWriter writes a single gzip member, as pigz does.  Each block uses the end of the previous block as its
+    dictionary, so the compression ratio is close to a single-threaded writer.
+    """
+
+    def __init__(self, f, threads=None, block_size=None, level=None, closefd=False):
+        super(ParallelGzipWriter, self).__init__(f, threads=threads, block_size=block_size, closefd=closefd)
+        self.level = level if level is not None else 9
+        self.dictionary = None
+        self.crc = 0
+        self.size = 0
+        self.output(gzip_header)
+
+    def compress(self, block):
+        self.crc = zlib.crc32(block, self.crc)
+        self.size += len(block)
+        future = self.executor.submit(compress_block, block, self.dictionary, self.level)
+        self.dictionary = block[-gzip_window_size:]
+        return future
+
+    def trailer(self):
+        return gzip_final_block + struct.pack("<II", self.crc & 0xffffffff, self.size & 0xffffffff)
+
+
+class ParallelCodecWriter(BlockWriter):
+    """
+    ParallelCodecWriter compresses each block as a separate zstd or lz4 frame, or bzip2 or xz stream.  Decoders read
+    concatenated frames and streams as one stream.
+    """
+
+    def __init__(self, f, codec=None, threads=None, block_size=None, level=None, closefd=False):
+        # larger blocks give the compressor more data to find matches in
+        super(ParallelCodecWriter, self).__init__(
+            f,
+            threads=threads,
+            block_size=block_size if block_size is not None and block_size > 0 else 1048576,
+            closefd=closefd)
+        if codec == "bzip2":
+            self.fn = functools.partial(bz2.compress, compresslevel=(level or 9))
+        elif codec == "xz":
+            self.fn = functools.partial(lzma.compress, preset=level)
+        else:
+            self.fn = functools.partial(pa.Codec(codec, compression_level=level).compress, asbytes=True)
+
+    def compress(self, block):
+        return self.executor.submit(self.fn, block)
+
+
+def open_binary(f):
+    """
+    open_binary returns the binary stream for the destination, and whether the stream should be closed by the writer.
+    """
+    if f == "-":
+        return sys.stdout.buffer, False
+    if isinstance(f, str):
+        return open(f, 'wb'), True
+    return f, False
+
+
+def create_writer(compression=None, f=None, threads=None, block_size=None, level=None):
+    """
+    create_writer returns a writer for the destination, which is either stdout ("-"), a local path, or a file object
+    opened in binary mode, such as a file on a s3fs filesystem.  The writer accepts text, which is encoded as utf-8,
+    and bytes.  Output is written in blocks of block_size bytes.  If the output is compressed, then the blocks are
+    compressed by threads workers.  The compression level is specific to each algorithm.
+    """
+    if compression is not None and len(compression) > 0 and compression not in ["bzip2", "gzip", "lz4", "xz", "zstd"]:
         raise Exception("unknown compression {}".format(compression))
+    stream, closefd = open_binary(f)
+    if compression == "gzip":
+        return ParallelGzipWriter(stream, threads=threads, block_size=block_size, level=level, closefd=closefd)
+    elif compression in ["bzip2", "lz4", "xz", "zstd"]:
+        return ParallelCodecWriter(
+            stream,
+            codec=compression,
+            threads=threads,
+            block_size=block_size,
+            level=level,
+            closefd=closefd)
+    return BufferedWriter(stream, block_size=block_size, closefd=closefd)
@@ -60,11 +60,83 @@ testRoundtripJSONGZIP() {
   _testRoundtrip "${testdata_local}/doc.jsonl" "${SHUNIT_TMPDIR}/testRoundtripJSONGZIP" "json" "gzip"
 }
 
+testRoundtripJSONLZSTD() {
+  mkdir -p "${SHUNIT_TMPDIR}/testRoundtripJSONLZSTD"
+  _testRoundtrip "${testdata_local}/doc.jsonl" "${SHUNIT_TMPDIR}/testRoundtripJSONLZSTD" "jsonl" "zstd"
+}
+
+testRoundtripCSVXZ() {
+  mkdir -p "${SHUNIT_TMPDIR}/testRoundtripCSVXZ"
+  _testRoundtrip "${testdata_local}/doc.jsonl" "${SHUNIT_TMPDIR}/testRoundtripCSVXZ" "csv" "xz"
+}
+
 testRoundtripParquet() {
   mkdir -p "${SHUNIT_TMPDIR}/testRoundtripParquet"
   _testRoundtrip "${testdata_local}/doc.jsonl" "${SHUNIT_TMPDIR}/testRoundtripParquet" "parquet"
 }
 
+testStreamCSVGZIP() {
+  mkdir -p "${SHUNIT_TMPDIR}/testStreamCSVGZIP"
+  local dest="${SHUNIT_TMPDIR}/testStreamCSVGZIP"
+  python3 cmd/run.py transform \
+  --src="${testdata_local}/doc.jsonl" \
+  --dest="${dest}/there" \
+  --input-format=jsonl \
+  --output-compression=gzip \
+  --output-format=csv \
+  --stream
+  cat "${dest}/there" | python3 cmd/run.py transform \
+  --src=- \
+  --dest=- \
+  --input-compression=gzip \
+  --input-format=csv \
+  --output-format=jsonl \
+  --drop-blanks \
+  --stream > "${dest}/back"
+  local expected=$(cat "${testdata_local}/doc.jsonl")
+  local output=$(cat "${dest}/back")
+  assertEquals "unexpected output" "${expected}" "${output}"
+}
+
+testArrowDropBlanks() {
+  mkdir -p "${SHUNIT_TMPDIR}/testArrowDropBlanks"
+  local dest="${SHUNIT_TMPDIR}/testArrowDropBlanks"
+  python3 cmd/run.py transform \
+  --src="${testdata_local}/doc.jsonl" \
+  --dest="${dest}/there" \
+  --input-format=jsonl \
+  --output-format=csv
+  python3 cmd/run.py transform \
+  --src="${dest}/there" \
+  --dest="${dest}/back" \
+  --input-format=csv \
+  --output-format=jsonl \
+  --engine=arrow \
+  --drop-blanks
+  local expected=$(cat "${testdata_local}/doc.jsonl")
+  local output=$(cat "${dest}/back")
+  assertEquals "unexpected output" "${expected}" "${output}"
+}
+
+testMultipleInputs() {
+  mkdir -p "${SHUNIT_TMPDIR}/testMultipleInputs/in"
+  local dest="${SHUNIT_TMPDIR}/testMultipleInputs"
+  split -l 1 "${testdata_local}/doc.jsonl" "${dest}/in/part-"
+  for f in "${dest}"/in/part-*; do
+    gzip "${f}"
+  done
+  python3 cmd/run.py transform \
+  --src="${dest}/in" \
+  --dest="${dest}/back" \
+  --input-compression=gzip \
+  --input-format=jsonl \
+  --output-format=jsonl \
+  --input-workers=4
+  local expected=$(cat "${testdata_local}/doc.jsonl")
+  local output=$(cat "${dest}/back")
+  assertEquals "unexpected output" "${expected}" "${output}"
+}
+
 testAlgorithms() {
   python3 cmd/run.py algorithms
 }